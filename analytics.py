@@ -0,0 +1,176 @@
+"""Dashboard analytics over a columnar copy of the invoice log.
+
+The log is turned into a typed pandas DataFrame once per change of the
+backing store (parsed datetimes, float amounts, categorical status and plan)
+and every dashboard number is a vectorized reduction or group-by over it.
+Everything here is plain functions with no Tk dependency, so it can be
+benchmarked or checked from a script:
+
+    frame = invoice_frame(entries, customers)
+    dashboard_metrics(frame)
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from billing import LOG_DATETIME_FORMATS
+from repository import get_customer_repository, get_invoice_repository
+
+logger = logging.getLogger(__name__)
+
+TEXT_COLUMNS = ("filename", "datetime", "invoice_num", "customer_name", "customer_id",
+                "amount", "status", "payment_date", "payment_method", "plan")
+
+
+def log_datetimes(texts):
+    """Vectorised billing.parse_log_datetime(): datetime64 Series, NaT where malformed"""
+    parsed = pd.Series(pd.NaT, index=texts.index, dtype="datetime64[ns]")
+    for fmt in LOG_DATETIME_FORMATS:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(texts[missing], format=fmt, errors="coerce")
+    return parsed
+
+
+def invoice_frame(entries, customers=None):
+    """Build the typed invoice DataFrame from log entries.
+
+    entries may be plain log dicts or repository InvoiceRecords. Log entries
+    do not store the plan, so when customers are given the plan is taken
+    from the customer record (by customer_id) wherever the entry lacks one.
+
+    Columns: datetime_text, dt (datetime64, NaT when malformed), invoice_num,
+    customer_name, customer_id, amount_text, amount (float64), status and
+    plan (categorical), payment_method. Rows are ordered by dt.
+    """
+    rows = [getattr(e, "entry", e) for e in entries]
+    raw = pd.DataFrame.from_records(rows, columns=list(TEXT_COLUMNS)) if rows else \
+        pd.DataFrame(columns=list(TEXT_COLUMNS))
+    raw = raw.astype(object).fillna("")
+
+    frame = pd.DataFrame({
+        "datetime_text": raw["datetime"].astype(str),
+        "invoice_num": raw["invoice_num"].astype(str),
+        "customer_name": raw["customer_name"].astype(str),
+        "customer_id": raw["customer_id"].astype(str),
+        "amount_text": raw["amount"].astype(str),
+        "payment_method": raw["payment_method"].astype(str),
+    })
+    frame["dt"] = log_datetimes(frame["datetime_text"])
+    frame["amount"] = pd.to_numeric(raw["amount"], errors="coerce").fillna(0.0).astype(np.float64)
+    status = raw["status"].astype(str).replace("", "Unpaid")
+    frame["status"] = status.astype("category")
+
+    plan = raw["plan"].astype(str)
+    if customers:
+        plan_by_id = {str(c.get("customer_id", "")): c.get("plan", "") for c in customers}
+        missing = plan == ""
+        plan = plan.where(~missing, frame["customer_id"].map(plan_by_id).fillna(""))
+    frame["plan"] = plan.astype("category")
+    # Kept sorted by dt (malformed dates last) so date ranges are binary searches
+    return frame.sort_values("dt", kind="stable", na_position="last", ignore_index=True)
+
+
+def revenue_between(frame, start, end):
+    """Revenue of invoices with start <= dt < end, found by binary search on the sorted dt column"""
+    times = frame["dt"].to_numpy()
+    lo = times.searchsorted(np.datetime64(start), side="left")
+    hi = times.searchsorted(np.datetime64(end), side="left")
+    return float(frame["amount"].to_numpy()[lo:hi].sum())
+
+
+def dashboard_stats(frame, now=None):
+    """The Quick Stats numbers"""
+    now = now or datetime.now()
+    total_revenue = float(frame["amount"].sum())
+    total_invoices = len(frame)
+    pending_amount = float(frame["amount"][frame["status"] != "Paid"].sum())
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    plans = frame["plan"]
+    return {
+        "total_revenue": total_revenue,
+        "total_invoices": total_invoices,
+        "total_customers": int(frame["customer_name"].nunique()),
+        "pending_amount": pending_amount,
+        "this_month_revenue": revenue_between(frame, month_start, next_month),
+        "collection_rate": (1 - pending_amount / total_revenue) * 100 if total_revenue > 0 else 0.0,
+        "avg_invoice_value": total_revenue / total_invoices if total_invoices else 0.0,
+        "active_plans": int(plans[plans != ""].nunique()),
+    }
+
+
+def monthly_revenue(frame):
+    """Revenue per calendar month as a Series indexed by 'Mon YYYY', oldest first"""
+    dated = frame[frame["dt"].notna()]
+    if dated.empty:
+        return pd.Series(dtype=np.float64)
+    totals = dated.groupby(dated["dt"].dt.to_period("M"))["amount"].sum().sort_index()
+    totals.index = totals.index.strftime("%b %Y")
+    return totals
+
+
+def status_counts(frame):
+    """Invoice count per payment status (Paid and Unpaid always present)"""
+    counts = {"Paid": 0, "Unpaid": 0}
+    for status, count in frame["status"].value_counts(sort=False).items():
+        if count:
+            counts[status] = int(count)
+    return counts
+
+
+def plan_distribution(frame, plans=()):
+    """Invoice count per plan; plans lists names to show even with no invoices"""
+    named = frame["plan"][frame["plan"] != ""]
+    counts = named.value_counts(sort=False)
+    counts = counts[counts > 0]
+    result = {plan: 0 for plan in plans}
+    for plan, count in counts.items():
+        result[plan] = int(count)
+    return result
+
+
+def top_customers(frame, n=5):
+    """Customers with the highest billed revenue: DataFrame of customer_name, revenue, invoices"""
+    grouped = frame.groupby("customer_name", sort=False)["amount"].agg(revenue="sum", invoices="count")
+    return grouped.nlargest(n, "revenue").reset_index()
+
+
+def recent_invoices(frame, n=5):
+    """The n newest invoices (malformed dates skipped), newest first"""
+    dated = frame[frame["dt"].notna()]
+    return dated.nlargest(n, "dt")
+
+
+def dashboard_metrics(frame, now=None, plans=()):
+    """Everything the dashboard shows, computed from one frame"""
+    return {
+        "stats": dashboard_stats(frame, now),
+        "monthly_revenue": monthly_revenue(frame),
+        "status_counts": status_counts(frame),
+        "plan_distribution": plan_distribution(frame, plans),
+        "recent": recent_invoices(frame),
+    }
+
+
+_frame_cache = {"signature": None, "frame": None}
+_frame_lock = threading.Lock()
+
+
+def load_invoice_frame(repository=None, storage=None):
+    """The invoice frame for the current log, rebuilt only when the log changes"""
+    repository = repository or get_invoice_repository()
+    with _frame_lock:
+        customers = storage.load_customers() if storage else get_customer_repository().customers()
+        # Plans are joined in from the customers, so a plan change also invalidates the frame
+        signature = (repository.signature(),
+                     tuple((c.get("customer_id"), c.get("plan")) for c in customers))
+        if _frame_cache["frame"] is None or _frame_cache["signature"] != signature:
+            _frame_cache["frame"] = invoice_frame(repository.records(), customers)
+            _frame_cache["signature"] = signature
+            logger.debug(f"Analytics frame built with {len(_frame_cache['frame'])} rows")
+        return _frame_cache["frame"]
@@ -0,0 +1,297 @@
+"""Headless month-end invoice generation.
+
+Bills every stored customer for one billing period and renders
+the PDFs across a process pool. Usable from the command line:
+
+    python batch.py 2025-06 --workers 4 --plan-price "100 MBPS UNL=500"
+
+or from Python via run_batch().
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from billing import build_invoice_data, billing_period, pdf_filename_for, make_log_entry
+from storage import get_storage
+import invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def load_plan_prices(path):
+    """Load a {plan: monthly amount} mapping from a JSON file"""
+    with open(path, 'r') as f:
+        return {plan: float(amount) for plan, amount in json.load(f).items()}
+
+
+def customer_amount(customer, plan_prices=None, default_amount=None):
+    """Amount to bill a customer: own 'amount' field, then plan price, then default"""
+    if customer.get("amount"):
+        return float(customer["amount"])
+    if plan_prices and customer.get("plan") in plan_prices:
+        return float(plan_prices[customer["plan"]])
+    if default_amount is not None:
+        return float(default_amount)
+    return None
+
+
+def _render_job(data, output_dir, include_logo, renderer=None):
+    """Render one invoice; runs in a worker process and never raises"""
+    started = time.perf_counter()
+    try:
+        filename = os.path.join(output_dir, data["pdf_filename"])
+        invoice_pdf.render_invoice(data, filename, include_logo=include_logo, renderer=renderer,
+                                   overwrite=False)
+        return {"ok": True, "data": data, "filename": filename,
+                "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"ok": False, "data": data, "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(),
+                "seconds": time.perf_counter() - started}
+
+
+def _render_combined(invoices, filename, include_logo):
+    """Render invoices into one PDF; returns the (data, error) pairs left out of it"""
+    try:
+        return invoice_pdf.render_invoice_book(((data, "") for data in invoices), filename, include_logo)
+    except Exception as e:
+        logger.error(f"Combined PDF {filename} failed: {traceback.format_exc()}")
+        return [(data, f"{type(e).__name__}: {e}") for data in invoices]
+
+
+def billed_customer_ids(logs, period):
+    """IDs of customers whose invoice log has an invoice file for period ('YYYY-MM')"""
+    start, _ = billing_period(period)
+    suffix = re.compile(rf"_{start.strftime('%b')}_{start.strftime('%Y')}(_\d+)?\.pdf$")
+    return {log.get("customer_id") for log in logs if suffix.search(log.get("filename", ""))}
+
+
+def unique_filename(filename, invoice_num, taken):
+    """filename, with the invoice number added if taken (lower-cased names) already has it"""
+    if filename.lower() in taken:
+        root, ext = os.path.splitext(filename)
+        filename = f"{root}_{invoice_num}{ext}"
+    taken.add(filename.lower())
+    return filename
+
+
+def prepare_batch(customers, period, plan_prices=None, default_amount=None):
+    """Split customers into billable (customer, amount, filename) jobs and skipped errors"""
+    start, _ = billing_period(period)
+    jobs, errors = [], []
+    used_filenames = set()
+    for customer in customers:
+        customer_id = customer.get("customer_id", "")
+        amount = customer_amount(customer, plan_prices, default_amount)
+        if amount is None or amount <= 0:
+            errors.append({"customer_id": customer_id, "name": customer.get("name", ""),
+                           "error": f"No amount configured for plan '{customer.get('plan', '')}'"})
+            continue
+        # Same-named customers would overwrite each other's PDF; disambiguate by ID
+        filename = pdf_filename_for(customer.get("name", ""), start)
+        if filename in used_filenames:
+            filename = pdf_filename_for(f"{customer.get('name', '')} {customer_id}", start)
+        used_filenames.add(filename)
+        jobs.append((customer, amount, filename))
+    return jobs, errors
+
+
+def run_batch(period, workers=None, customers=None, plan_prices=None, default_amount=None,
+              customer_ids=None, output_dir=invoice_pdf.OUTPUT_DIR, storage=None, write_log=True,
+              renderer=None, combined=None, force=False):
+    """Generate invoices for every customer for period ('YYYY-MM').
+
+    Invoice numbers are reserved atomically from storage before rendering,
+    a failure in one invoice never stops the others, and successful invoices
+    are appended to the invoice log in one write. renderer picks the PDF
+    renderer (see invoice_pdf.render_invoice_bytes). With combined (a file name
+    under output_dir) the invoices are also written into that one print-ready
+    PDF; the per-invoice files, which the invoice log points at, are still
+    written with renderer. Customers that already have an invoice for the
+    period in the log are skipped unless force is set, and a file name that
+    is already on disk or in the log gets the invoice number appended, so
+    issued invoices are never overwritten. Returns a summary report dict.
+    """
+    started = time.perf_counter()
+    billing_period(period)  # validate before touching anything
+    storage = storage or get_storage()
+    if customers is None:
+        customers = storage.load_customers()
+    if customer_ids:
+        wanted = set(customer_ids)
+        customers = [c for c in customers if c.get("customer_id") in wanted]
+
+    logs = storage.load_invoice_logs()
+    already_billed = []
+    billable = customers
+    if not force:
+        billed = billed_customer_ids(logs, period)
+        already_billed = [c.get("customer_id", "") for c in customers if c.get("customer_id") in billed]
+        billable = [c for c in customers if c.get("customer_id") not in billed]
+        if already_billed:
+            logger.info(f"Batch {period}: skipping {len(already_billed)} customers already billed")
+
+    jobs, errors = prepare_batch(billable, period, plan_prices, default_amount)
+    numbers = storage.allocate_invoice_numbers(len(jobs))
+    os.makedirs(output_dir, exist_ok=True)
+    taken = {name.lower() for name in os.listdir(output_dir)}
+    taken.update(log.get("filename", "").lower() for log in logs)
+    invoices = [
+        build_invoice_data(customer, period, amount, number,
+                           pdf_filename=unique_filename(filename, number, taken))
+        for (customer, amount, filename), number in zip(jobs, numbers)
+    ]
+
+    logo_problem = invoice_pdf.validate_logo()
+    if logo_problem:
+        logger.warning(f"{logo_problem}; invoices will be generated without the logo")
+    include_logo = logo_problem is None
+    renderer = renderer or invoice_pdf.default_renderer()
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    logger.info(f"Batch {period}: rendering {len(invoices)} invoices with {renderer} renderer, "
+                f"{workers} worker(s)")
+    results = []
+    if workers == 1 or len(invoices) <= 1:
+        for data in invoices:
+            results.append(_render_job(data, output_dir, include_logo, renderer))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_render_job, data, output_dir, include_logo, renderer): data
+                       for data in invoices}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Worker crashed outright (e.g. killed); isolate it like any other failure
+                    results.append({"ok": False, "data": futures[future],
+                                    "error": f"{type(e).__name__}: {e}", "seconds": 0.0})
+
+    succeeded = sorted((r for r in results if r["ok"]), key=lambda r: r["data"]["invoice_num"])
+    failed = [r for r in results if not r["ok"]]
+    for r in failed:
+        logger.error(f"Invoice {r['data']['invoice_num']} for {r['data']['customer_id']} failed: {r['error']}")
+        errors.append({"customer_id": r["data"]["customer_id"], "name": r["data"]["name"],
+                       "invoice_num": r["data"]["invoice_num"], "error": r["error"]})
+
+    files = [r["filename"] for r in succeeded]
+    left_out = []
+    if combined and succeeded:
+        combined = os.path.join(output_dir, combined)
+        logger.info(f"Batch {period}: writing {len(succeeded)} invoices into {combined}")
+        skipped = _render_combined([r["data"] for r in succeeded], combined, include_logo)
+        for data, error in skipped:
+            logger.warning(f"Invoice {data['invoice_num']} left out of {combined}: {error}")
+            left_out.append({"customer_id": data["customer_id"], "name": data["name"],
+                             "invoice_num": data["invoice_num"], "error": error})
+        if len(skipped) < len(succeeded):
+            files.append(combined)
+
+    if write_log and succeeded:
+        storage.append_invoice_logs([make_log_entry(r["data"], r["data"]["pdf_filename"]) for r in succeeded])
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "period": period,
+        "workers": workers,
+        "customers": len(customers),
+        "already_billed": already_billed,
+        "generated": len(succeeded),
+        "failed": len(errors),
+        "total_amount": sum(float(r["data"]["total_amount"]) for r in succeeded),
+        "invoice_numbers": [r["data"]["invoice_num"] for r in succeeded],
+        "unused_invoice_numbers": sorted(r["data"]["invoice_num"] for r in failed),
+        "files": files,
+        "errors": errors,
+        "left_out_of_combined": left_out,
+        "elapsed_seconds": round(elapsed, 3),
+        "invoices_per_second": round(len(succeeded) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    logger.info(f"Batch {period} finished: {report['generated']} generated, {report['failed']} failed "
+                f"in {report['elapsed_seconds']}s")
+    return report
+
+
+def format_report(report):
+    """Human readable summary of a run_batch() report"""
+    lines = [
+        f"Billing period:     {report['period']}",
+        f"Customers:          {report['customers']}",
+        f"Invoices generated: {report['generated']}",
+        f"Failed/skipped:     {report['failed']}",
+        f"Total billed:       Rs. {report['total_amount']:,.2f}",
+        f"Elapsed:            {report['elapsed_seconds']}s "
+        f"({report['invoices_per_second']} invoices/s, {report['workers']} workers)",
+    ]
+    if report["already_billed"]:
+        lines.append(f"Already billed:     {len(report['already_billed'])} (use --force to bill again)")
+    if report["invoice_numbers"]:
+        lines.append(f"Invoice numbers:    {report['invoice_numbers'][0]}-{report['invoice_numbers'][-1]}")
+    if report["unused_invoice_numbers"]:
+        lines.append(f"Unused numbers:     {', '.join(map(str, report['unused_invoice_numbers']))}")
+    for error in report["errors"]:
+        lines.append(f"  ! {error['customer_id']} {error['name']}: {error['error']}")
+    if report["left_out_of_combined"]:
+        lines.append("Left out of the combined PDF (own file only):")
+        for error in report["left_out_of_combined"]:
+            lines.append(f"  - {error['customer_id']} {error['name']}: {error['error']}")
+    return "\n".join(lines)
+
+
+def parse_plan_price(value):
+    plan, sep, amount = value.rpartition("=")
+    if not sep or not plan:
+        raise argparse.ArgumentTypeError(f"expected PLAN=AMOUNT, got '{value}'")
+    return plan.strip(), float(amount)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate invoices for all customers for a billing period")
+    parser.add_argument("period", help="billing period as YYYY-MM")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--plan-price", type=parse_plan_price, action="append", default=[],
+                        metavar="PLAN=AMOUNT", help="amount to bill for a plan (repeatable)")
+    parser.add_argument("--plan-prices", metavar="FILE", help="JSON file mapping plan to amount")
+    parser.add_argument("--amount", type=float, default=None,
+                        help="amount for customers without a plan price")
+    parser.add_argument("--customer", action="append", dest="customer_ids", metavar="ID",
+                        help="only bill these customer IDs (repeatable)")
+    parser.add_argument("--output-dir", default=invoice_pdf.OUTPUT_DIR)
+    parser.add_argument("--renderer", choices=invoice_pdf.RENDERERS, default=None,
+                        help=f"PDF renderer for the per-invoice files (default: "
+                             f"${invoice_pdf.PDF_RENDERER_ENV} or {invoice_pdf.DEFAULT_RENDERER})")
+    parser.add_argument("--combined", metavar="FILE",
+                        help="also write all invoices into this one print-ready PDF (in the output "
+                             "dir); it always uses the fixed-coordinate layout")
+    parser.add_argument("--force", action="store_true",
+                        help="also bill customers that already have an invoice for the period")
+    parser.add_argument("--report", metavar="FILE", help="also write the summary report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    plan_prices = load_plan_prices(args.plan_prices) if args.plan_prices else {}
+    plan_prices.update(dict(args.plan_price))
+
+    report = run_batch(args.period, workers=args.workers, plan_prices=plan_prices,
+                       default_amount=args.amount, customer_ids=args.customer_ids,
+                       output_dir=args.output_dir, renderer=args.renderer, combined=args.combined,
+                       force=args.force)
+    print(format_report(report))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if not report["errors"] else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import calendar
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# File paths
+TRACKER_FILE = "invoice_tracker.json"
+INVOICE_LOG_FILE = "invoice_log.json"
+CUSTOMERS_FILE = "customers.json"
+USERS_FILE = "users.json"
+
+GST_RATE = 0.09  # 9% GST
+INVOICE_PREFIX = "TF/25-26/HR/"
+DEFAULT_LAST_INVOICE_NUMBER = 2058
+
+# How long to wait for the tracker lock and when to treat it as abandoned
+LOCK_TIMEOUT = 10.0
+STALE_LOCK_AGE = 30.0
+
+
+def calculate_amounts(total_amount):
+    """Calculate base amount and taxes from total amount"""
+    base_amount = round(total_amount / (1 + 2 * GST_RATE), 2)
+    gst = round(base_amount * GST_RATE, 2)
+    return base_amount, gst
+
+
+class TrackerLock:
+    """Cross-process lock around invoice_tracker.json using an O_EXCL lock file"""
+    def __init__(self, path=TRACKER_FILE, timeout=LOCK_TIMEOUT):
+        self.lock_path = f"{path}.lock"
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_AGE:
+                        logger.warning(f"Removing stale tracker lock: {self.lock_path}")
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {self.lock_path}")
+                time.sleep(0.05)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+        return False
+
+
+def _read_last_invoice_number(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get("last_invoice_number", DEFAULT_LAST_INVOICE_NUMBER)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return DEFAULT_LAST_INVOICE_NUMBER
+
+
+def _replace_json(path, data, **kwargs):
+    """Write data to path through a temp file so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+
+def _write_last_invoice_number(path, number):
+    _replace_json(path, {"last_invoice_number": number})
+
+
+def peek_invoice_number(path=TRACKER_FILE):
+    """Return the next invoice number without reserving it"""
+    return _read_last_invoice_number(path) + 1
+
+
+def commit_invoice_number(number, path=TRACKER_FILE):
+    """Record number as used; never moves the counter backwards"""
+    with TrackerLock(path):
+        last = _read_last_invoice_number(path)
+        _write_last_invoice_number(path, max(last, number))
+
+
+def allocate_invoice_numbers(count, path=TRACKER_FILE):
+    """Atomically reserve count consecutive invoice numbers and return them"""
+    if count <= 0:
+        return []
+    with TrackerLock(path):
+        last = _read_last_invoice_number(path)
+        _write_last_invoice_number(path, last + count)
+    logger.info(f"Allocated invoice numbers {last + 1}-{last + count}")
+    return list(range(last + 1, last + count + 1))
+
+
+# Invoice log 'datetime' formats: the one make_log_entry() writes, then ISO
+LOG_DATETIME_FORMATS = ("%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+
+def parse_log_datetime(value):
+    """Parse an invoice log 'datetime' string; returns None if it is malformed"""
+    for fmt in LOG_DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def make_log_entry(data, pdf_filename, now=None):
+    """Build the invoice_log.json record for generated invoice data"""
+    now = now or datetime.now()
+    return {
+        "filename": pdf_filename,
+        "datetime": now.strftime(LOG_DATETIME_FORMATS[0]),
+        "invoice_num": f"{INVOICE_PREFIX}{data['invoice_num']}",
+        "customer_name": data["name"],
+        "customer_id": data["customer_id"],
+        "amount": data["total_amount"],
+        "status": data["payment_status"],
+        "payment_date": now.strftime("%d-%m-%Y") if data["payment_status"] == "Paid" else "",
+        "payment_method": data["payment_method"]
+    }
+
+
+def append_invoice_logs(entries, path=INVOICE_LOG_FILE):
+    """Append several entries to the invoice log with a single rewrite.
+
+    Raises instead of writing if the existing log cannot be read, so a
+    damaged log is never replaced by the new entries alone.
+    """
+    logs = []
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                logs = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading existing logs from {path}: {str(e)}")
+            raise
+    logs.extend(entries)
+    _replace_json(path, logs, indent=2)
+
+
+def billing_period(period):
+    """Return (first_day, last_day) datetimes for a 'YYYY-MM' period string"""
+    start = datetime.strptime(period, "%Y-%m")
+    last_day = calendar.monthrange(start.year, start.month)[1]
+    return start, start.replace(day=last_day)
+
+
+def pdf_filename_for(name, when):
+    """Invoice file name used by the billing form: <Name>_<Mon>_<YYYY>.pdf"""
+    return f"{name.replace(' ', '_')}_{when.strftime('%b')}_{when.strftime('%Y')}.pdf"
+
+
+def build_invoice_data(customer, period, total_amount, invoice_num, pdf_filename=None,
+                       months="1", payment_status="Unpaid", payment_method=""):
+    """Build the generate_pdf() data dict for a stored customer record"""
+    start, end = billing_period(period)
+    return {
+        "name": customer.get("name", ""),
+        "customer_id": customer.get("customer_id", ""),
+        "tenant_name": customer.get("tenant_name", ""),
+        "customer_address": customer.get("customer_address", ""),
+        "customer_gstin": customer.get("customer_gstin", ""),
+        "billing_from": start.strftime("%d-%m-%Y"),
+        "billing_to": end.strftime("%d-%m-%Y"),
+        "plan": customer.get("plan", ""),
+        "months": months,
+        "total_amount": f"{float(total_amount):.2f}",
+        "discount": "0",
+        "late_fee": "0",
+        "invoice_num": invoice_num,
+        "pdf_filename": pdf_filename or pdf_filename_for(customer.get("name", ""), start),
+        "custom_notes": "",
+        "payment_status": payment_status,
+        "payment_method": payment_method if payment_status == "Paid" else ""
+    }
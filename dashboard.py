@@ -0,0 +1,265 @@
+"""Dashboard loading off the Tk main thread.
+
+load_dashboard() does all the slow work (reading the log, computing the
+metrics, drawing the charts with the Agg backend into PIL images) and is
+safe to run on a worker thread because it never touches Tk or pyplot.
+DashboardCharts keeps the figures alive between refreshes.
+BackgroundLoader runs it on a thread and hands the newest result back to the
+Tk thread by polling a queue with widget.after(); a newer request
+supersedes whatever is still in flight.
+"""
+import logging
+import math
+import queue
+import threading
+
+from analytics import dashboard_metrics, load_invoice_frame
+
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PIL import Image
+    HAS_MPL = True
+except ImportError:
+    HAS_MPL = False
+
+logger = logging.getLogger(__name__)
+
+FIGSIZE = (6, 4)
+
+
+class Superseded(Exception):
+    """Raised inside a job when a newer request has replaced it"""
+
+
+def canvas_image(canvas):
+    """Copy of an Agg canvas' last drawing as a PIL image"""
+    width, height = canvas.get_width_height()
+    return Image.frombuffer("RGBA", (width, height), canvas.buffer_rgba(), "raw", "RGBA", 0, 1).copy()
+
+
+class DashboardCharts:
+    """The dashboard's three figures, built once and updated in place.
+
+    Each chart keeps its Figure, Agg canvas and artists for the life of the
+    view; render() only swaps data into the existing artists (line data, bar
+    heights, wedge angles) and redraws the canvas. close() drops the figures,
+    so memory stays flat however often the dashboard is refreshed.
+    Safe to call from worker threads: renders are serialized by a lock.
+    """
+
+    TITLES = ("Revenue Trend", "Payment Status", "Plan Distribution")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._charts = {}
+        for title, chart_title in zip(self.TITLES, ("Monthly Revenue Trend", "Payment Status Distribution",
+                                                    "Plan Distribution")):
+            fig = Figure(figsize=FIGSIZE)
+            canvas = FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            ax.set_title(chart_title, pad=15)
+            no_data = ax.text(0.5, 0.5, 'No data available',
+                              horizontalalignment='center',
+                              verticalalignment='center',
+                              transform=ax.transAxes, visible=False)
+            self._charts[title] = {"fig": fig, "canvas": canvas, "ax": ax, "no_data": no_data}
+
+        trend = self._charts["Revenue Trend"]
+        trend["line"], = trend["ax"].plot([], [], marker='o', linewidth=2, color='#1976d2')
+        trend["ax"].grid(True, linestyle='--', alpha=0.7)
+        self._charts["Payment Status"].update(wedges=[], labels=[], pcts=[], names=())
+        plans = self._charts["Plan Distribution"]
+        plans.update(bars=None, names=())
+        plans["ax"].grid(True, linestyle='--', alpha=0.7)
+
+    def render(self, metrics, cancelled=lambda: False):
+        """Update every chart from dashboard metrics; returns [(title, PIL image or None, error)]"""
+        updaters = (
+            ("Revenue Trend", self._update_trend, metrics["monthly_revenue"]),
+            ("Payment Status", self._update_status, metrics["status_counts"]),
+            ("Plan Distribution", self._update_plans, metrics["plan_distribution"]),
+        )
+        results = []
+        with self._lock:
+            for title, update, data in updaters:
+                if cancelled():
+                    raise Superseded()
+                chart = self._charts.get(title)
+                if chart is None:  # closed
+                    raise Superseded()
+                try:
+                    update(chart, data)
+                    chart["fig"].tight_layout()
+                    chart["canvas"].draw()
+                    results.append((title, canvas_image(chart["canvas"]), None))
+                except Exception as e:
+                    logger.error(f"Error creating {title} chart: {str(e)}")
+                    results.append((title, None, str(e)))
+        return results
+
+    def close(self):
+        """Release the figures; the object cannot render afterwards"""
+        with self._lock:
+            for chart in self._charts.values():
+                chart["fig"].clear()
+            self._charts = {}
+
+    def _update_trend(self, chart, monthly_revenue):
+        ax = chart["ax"]
+        months = list(monthly_revenue.index)
+        x = list(range(len(months)))
+        chart["line"].set_data(x, monthly_revenue.to_numpy())
+        chart["line"].set_visible(bool(months))
+        chart["no_data"].set_visible(not months)
+        ax.set_xticks(x, months, rotation=45)
+        ax.relim()
+        ax.autoscale_view()
+
+    def _update_status(self, chart, status_counts):
+        ax = chart["ax"]
+        names = tuple(status_counts.keys())
+        values = list(status_counts.values())
+        total = sum(values)
+        if names != chart["names"]:
+            # Different set of statuses: replace the wedges once, then keep updating them
+            for artist in chart["wedges"] + chart["labels"] + chart["pcts"]:
+                artist.remove()
+            wedges, labels, pcts = ax.pie([1] * len(names), labels=names, autopct='%1.1f%%',
+                                          colors=['#4caf50', '#f44336'])
+            chart.update(wedges=list(wedges), labels=list(labels), pcts=list(pcts), names=names)
+
+        theta1 = 0.0
+        for wedge, label, pct, value in zip(chart["wedges"], chart["labels"], chart["pcts"], values):
+            fraction = value / total if total else 0.0
+            theta2 = theta1 + 360.0 * fraction
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+            angle = math.radians((theta1 + theta2) / 2)
+            x, y = math.cos(angle), math.sin(angle)
+            label.set_position((1.1 * x, 1.1 * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            pct.set_position((0.6 * x, 0.6 * y))
+            pct.set_text(f"{fraction * 100:.1f}%")
+            theta1 = theta2
+        for artist in chart["wedges"] + chart["labels"] + chart["pcts"]:
+            artist.set_visible(total > 0)
+        chart["no_data"].set_visible(total == 0)
+
+    def _update_plans(self, chart, plan_counts):
+        ax = chart["ax"]
+        names = tuple(plan_counts.keys())
+        values = list(plan_counts.values())
+        if names != chart["names"]:
+            if chart["bars"] is not None:
+                chart["bars"].remove()
+            chart["bars"] = ax.bar(list(range(len(names))), [0] * len(names), color='#2196f3')
+            ax.set_xticks(list(range(len(names))), names, rotation=45)
+            chart["names"] = names
+        for bar, value in zip(chart["bars"], values):
+            bar.set_height(value)
+        has_data = sum(values) > 0
+        for bar in chart["bars"]:
+            bar.set_visible(has_data)
+        chart["no_data"].set_visible(not has_data)
+        ax.relim()
+        ax.autoscale_view()
+
+
+def load_dashboard(plans=(), charts=None, cancelled=lambda: False):
+    """Compute everything the dashboard shows; safe to call off the Tk thread.
+
+    Returns {"metrics": ..., "charts": [(title, PIL image or None, error)]};
+    charts is a DashboardCharts to update, or None to skip the charts.
+    cancelled() is checked between steps and Superseded raised once it is true.
+    """
+    frame = load_invoice_frame()
+    if cancelled():
+        raise Superseded()
+    metrics = dashboard_metrics(frame, plans=plans)
+    rendered = charts.render(metrics, cancelled) if charts is not None else []
+    return {"metrics": metrics, "charts": rendered}
+
+
+class BackgroundLoader:
+    """Runs job(cancelled) on a worker thread and delivers results on the Tk thread.
+
+    Only the result of the most recent request() reaches on_result (or
+    on_error); older jobs are told to stop via their cancelled() callable and
+    whatever they still produce is dropped.
+    """
+
+    def __init__(self, widget, job, on_result, on_error=None, poll_ms=50):
+        self.widget = widget
+        self.job = job
+        self.on_result = on_result
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self._results = queue.Queue()
+        self._generation = 0
+        self._cancel_event = None
+        self._polling = False
+
+    @property
+    def busy(self):
+        return self._cancel_event is not None
+
+    def request(self):
+        """Start a new load, superseding any in flight"""
+        self.cancel()
+        self._generation += 1
+        self._cancel_event = threading.Event()
+        threading.Thread(
+            target=self._run, args=(self._generation, self._cancel_event),
+            name=f"dashboard-loader-{self._generation}", daemon=True
+        ).start()
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self._cancel_event = None
+
+    def _run(self, generation, cancel_event):
+        try:
+            result = self.job(cancel_event.is_set)
+        except Superseded:
+            logger.debug(f"Dashboard load {generation} superseded")
+            return
+        except Exception as e:
+            self._results.put((generation, None, e))
+            return
+        self._results.put((generation, result, None))
+
+    def _poll(self):
+        try:
+            if not self.widget.winfo_exists():
+                self.cancel()
+                self._polling = False
+                return
+        except Exception:  # the Tk app itself is gone
+            self._polling = False
+            return
+
+        while True:
+            try:
+                generation, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self._generation or self._cancel_event is None:
+                continue  # superseded or cancelled
+            self._cancel_event = None
+            if error is not None:
+                if self.on_error:
+                    self.on_error(error)
+                else:
+                    logger.error(f"Background load failed: {str(error)}")
+            else:
+                self.on_result(result)
+
+        if self.busy:
+            self.widget.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
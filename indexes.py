@@ -0,0 +1,289 @@
+"""In-memory secondary indexes over the invoice log and the customers.
+
+Indexes hold positions into (or references to) records owned by someone
+else (the repositories) and are kept up to date incrementally as records
+are written, so lookups never rescan the whole history.
+"""
+import bisect
+import heapq
+import re
+from datetime import datetime
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_seconds(dt):
+    """Seconds since 1970-01-01 for a naive datetime (no local-time conversion)"""
+    return (dt - EPOCH).total_seconds()
+
+
+class DatetimeIndex:
+    """Record positions sorted by timestamp, for O(log N + k) range lookups.
+
+    Records without a parseable datetime are left out; date filters never
+    match them anyway.
+    """
+
+    def __init__(self, records=()):
+        pairs = sorted((epoch_seconds(r.dt), i) for i, r in enumerate(records) if r.dt is not None)
+        self._keys = [key for key, _ in pairs]
+        self._positions = [position for _, position in pairs]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, position, dt):
+        """Index the record at position; appends in time order are O(1)"""
+        if dt is None:
+            return
+        key = epoch_seconds(dt)
+        if not self._keys or key >= self._keys[-1]:
+            self._keys.append(key)
+            self._positions.append(position)
+        else:
+            i = bisect.bisect_right(self._keys, key)
+            self._keys.insert(i, key)
+            self._positions.insert(i, position)
+
+    def between(self, start=None, end=None):
+        """Positions of records with start <= dt <= end, oldest first"""
+        lo = bisect.bisect_left(self._keys, epoch_seconds(start)) if start else 0
+        hi = bisect.bisect_right(self._keys, epoch_seconds(end)) if end else len(self._keys)
+        return self._positions[lo:hi]
+
+
+def customer_label(customer):
+    """The customer dropdown text: 'Name (customer_id)'"""
+    return f"{customer.get('name', '')} ({customer.get('customer_id', '')})"
+
+
+class CustomerIndex:
+    """Customers keyed by customer_id and by dropdown label.
+
+    by_id keeps the storage order (insertion order of the dict), so
+    customers() and labels() list customers the way the store does; an
+    upsert of an existing id keeps its place.
+    """
+
+    def __init__(self, customers=()):
+        self.by_id = {}
+        self.by_label = {}
+        for customer in customers:
+            self.upsert(customer)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, customer_id):
+        return customer_id in self.by_id
+
+    def get(self, customer_id):
+        return self.by_id.get(customer_id)
+
+    def find_label(self, label):
+        return self.by_label.get(label)
+
+    def customers(self):
+        return list(self.by_id.values())
+
+    def labels(self):
+        return [customer_label(c) for c in self.by_id.values()]
+
+    def upsert(self, customer):
+        customer_id = customer.get("customer_id")
+        old = self.by_id.get(customer_id)
+        if old is not None:
+            self._drop_label(old)
+        self.by_id[customer_id] = customer
+        self.by_label[customer_label(customer)] = customer
+
+    def remove(self, customer_id):
+        """Drop a customer; returns it, or None if it was not indexed"""
+        customer = self.by_id.pop(customer_id, None)
+        if customer is not None:
+            self._drop_label(customer)
+        return customer
+
+    def _drop_label(self, customer):
+        label = customer_label(customer)
+        if self.by_label.get(label) is customer:
+            del self.by_label[label]
+
+
+TOKEN_RE = re.compile(r"\w+")
+FIELD_SEP = "\x1f"
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """Case-insensitive substring search over the text fields of keyed records.
+
+    Each record's lower-cased fields are split into word tokens, and every
+    token lists the keys containing it (token postings). Distinct tokens are
+    in turn indexed by their trigrams, so the tokens containing a query word
+    of 3+ characters are found without scanning the vocabulary. A query's
+    candidates come from its rarest word; each is then checked with a plain
+    substring test on the stored text, so results are exactly those of
+    `query in field.lower()` for some field. Queries made only of 1-2
+    character words fall back to scanning the stored texts.
+
+    Results are ranked: exact field match, field prefix, word prefix, then
+    any substring; ties keep insertion order. Stale postings left by updates
+    and removals are skipped at query time and dropped by an occasional
+    rebuild.
+    """
+
+    def __init__(self, items=()):
+        self._docs = {}       # key -> (seq, FIELD_SEP-framed lower-cased text)
+        self._postings = {}   # token -> [key, ...]
+        self._grams = {}      # trigram -> [token, ...]
+        self._seq = 0
+        self._live = 0        # postings belonging to current texts
+        self._stale = 0       # postings left behind by updates/removals
+        for key, values in items:
+            self.add(key, values)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    @staticmethod
+    def _text(values):
+        return FIELD_SEP + FIELD_SEP.join(str(v).lower() for v in values) + FIELD_SEP
+
+    def add(self, key, values):
+        """Index (or re-index) key with the given field values"""
+        text = self._text(values)
+        old = self._docs.get(key)
+        if old is not None:
+            if old[1] == text:
+                return
+            del self._docs[key]
+            self._forget(old[1])
+            seq = old[0]
+        else:
+            seq = self._seq
+            self._seq += 1
+        self._index(key, seq, text)
+
+    def _index(self, key, seq, text):
+        self._docs[key] = (seq, text)
+        tokens = set(TOKEN_RE.findall(text))
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = []
+                for gram in trigrams(token):
+                    self._grams.setdefault(gram, []).append(token)
+            postings.append(key)
+        self._live += len(tokens)
+
+    def replace(self, old_key, new_key, values):
+        """Swap old_key for new_key (with new values), keeping its place in the ranking ties"""
+        old = self._docs.pop(old_key, None)
+        if old is None:
+            self.add(new_key, values)
+            return
+        self._forget(old[1])
+        self._index(new_key, old[0], self._text(values))
+
+    def remove(self, key):
+        old = self._docs.pop(key, None)
+        if old is not None:
+            self._forget(old[1])
+
+    def _forget(self, text):
+        count = len(set(TOKEN_RE.findall(text)))
+        self._live -= count
+        self._stale += count
+        if self._stale > max(1000, self._live):
+            self._rebuild()
+
+    def _rebuild(self):
+        docs = self._docs
+        self._docs, self._postings, self._grams = {}, {}, {}
+        self._live = self._stale = 0
+        for key, (seq, text) in docs.items():
+            self._index(key, seq, text)
+
+    def _tokens_containing(self, word):
+        """Vocabulary tokens containing word (len(word) >= 3)"""
+        lists = []
+        for gram in trigrams(word):
+            tokens = self._grams.get(gram)
+            if not tokens:
+                return []
+            lists.append(tokens)
+        return [token for token in min(lists, key=len) if word in token]
+
+    def _candidates(self, words):
+        """Keys that may contain every word, or None when only a scan will do"""
+        best = None
+        for word in set(words):
+            if len(word) < 3:
+                continue
+            lists = [self._postings[token] for token in self._tokens_containing(word)]
+            size = sum(len(keys) for keys in lists)
+            if best is None or size < best[0]:
+                best = (size, lists)
+            if size == 0:
+                break
+        if best is None:
+            return None
+        if len(best[1]) == 1:
+            return best[1][0]
+        return [key for keys in best[1] for key in keys]
+
+    def search(self, query, ranked=True, within=None, limit=None):
+        """Keys whose fields contain query (case-insensitive), best matches first.
+
+        within restricts the search to those keys, e.g. the result of a
+        shorter query that this one extends; limit keeps only the best ones.
+        """
+        query = query.lower()
+        if not query:
+            keys = list(self._docs) if within is None else list(within)
+            return keys[:limit] if limit is not None else keys
+        candidates = self._candidates(TOKEN_RE.findall(query)) if within is None else within
+        docs = self._docs
+        if candidates is None:
+            matches = [(key, doc) for key, doc in docs.items() if query in doc[1]]
+        else:
+            seen = set()
+            matches = []
+            for key in candidates:
+                if key in seen:
+                    continue
+                seen.add(key)
+                doc = docs.get(key)
+                if doc is not None and query in doc[1]:
+                    matches.append((key, doc))
+        if not ranked:
+            matches.sort(key=lambda match: match[1][0])
+            return [key for key, _ in matches[:limit]]
+
+        exact = FIELD_SEP + query + FIELD_SEP
+        prefix = FIELD_SEP + query
+        word_start = re.compile(r"(?<!\w)" + re.escape(query))
+
+        def rank(match):
+            text = match[1][1]
+            if exact in text:
+                grade = 0
+            elif prefix in text:
+                grade = 1
+            elif word_start.search(text):
+                grade = 2
+            else:
+                grade = 3
+            return (grade, match[1][0])
+
+        if limit is not None:
+            return [key for key, _ in heapq.nsmallest(limit, matches, key=rank)]
+        matches.sort(key=rank)
+        return [key for key, _ in matches]
@@ -0,0 +1,871 @@
+import os
+import re
+import sys
+import io
+import html
+import logging
+import math
+import threading
+from datetime import datetime
+from xml.sax.saxutils import escape
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.boxstuff import aspectRatioFix
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Table, TableStyle, SimpleDocTemplate, Paragraph, Spacer, Flowable
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.lib.enums import TA_CENTER
+
+from billing import calculate_amounts, INVOICE_PREFIX
+
+logger = logging.getLogger(__name__)
+
+LOGO_PATH = "assets/logo.png"  # Logo path in assets directory
+OUTPUT_DIR = "output_invoices"
+
+# Which renderer render_invoice() uses: "platypus" (layout engine) or "canvas" (fixed coordinates)
+PDF_RENDERER_ENV = "TFN_PDF_RENDERER"
+RENDERERS = ("platypus", "canvas")
+DEFAULT_RENDERER = "platypus"
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_LEFT = MARGIN_RIGHT = MARGIN_TOP = 30
+MARGIN_BOTTOM = 18
+
+LOGO_SIZE = 30*mm           # Header logo box
+LOGO_DPI = 300
+WATERMARK_SIZE = 450        # Watermark box, in points
+WATERMARK_DPI = 100         # Printed at 8% opacity, so less detail is needed
+WATERMARK_ALPHA = 0.08
+
+
+class CachedImage:
+    """A decoded image wrapped once in an ImageReader and drawn with canvas.drawImage().
+
+    Keeping the reader means the file is not reopened and the pixels and
+    alpha mask are not re-extracted for every invoice; reportlab itself
+    embeds a repeated image only once per document.
+    """
+
+    def __init__(self, image):
+        self.reader = ImageReader(image)
+        self.width, self.height = self.reader.getSize()
+        # Extract the pixels now so threads drawing the image only ever read them
+        self.reader.getRGBData()
+
+    def draw(self, canvas, x, y, width, height):
+        """Draw stretched to the given box"""
+        canvas.drawImage(self.reader, x, y, width, height, mask='auto')
+
+
+def _downsampled(image, pixels):
+    """image shrunk to fit pixels x pixels; never enlarged"""
+    import PIL.Image
+
+    if max(image.size) <= pixels:
+        return image
+    image = image.copy()
+    image.thumbnail((pixels, pixels), PIL.Image.LANCZOS)
+    return image
+
+
+class LogoAssets:
+    """The logo validated, decoded and scaled for the header and the watermark.
+
+    Built once per version of the file (see logo_assets()). format is the
+    file's image format, or None when it could not be read; error is None
+    when the logo is usable, otherwise a description of the problem, and
+    then header and watermark are None. When both uses need the same
+    pixels they share one CachedImage.
+    """
+
+    def __init__(self, path, mtime_ns):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.format = None
+        self.error = None
+        self.header = self.watermark = None
+        if mtime_ns is None:
+            self.error = f"Logo file not found at {path}"
+            return
+        try:
+            import PIL.Image
+            with PIL.Image.open(path) as img:
+                self.format = img.format
+                if img.format != 'PNG':
+                    self.error = f"Logo must be in PNG format. Current format: {img.format}"
+                    return
+                image = img.convert('RGBA')
+            header = _downsampled(image, math.ceil(LOGO_SIZE / 72 * LOGO_DPI))
+            watermark = _downsampled(image, math.ceil(WATERMARK_SIZE / 72 * WATERMARK_DPI))
+            self.header = CachedImage(header)
+            self.watermark = self.header if watermark is header else CachedImage(watermark)
+        except Exception as e:
+            self.header = self.watermark = None
+            self.error = f"Error reading logo file: {str(e)}"
+            return
+        logger.debug(f"Logo assets built from {path}: header {header.size}, watermark {watermark.size}")
+
+
+_logo_assets = {}
+_logo_lock = threading.Lock()
+
+
+def logo_assets(logo_path=LOGO_PATH):
+    """The LogoAssets for logo_path, rebuilt only when the file's mtime changes"""
+    try:
+        mtime_ns = os.stat(logo_path).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    with _logo_lock:
+        assets = _logo_assets.get(logo_path)
+        if assets is None or assets.mtime_ns != mtime_ns:
+            assets = _logo_assets[logo_path] = LogoAssets(logo_path, mtime_ns)
+        return assets
+
+
+def validate_logo(logo_path=LOGO_PATH):
+    """Return None if the logo is a readable PNG, otherwise a description of the problem"""
+    return logo_assets(logo_path).error
+
+
+class LogoFlowable(Flowable):
+    """A CachedImage as a fixed-size flowable"""
+
+    def __init__(self, image, width, height):
+        super().__init__()
+        self.image = image
+        self.width = width
+        self.height = height
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.image.draw(self.canv, 0, 0, self.width, self.height)
+
+
+def _text(value):
+    """A data field as paragraph markup: plain text, with &, < and > escaped"""
+    return escape(str(value))
+
+
+def payment_status_line(entry):
+    """Payment status paragraph text for an invoice log entry, or ''"""
+    if not entry:
+        return ""
+    date, method = _text(entry.get('payment_date', '')), _text(entry.get('payment_method', ''))
+    if entry.get('status') == 'Paid':
+        return f"<b>Payment Status:</b> Paid on {date} ({method})"
+    if entry.get('status') == 'Partial':
+        return f"<b>Payment Status:</b> Partial payment on {date} ({method})"
+    return ""
+
+
+def draw_watermark(canvas, doc):
+    image = logo_assets(LOGO_PATH).watermark
+    if image is not None:
+        page_width, page_height = PAGE_WIDTH, PAGE_HEIGHT
+        wm_width, wm_height = WATERMARK_SIZE, WATERMARK_SIZE
+        x = (page_width - wm_width) / 2
+        y = (page_height - wm_height) / 2
+        # Fit the image inside the box, centred, keeping its aspect ratio
+        x, y, width, height, _ = aspectRatioFix(True, 'c', x, y, wm_width, wm_height, image.width, image.height)
+        canvas.saveState()
+        canvas.setFillAlpha(WATERMARK_ALPHA)  # Opacity
+        image.draw(canvas, x, y, width, height)
+        canvas.restoreState()
+
+
+# Static supplier details printed on every invoice
+SUPPLIER_NAME = "THUNDERSTORM FIBERNET"
+SUPPLIER_ADDRESS = "D-2/539, Shiv Durga Vihar, Lakkarpur, Faridabad, HR - 121009"
+SUPPLIER_GSTIN = "06DJVPP9834G1ZD"
+SUPPLIER_PHONE = "8585986890"
+SUPPLIER_EMAIL = "thunderstromfibernet@gmail.com"
+
+TABLE_COL_WIDTHS = [30, 120, 60, 60, 40, 60, 60, 70]
+TABLE_STYLE_COMMANDS = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1976d2')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),  # Header row
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#e3f2fd')),
+    ('ALIGN', (0, 1), (0, 1), 'CENTER'),  # S.No
+    ('ALIGN', (1, 1), (1, 1), 'LEFT'),    # 'Particular' left
+    ('FONTSIZE', (1, 1), (1, 1), 8),      # Make 'Particular' cell smaller
+    ('FONTSIZE', (0, 1), (0, 1), 9),      # S.No
+    ('FONTSIZE', (2, 1), (-1, 1), 9),     # Rest of data row
+    ('ALIGN', (2, 1), (-1, 1), 'CENTER'), # Center rest of data row
+    ('BACKGROUND', (0, 2), (-2, 2), colors.HexColor('#ffe082')),
+    ('SPAN', (1, 2), (6, 2)),
+    ('ALIGN', (1, 2), (6, 2), 'LEFT'),
+    ('ALIGN', (7, 2), (7, 2), 'RIGHT'),
+    ('FONTNAME', (1, 2), (1, 2), 'Helvetica-Bold'),
+    ('FONTNAME', (7, 2), (7, 2), 'Helvetica-Bold'),
+    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('LEFTPADDING', (0,0), (-1,-1), 6),
+    ('RIGHTPADDING', (0,0), (-1,-1), 6),
+    ('TOPPADDING', (0,0), (-1,-1), 4),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 4),
+]
+TITLE_TEXT = "<b>TAX INVOICE</b>"
+SUBTITLE_TEXT = "(Original for recipient)"
+SUPPLIER_NAME_TEXT = f"<b>{SUPPLIER_NAME}</b>"
+SUPPLIER_ADDRESS_TEXT = f"Supplier Address: {SUPPLIER_ADDRESS}"
+# Format contact info with spacing
+SUPPLIER_CONTACT_TEXT = (
+    f"Supplier GSTIN: {SUPPLIER_GSTIN} &nbsp;&nbsp;&nbsp;&nbsp; "
+    f"Phone No: {SUPPLIER_PHONE} &nbsp;&nbsp;&nbsp;&nbsp; "
+    f"Email: {SUPPLIER_EMAIL}"
+)
+FOOTER_TEXT = (
+    "This is a computer generated bill and does not require signature.<br/>"
+    f"For queries and complaints contact: {SUPPLIER_PHONE}"
+)
+
+
+class InvoiceTemplate:
+    """The parts of the invoice that never change, built once and shared.
+
+    Holds the paragraph styles, the item TableStyle and the static header
+    flowables (spacers, title and supplier block) so that rendering an
+    invoice only builds the customer/amount flowables. Flowables are
+    re-wrapped on every build, so sharing them between documents is safe;
+    use one template per thread.
+    """
+
+    def __init__(self, logo_path=LOGO_PATH):
+        self.logo_path = logo_path
+        styles = getSampleStyleSheet()
+        self.normal = styles['Normal']
+        self.centered = ParagraphStyle(
+            name='centered',
+            parent=styles['Normal'],
+            alignment=TA_CENTER,
+            fontSize=16,
+            spaceAfter=6
+        )
+        self.centered_small = ParagraphStyle(
+            name='centered_small',
+            parent=styles['Normal'],
+            alignment=TA_CENTER,
+            fontSize=10,
+            spaceAfter=6
+        )
+        self.table_style = TableStyle(TABLE_STYLE_COMMANDS)
+
+        self.top = [Spacer(1, 30)]
+        self._logo = None  # (LogoAssets, flowable)
+        self.header = [
+            # Add some space after logo
+            Spacer(1, 12),
+            Paragraph(TITLE_TEXT, self.centered),
+            Paragraph(SUBTITLE_TEXT, self.centered_small),
+            Spacer(1, 12),
+            # Company Info
+            Paragraph(SUPPLIER_NAME_TEXT, self.centered),
+            Paragraph(SUPPLIER_ADDRESS_TEXT, self.centered_small),
+            Paragraph(SUPPLIER_CONTACT_TEXT, self.centered_small),
+            Spacer(1, 20),  # Add more space before customer info
+        ]
+        self.gap = Spacer(1, 12)
+        self.footer = Paragraph(FOOTER_TEXT, self.normal)
+
+    @property
+    def logo(self):
+        """The centered 30mm logo flowable, or None when the logo is unusable"""
+        assets = logo_assets(self.logo_path)
+        if self._logo is None or self._logo[0] is not assets:
+            flowable = None
+            if assets.header is not None:
+                flowable = LogoFlowable(assets.header, LOGO_SIZE, LOGO_SIZE)
+                flowable.hAlign = 'CENTER'  # Center align the logo
+            self._logo = (assets, flowable)
+        return self._logo[1]
+
+    def elements(self, data, include_logo=True, status_line=""):
+        """The flowables of one invoice: the shared static ones plus this invoice's own"""
+        elements = list(self.top)
+
+        # Logo and Title
+        logo = self.logo if include_logo else None
+        if logo is not None:
+            elements.append(logo)
+        elements.extend(self.header)
+
+        logger.debug("Adding customer information")
+        # Customer and Invoice Info
+        info_data = [[Paragraph(text, self.normal) for text in customer_info(data)]]
+        elements.append(Table(info_data, colWidths=[250, 250]))
+        elements.append(self.gap)
+
+        logger.debug("Creating invoice table")
+        table = Table(item_rows(data), colWidths=TABLE_COL_WIDTHS)
+        table.setStyle(self.table_style)
+        elements.append(table)
+        elements.append(self.gap)
+
+        logger.debug("Adding notes and payment status")
+        # Custom Notes
+        if data.get('custom_notes'):
+            elements.append(Paragraph(notes_line(data), self.normal))
+
+        if status_line:
+            elements.append(Paragraph(status_line, self.normal))
+
+        # Footer
+        elements.append(self.footer)
+        return elements
+
+
+def customer_info(data):
+    """Markup of the two customer/invoice info cells"""
+    invoice_number = _text(f"{INVOICE_PREFIX}{data['invoice_num']}")
+    return (
+        f"Customer Address: {_text(data['customer_address'])}<br/>"
+        f"Place of Supply: Haryana<br/>"
+        f"Customer GSTIN: {_text(data.get('customer_gstin', ''))}",
+
+        f"Invoice Number: {invoice_number}<br/>"
+        f"Invoice Date: {datetime.now().strftime('%d %b %Y')}<br/>"
+        f"Tenant Name: {_text(data['tenant_name'])}<br/>"
+        f"Customer Id: {_text(data['customer_id'])}<br/>"
+        f"Billing Period: {_text(data['billing_from'])} - {_text(data['billing_to'])}<br/>"
+        f"Months: {_text(data['months'])}",
+    )
+
+
+def notes_line(data):
+    return f"<b>Notes:</b> {_text(data['custom_notes'])}"
+
+
+def item_rows(data):
+    """Rows of the item table (header, plan line, optional discount/late fee, total)"""
+    base_amount, gst = calculate_amounts(float(data['total_amount']))
+    discount = float(data.get('discount', 0) or 0)
+    late_fee = float(data.get('late_fee', 0) or 0)
+    total = float(data['total_amount']) - discount + late_fee
+
+    rows = [
+        ["S.No", "Particular", "HSN/SAC", "Amount", "Rate", "CGST", "SGST", "Total"],
+        ["1", f"{data['plan']} - {data['months']} Month{'s' if data['months'] != '1' else ''}", "998422", f"Rs. {base_amount:.2f}", "9.0%", f"Rs. {gst:.2f}", f"Rs. {gst:.2f}", f"Rs. {float(data['total_amount']):.2f}"],
+    ]
+    if discount:
+        rows.append(["", "Discount", "", "", "", "", "", f"-Rs. {discount:.2f}"])
+    if late_fee:
+        rows.append(["", "Late Fee", "", "", "", "", "", f"+Rs. {late_fee:.2f}"])
+    rows.append(["", "Total Invoice Amount", "", "", "", "", "", f"Rs. {total:.2f}"])
+    return rows
+
+
+_templates = threading.local()
+
+
+def invoice_template():
+    """This thread's InvoiceTemplate, built on first use"""
+    template = getattr(_templates, "template", None)
+    if template is None:
+        logger.debug("Building invoice template")
+        template = _templates.template = InvoiceTemplate()
+    return template
+
+
+def default_renderer():
+    """The renderer named by TFN_PDF_RENDERER, else DEFAULT_RENDERER"""
+    return os.environ.get(PDF_RENDERER_ENV) or DEFAULT_RENDERER
+
+
+def render_invoice_bytes(data, include_logo=True, status_line="", template=None, renderer=None):
+    """The invoice described by data as PDF bytes, rendered in memory.
+
+    This is the Tk-free part of generate_pdf() so it can also run inside
+    batch worker processes, or feed a mail attachment or an archive without
+    touching the disk. renderer is "platypus" or "canvas" and defaults to
+    default_renderer(); template (platypus only) defaults to this thread's
+    shared InvoiceTemplate.
+    """
+    renderer = renderer or default_renderer()
+    if renderer not in RENDERERS:
+        raise ValueError(f"Unknown PDF renderer: {renderer}")
+    buffer = io.BytesIO()
+    if renderer == "canvas":
+        if render_invoice_canvas(data, buffer, include_logo, status_line):
+            return buffer.getvalue()
+        logger.debug(f"Invoice {data['invoice_num']} does not fit one page, using the platypus renderer")
+
+    template = template or invoice_template()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=MARGIN_RIGHT, leftMargin=MARGIN_LEFT,
+                            topMargin=MARGIN_TOP, bottomMargin=MARGIN_BOTTOM)
+    elements = template.elements(data, include_logo, status_line)
+
+    logger.debug("Building final PDF")
+    doc.build(elements, onFirstPage=draw_watermark, onLaterPages=draw_watermark)
+    return buffer.getvalue()
+
+
+def write_pdf(pdf, filename, overwrite=True):
+    """Write PDF bytes to filename, replacing any old file only once the new one is complete.
+
+    With overwrite=False an existing filename raises FileExistsError and is left untouched.
+    """
+    if not overwrite:
+        # Claim the name first; only this empty placeholder is ever replaced below
+        open(filename, "xb").close()
+    tmp_path = f"{filename}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp_path, filename)
+    except Exception:
+        if not overwrite and os.path.exists(filename) and os.path.getsize(filename) == 0:
+            os.remove(filename)
+        raise
+    return filename
+
+
+def render_invoice(data, filename, include_logo=True, status_line="", template=None, renderer=None,
+                   overwrite=True):
+    """Render the invoice described by data to filename (see render_invoice_bytes and write_pdf)"""
+    pdf = render_invoice_bytes(data, include_logo, status_line, template, renderer)
+    return write_pdf(pdf, filename, overwrite)
+
+
+# Fixed-coordinate canvas renderer. The coordinates reproduce the platypus
+# layout above: the frame inside the margins has 6pt padding, Normal text is
+# Helvetica 10 on 12pt leading, and the item table rows are 20pt high.
+FONT = "Helvetica"
+FONT_BOLD = "Helvetica-Bold"
+FONT_SIZE = 10
+LEADING = 12
+# How far Paragraph may squeeze the spaces of a line that is slightly too long
+SPACE_SHRINKAGE = ParagraphStyle.defaults.get('spaceShrinkage', 0)
+FRAME_PADDING = 6
+CONTENT_LEFT = MARGIN_LEFT + FRAME_PADDING
+CONTENT_WIDTH = PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT - 2 * FRAME_PADDING
+CONTENT_TOP = PAGE_HEIGHT - MARGIN_TOP - FRAME_PADDING
+CONTENT_BOTTOM = MARGIN_BOTTOM + FRAME_PADDING
+INFO_COL_WIDTH = 250
+INFO_PADDING = (6, 3)         # Table default cell padding: horizontal, vertical
+INFO_CELL_WIDTH = INFO_COL_WIDTH - 2 * INFO_PADDING[0]
+TABLE_ROW_HEIGHT = 20
+TABLE_PADDING = 6
+TABLE_HEADER_COLOR = colors.HexColor('#1976d2')
+TABLE_ITEM_COLOR = colors.HexColor('#e3f2fd')
+TABLE_TOTAL_COLOR = colors.HexColor('#ffe082')
+
+# (markup, font size, space after) of the centered title and supplier block;
+# None is a 12pt gap
+HEADER_LINES = [
+    (TITLE_TEXT, 16, 6),
+    (SUBTITLE_TEXT, 10, 6),
+    None,
+    (SUPPLIER_NAME_TEXT, 16, 6),
+    (SUPPLIER_ADDRESS_TEXT, 10, 6),
+    (SUPPLIER_CONTACT_TEXT, 10, 6),
+]
+HEADER_TOP_GAP = 30
+HEADER_BOTTOM_GAP = 20
+SECTION_GAP = 12
+
+
+def _runs(markup):
+    """Lines of (text, font) runs from the paragraph markup used here: <b>, <br/> and entities"""
+    lines = [[]]
+    font = FONT
+    for part in re.split(r"(<b>|</b>|<br/>)", markup):
+        if part == "<b>":
+            font = FONT_BOLD
+        elif part == "</b>":
+            font = FONT
+        elif part == "<br/>":
+            lines.append([])
+        elif part:
+            lines[-1].append((html.unescape(part), font))
+    return lines
+
+
+def _merge(words):
+    """Words of (text, font) pieces as one line of [font, text] runs, space separated"""
+    runs = []
+    for j, word in enumerate(words):
+        for k, (text, font) in enumerate(word):
+            if j and not k:
+                text = " " + text
+            if runs and runs[-1][0] == font:
+                runs[-1][1] += text
+            else:
+                runs.append([font, text])
+    return runs
+
+
+def _width(runs, size):
+    return sum(stringWidth(text, font, size) for font, text in runs)
+
+
+def _spaces(runs):
+    """Spaces a Paragraph may squeeze in a line: word gaps plus non-breaking spaces"""
+    return sum(text.count(" ") + text.count("\xa0") for _, text in runs)
+
+
+def _fits(runs, width, size):
+    """Whether a line fits width the way Paragraph decides it: the spaces
+    between words may shrink by spaceShrinkage of a space each"""
+    gaps = sum(text.count(" ") for _, text in runs)
+    return _width(runs, size) <= width + SPACE_SHRINKAGE * stringWidth(" ", FONT, size) * gaps
+
+
+def _wrap(markup, width, size=FONT_SIZE):
+    """Greedy word wrap like Paragraph's: a list of lines, each a list of [font, text] runs"""
+    wrapped = []
+    for runs in _runs(markup):
+        words, word = [], []
+        for text, font in runs:
+            # Only ASCII whitespace separates words; &nbsp; stays part of the text
+            for token in re.findall(r"[^ \t\r\n]+|[ \t\r\n]+", text):
+                if token[0] in " \t\r\n":
+                    if word:
+                        words.append(word)
+                        word = []
+                else:
+                    word.append((token, font))
+        if word:
+            words.append(word)
+        line = _merge(words)
+        if _fits(line, width, size):
+            wrapped.append(line)
+            continue
+        line = []
+        for word in words:
+            if line and not _fits(_merge(line + [word]), width, size):
+                wrapped.append(_merge(line))
+                line = []
+            line.append(word)
+        wrapped.append(_merge(line))
+    return wrapped
+
+
+def _draw_paragraph(canvas, x, top, lines, width, size=FONT_SIZE, center=False):
+    """Draw lines wrapped to width like a Paragraph whose top is at top.
+
+    A line _fits() let run past width has its word spacing squeezed, as
+    Paragraph does. Returns the paragraph height.
+    """
+    text = canvas.beginText()
+    current = None
+    for i, line in enumerate(lines):
+        extra = width - _width(line, size)
+        spaces = _spaces(line)
+        squeeze = extra < -1e-8 and spaces
+        left = x + extra / 2 if center and not squeeze else x
+        text.setTextOrigin(left, top - size - i * LEADING)
+        if squeeze:
+            text.setWordSpace(extra / spaces)
+        for font, chunk in line:
+            if font != current:
+                text.setFont(font, size, LEADING)
+                current = font
+            text.textOut(chunk)
+        if squeeze:
+            text.setWordSpace(0)
+    canvas.drawText(text)
+    return len(lines) * LEADING
+
+
+_header = {}
+
+
+def _header_layout():
+    """HEADER_LINES wrapped once: ([(lines, size, space_after) or None, ...], total height)"""
+    if not _header:
+        layout = [None if line is None else (_wrap(line[0], CONTENT_WIDTH, line[1]), line[1], line[2])
+                  for line in HEADER_LINES]
+        height = sum(SECTION_GAP if line is None else len(line[0]) * LEADING + line[2] for line in layout)
+        _header["layout"] = (layout, height)
+    return _header["layout"]
+
+
+def draw_static_header(canvas, include_logo=True, watermark=True):
+    """Watermark, logo, title and supplier block; returns the y where the customer info starts"""
+    if watermark:
+        draw_watermark(canvas, None)
+    y = CONTENT_TOP - HEADER_TOP_GAP
+    image = logo_assets(LOGO_PATH).header if include_logo else None
+    if image is not None:
+        y -= LOGO_SIZE
+        image.draw(canvas, CONTENT_LEFT + (CONTENT_WIDTH - LOGO_SIZE) / 2, y, LOGO_SIZE, LOGO_SIZE)
+    y -= SECTION_GAP
+    canvas.setFillColor(colors.black)
+    for line in _header_layout()[0]:
+        if line is None:
+            y -= SECTION_GAP
+            continue
+        lines, size, space_after = line
+        y -= _draw_paragraph(canvas, CONTENT_LEFT, y, lines, CONTENT_WIDTH, size, center=True)
+        y -= space_after
+    return y - HEADER_BOTTOM_GAP
+
+
+def _item_cell_style(row, col):
+    """(font, size, color, align) of an item table cell, as TABLE_STYLE_COMMANDS sets it"""
+    if row == 0:
+        return FONT_BOLD, 10, colors.white, 'CENTER'
+    if row == 1:
+        if col == 1:
+            return FONT, 8, colors.black, 'LEFT'
+        return FONT, 9, colors.black, 'CENTER'
+    if row == 2 and col in (1, 7):
+        return FONT_BOLD, 10, colors.black, 'LEFT' if col == 1 else 'RIGHT'
+    return FONT, 10, colors.black, 'LEFT'
+
+
+def _draw_item_table(canvas, top, rows):
+    """The item table centered below top; returns its height"""
+    edges = [0]
+    for width in TABLE_COL_WIDTHS:
+        edges.append(edges[-1] + width)
+    table_width = edges[-1]
+    height = TABLE_ROW_HEIGHT * len(rows)
+    canvas.saveState()
+    canvas.translate(CONTENT_LEFT + (CONTENT_WIDTH - table_width) / 2, top - height)
+
+    def row_bottom(row):
+        return height - (row + 1) * TABLE_ROW_HEIGHT
+
+    for row, color, width in ((0, TABLE_HEADER_COLOR, table_width), (1, TABLE_ITEM_COLOR, table_width),
+                              (2, TABLE_TOTAL_COLOR, edges[-2])):
+        if row < len(rows):
+            canvas.setFillColor(color)
+            canvas.rect(0, row_bottom(row), width, TABLE_ROW_HEIGHT, stroke=0, fill=1)
+
+    text = canvas.beginText()
+    current = None
+    for row, values in enumerate(rows):
+        for col, value in enumerate(values):
+            if not value:
+                continue
+            font, size, color, align = _item_cell_style(row, col)
+            # Row 2's 'Particular' cell spans up to the Total column
+            right = edges[7] if row == 2 and col == 1 else edges[col + 1]
+            if align == 'CENTER':
+                x = (edges[col] + right - stringWidth(value, font, size)) / 2
+            elif align == 'RIGHT':
+                x = right - TABLE_PADDING - stringWidth(value, font, size)
+            else:
+                x = edges[col] + TABLE_PADDING
+            if (font, size, color) != current:
+                text.setFont(font, size, LEADING)
+                text.setFillColor(color)
+                current = (font, size, color)
+            text.setTextOrigin(x, row_bottom(row) + TABLE_ROW_HEIGHT / 2 + LEADING / 2 - size)
+            text.textOut(value)
+    canvas.drawText(text)
+
+    canvas.setLineCap(1)
+    canvas.setLineJoin(1)
+    canvas.setStrokeColor(colors.black)
+    canvas.setLineWidth(1)
+    canvas.rect(0, 0, table_width, height)
+    canvas.setStrokeColor(colors.grey)
+    canvas.setLineWidth(0.5)
+    canvas.rect(0, 0, table_width, height)
+    lines = [(0, row_bottom(row), table_width, row_bottom(row)) for row in range(len(rows) - 1)]
+    for col, x in enumerate(edges[1:-1], start=1):
+        if len(rows) > 2 and 2 <= col <= 6:
+            # Skip the spanned cell of row 2
+            lines.append((x, row_bottom(2) + TABLE_ROW_HEIGHT, x, height))
+            lines.append((x, 0, x, row_bottom(2)))
+        else:
+            lines.append((x, 0, x, height))
+    canvas.lines(lines)
+    canvas.restoreState()
+    return height
+
+
+def _header_bottom(include_logo=True):
+    """The y draw_static_header() returns, without drawing"""
+    y = CONTENT_TOP - HEADER_TOP_GAP - SECTION_GAP - _header_layout()[1] - HEADER_BOTTOM_GAP
+    if include_logo and logo_assets(LOGO_PATH).header is not None:
+        y -= LOGO_SIZE
+    return y
+
+
+def _body(data, status_line=""):
+    """One invoice's own content, wrapped: (info cells, item rows, paragraphs below the table)"""
+    info = [_wrap(text, INFO_CELL_WIDTH) for text in customer_info(data)]
+    paragraphs = [_wrap(notes_line(data), CONTENT_WIDTH)] if data.get('custom_notes') else []
+    if status_line:
+        paragraphs.append(_wrap(status_line, CONTENT_WIDTH))
+    paragraphs.append(_wrap(FOOTER_TEXT, CONTENT_WIDTH))
+    return info, item_rows(data), paragraphs
+
+
+def _info_height(info):
+    return max(len(lines) for lines in info) * LEADING + 2 * INFO_PADDING[1]
+
+
+def _body_height(body):
+    info, rows, paragraphs = body
+    return (_info_height(info) + SECTION_GAP + TABLE_ROW_HEIGHT * len(rows) + SECTION_GAP
+            + sum(len(lines) for lines in paragraphs) * LEADING)
+
+
+def _draw_body(canvas, y, body, new_page=None):
+    """Draw an invoice's own content from y down.
+
+    When the paragraphs after the item table run past the bottom margin
+    they continue, line by line as platypus splits them, at the top of the
+    page that new_page() starts.
+    """
+    info, rows, paragraphs = body
+
+    # Customer and invoice info: two bottom-aligned cells
+    info_height = _info_height(info)
+    table_left = CONTENT_LEFT + (CONTENT_WIDTH - 2 * INFO_COL_WIDTH) / 2
+    bottom = y - info_height + INFO_PADDING[1]
+    canvas.setFillColor(colors.black)
+    for col, lines in enumerate(info):
+        x = table_left + col * INFO_COL_WIDTH + INFO_PADDING[0]
+        _draw_paragraph(canvas, x, bottom + len(lines) * LEADING, lines, INFO_CELL_WIDTH)
+    y -= info_height + SECTION_GAP
+
+    y -= _draw_item_table(canvas, y, rows) + SECTION_GAP
+
+    canvas.setFillColor(colors.black)
+    for lines in paragraphs:
+        while lines:
+            room = int((y - CONTENT_BOTTOM) // LEADING)
+            if room <= 0 and new_page is not None:
+                new_page()
+                canvas.setFillColor(colors.black)
+                y = CONTENT_TOP
+                continue
+            y -= _draw_paragraph(canvas, CONTENT_LEFT, y, lines[:max(room, 1)], CONTENT_WIDTH)
+            lines = lines[max(room, 1):]
+
+
+def render_invoice_canvas(data, filename, include_logo=True, status_line=""):
+    """Draw the invoice straight onto a Canvas at precomputed coordinates.
+
+    filename may also be a binary file object. Produces the same page as the platypus renderer several times faster.
+    Returns False, writing nothing, when the text would not fit one page
+    (very long notes or addresses); render_invoice_bytes() then falls back to
+    platypus, which flows onto a second page.
+    """
+    body = _body(data, status_line)
+    if _header_bottom(include_logo) - _body_height(body) < CONTENT_BOTTOM:
+        return False
+
+    canvas = Canvas(filename, pagesize=A4)
+    y = draw_static_header(canvas, include_logo)
+    _draw_body(canvas, y, body)
+    canvas.showPage()
+    canvas.save()
+    return True
+
+
+HEADER_FORM = "invoiceHeader"
+
+
+def render_invoice_book(invoices, filename, include_logo=True):
+    """Render many invoices into one print-ready PDF, each starting on a new page.
+
+    invoices yields (data, status_line) pairs; filename may also be a
+    binary file object. The logo, title and supplier
+    block are drawn once into a form XObject that every invoice page
+    references, so each extra invoice only adds its own text and item table.
+    The watermark stays on the page, because reportlab does not give form
+    XObjects the graphics state its transparency needs, but its image is
+    still embedded once. Notes too long for the first page continue on
+    pages carrying just the watermark.
+
+    An invoice that cannot be laid out (bad data, or info and item table
+    too long for a page) is left out; returns those as (data, error) pairs.
+    """
+    canvas = Canvas(filename, pagesize=A4)
+    canvas.beginForm(HEADER_FORM)
+    top = draw_static_header(canvas, include_logo, watermark=False)
+    canvas.endForm()
+
+    def new_page():
+        canvas.showPage()
+        draw_watermark(canvas, None)
+
+    skipped = []
+    for data, status_line in invoices:
+        try:
+            body = _body(data, status_line)
+            info, rows, _ = body
+            if top - _info_height(info) - SECTION_GAP - TABLE_ROW_HEIGHT * len(rows) < CONTENT_BOTTOM:
+                raise ValueError("customer info and items do not fit on a page")
+        except Exception as e:
+            skipped.append((data, f"{type(e).__name__}: {e}"))
+            continue
+        draw_watermark(canvas, None)
+        canvas.doForm(HEADER_FORM)
+        _draw_body(canvas, top, body, new_page)
+        canvas.showPage()
+    canvas.save()
+    return skipped
+
+
+SAMPLE_INVOICE = {
+    "invoice_num": "2059", "customer_id": "C001", "customer_address": "H-12, Sector 21, Faridabad",
+    "customer_gstin": "", "tenant_name": "Sample Tenant", "billing_from": "01-06-2025",
+    "billing_to": "30-06-2025", "months": "1", "plan": "100 Mbps", "total_amount": "1180",
+    "discount": "50", "late_fee": "0", "custom_notes": "Thank you for your business",
+}
+
+
+def benchmark(count=200, output_dir=None, fresh_template=False, include_logo=None, renderer="platypus"):
+    """Average seconds per render_invoice() call over count invoices.
+
+    fresh_template=True builds a new InvoiceTemplate for every invoice,
+    which is what every render used to cost.
+    """
+    import tempfile
+    import time
+
+    if include_logo is None:
+        include_logo = validate_logo() is None
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = output_dir or tmp
+        filename = os.path.join(output_dir, "bench.pdf")
+        render_invoice(SAMPLE_INVOICE, filename, include_logo, renderer=renderer)  # warm up imports and fonts
+        started = time.perf_counter()
+        for _ in range(count):
+            template = InvoiceTemplate() if fresh_template else None
+            render_invoice(SAMPLE_INVOICE, filename, include_logo, template=template, renderer=renderer)
+        return (time.perf_counter() - started) / count
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Invoice PDF tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Measure per-invoice render time")
+    bench.add_argument("-n", "--count", type=int, default=200)
+    bench.add_argument("--no-logo", action="store_true", help="Render without the logo")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        include_logo = False if args.no_logo else None
+        rebuilt = benchmark(args.count, fresh_template=True, include_logo=include_logo)
+        shared = benchmark(args.count, include_logo=include_logo)
+        direct = benchmark(args.count, include_logo=include_logo, renderer="canvas")
+        print(f"template rebuilt per invoice: {rebuilt * 1000:.2f} ms/invoice")
+        print(f"shared template:              {shared * 1000:.2f} ms/invoice ({rebuilt / shared:.2f}x)")
+        print(f"canvas renderer:              {direct * 1000:.2f} ms/invoice ({rebuilt / direct:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
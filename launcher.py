@@ -1,6 +1,9 @@
 import os
 import sys
+import json
 import subprocess
+import importlib.util
+import importlib.metadata
 import tkinter as tk
 from tkinter import messagebox
 import time
@@ -19,6 +22,75 @@ logging.basicConfig(
 warnings.filterwarnings('ignore', category=UserWarning, module='pkg_resources')
 warnings.filterwarnings('ignore', category=DeprecationWarning)
 
+# Import name -> distribution name of the packages main needs
+REQUIRED_PACKAGES = {
+    "reportlab": "reportlab",
+    "ttkbootstrap": "ttkbootstrap",
+    "pandas": "pandas",
+    "matplotlib": "matplotlib",
+    "PIL": "Pillow",
+}
+DEPS_STAMP_FILE = ".deps_stamp.json"
+
+def interpreter_key():
+    """What a dependency probe result depends on: the interpreter and its site-packages.
+
+    Installing, upgrading or removing a package changes the mtime of the
+    site-packages directory it lives in, so the key changes with the
+    package versions without having to look any of them up.
+    """
+    site_dirs = {}
+    for path in sys.path:
+        if os.path.basename(path) in ("site-packages", "dist-packages"):
+            try:
+                site_dirs[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+    return {"executable": sys.executable, "version": sys.version, "site_dirs": site_dirs}
+
+def probe_dependencies():
+    """Check the required packages without importing them.
+
+    Returns (missing import names, {distribution: version}).
+    """
+    missing = []
+    versions = {}
+    for module, dist in REQUIRED_PACKAGES.items():
+        if importlib.util.find_spec(module) is None:
+            missing.append(module)
+            continue
+        try:
+            versions[dist] = importlib.metadata.version(dist)
+        except importlib.metadata.PackageNotFoundError:
+            versions[dist] = "unknown"
+    return missing, versions
+
+def dependencies_ok(stamp_file=DEPS_STAMP_FILE):
+    """True when every required package is present; skips the probe if a stamp says so"""
+    if getattr(sys, 'frozen', False):
+        return True  # bundled with the executable
+    key = interpreter_key()
+    try:
+        with open(stamp_file) as f:
+            if json.load(f).get("key") == key:
+                logging.info("Dependency check skipped (stamp is current)")
+                return True
+    except (OSError, ValueError):
+        pass
+
+    started = time.perf_counter()
+    missing, versions = probe_dependencies()
+    logging.info(f"Dependency probe took {time.perf_counter() - started:.3f}s: {versions}")
+    if missing:
+        logging.warning(f"Missing packages: {', '.join(missing)}")
+        return False
+    try:
+        with open(stamp_file, 'w') as f:
+            json.dump({"key": key, "packages": versions}, f, indent=2)
+    except OSError as e:
+        logging.warning(f"Could not write {stamp_file}: {str(e)}")
+    return True
+
 def show_error_dialog(title, message):
     """Show error in both GUI and log"""
     logging.error(f"{title}: {message}")
@@ -154,18 +226,16 @@ def main():
     if not initialize_directories():
         return
         
-    # Check if requirements are installed
-    try:
-        import reportlab
-        import ttkbootstrap
-        import pandas
-        import matplotlib
-        import PIL
+    # Check if requirements are installed (without importing them; main does that once)
+    if dependencies_ok():
         logging.info("All required packages are installed")
-    except ImportError as e:
-        logging.warning(f"Missing package: {str(e)}")
+    else:
         if not install_requirements():
             return
+        importlib.invalidate_caches()
+        if not dependencies_ok():
+            show_error_dialog("Error", "Required packages are still missing after installation.")
+            return
 
     # Import and run the main application
     try:
@@ -1,41 +1,33 @@
 import os
 import json
+import time
+import threading
+import importlib
 from datetime import datetime, timedelta
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.utils import ImageReader
 import tkinter as tk
 from tkinter import messagebox, Toplevel, Listbox, Scrollbar, RIGHT, Y, END, filedialog
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from ttkbootstrap.dialogs import Querybox, DatePickerDialog
-from reportlab.platypus import Table, TableStyle, SimpleDocTemplate, Paragraph, Spacer, Image, Flowable
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import mm, inch
-from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.styles import ParagraphStyle
-import smtplib
-from email.message import EmailMessage
-import csv
-import zipfile
-import pandas as pd
+# PIL is already loaded by ttkbootstrap, so these cost nothing
 import PIL.Image
+from PIL import ImageTk
 import logging
 import sys
 import traceback
+# pandas, matplotlib (dashboard) and reportlab (invoice_pdf) are imported where
+# they are used, and pre-warmed by preload_modules() while the login window is up
+from billing import make_log_entry
+from storage import get_storage
+from repository import get_invoice_repository, get_customer_repository
+from widgets import (VirtualTreeview, dmy_datetime_sort_key, LogTailer, follow_log, DebouncedSearch,
+                     TypeaheadEntry, PeriodicTask, LazyTabs)
+from indexes import customer_label
 
 # Define debug log file path
 DEBUG_LOG_FILE = os.path.join("logs", "tfn_billing_debug.log")
-
-# Check if matplotlib is available
-try:
-    import matplotlib.pyplot as plt
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    HAS_MPL = True
-except ImportError:
-    HAS_MPL = False
-    logging.warning("Matplotlib not available. Dashboard visualizations will be disabled.")
+TFN_LOG_MAX_LINES = 5000  # lines kept in the TFN Logs tab
+PRELOAD_MODULES = ("pandas", "invoice_pdf", "dashboard")  # imported in the background during login
 
 # Create logs directory if it doesn't exist
 os.makedirs('logs', exist_ok=True)
@@ -87,12 +79,11 @@ def show_error_message(title, message, error=None):
 # Add debug logging to PDF generation
 @log_function_entry_exit
 def generate_pdf(data):
-    """Generate PDF invoice with debug logging"""
+    """Generate PDF invoice with debug logging; returns the PDF bytes, also saved to output_invoices"""
     try:
         logger.info(f"Starting PDF generation for invoice {data['invoice_num']}")
         logger.debug(f"PDF data: {json.dumps(data, indent=2)}")
         
-        invoice_number = f"TF/25-26/HR/{data['invoice_num']}"
         filename = f"output_invoices/{data['pdf_filename']}"
         
         logger.debug(f"Creating PDF: {filename}")
@@ -100,182 +91,21 @@ def generate_pdf(data):
         
         # Create output directory if it doesn't exist
         os.makedirs('output_invoices', exist_ok=True)
-        
-        doc = SimpleDocTemplate(filename, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-        elements = []
-        styles = getSampleStyleSheet()
-        styleN = styles['Normal']
-        styleH = styles['Heading1']
-
-        logger.debug("Creating PDF styles")
-        # Create centered styles
-        centered = ParagraphStyle(
-            name='centered',
-            parent=styles['Normal'],
-            alignment=TA_CENTER,
-            fontSize=16,
-            spaceAfter=6
-        )
-        centered_small = ParagraphStyle(
-            name='centered_small',
-            parent=styles['Normal'],
-            alignment=TA_CENTER,
-            fontSize=10,
-            spaceAfter=6
-        )
 
-        # Add some space at the top
-        elements.append(Spacer(1, 30))
-
-        logger.debug("Adding logo")
-        # Logo and Title
-        if check_logo():
-            try:
-                # Center the logo
-                logo = Image(LOGO_PATH, width=30*mm, height=30*mm)
-                logo.hAlign = 'CENTER'  # Center align the logo
-                elements.append(logo)
-                logger.debug("Logo added successfully")
-            except Exception as e:
-                logger.error(f"Error adding logo: {str(e)}")
-                messagebox.showwarning(
-                    "Logo Error",
-                    "Could not add logo to invoice. The invoice will be generated without the logo."
-                )
-
-        # Add some space after logo
-        elements.append(Spacer(1, 12))
-        
-        logger.debug("Adding header information")
-        elements.append(Paragraph("<b>TAX INVOICE</b>", centered))
-        elements.append(Paragraph("(Original for recipient)", centered_small))
-        elements.append(Spacer(1, 12))
-
-        # Company Info
-        elements.append(Paragraph("<b>THUNDERSTORM FIBERNET</b>", centered))
-        elements.append(Paragraph(
-            "Supplier Address: D-2/539, Shiv Durga Vihar, Lakkarpur, Faridabad, HR - 121009",
-            centered_small
-        ))
-        
-        # Format contact info with spacing
-        contact_info = (
-            f"Supplier GSTIN: 06DJVPP9834G1ZD &nbsp;&nbsp;&nbsp;&nbsp; "
-            f"Phone No: 8585986890 &nbsp;&nbsp;&nbsp;&nbsp; "
-            f"Email: thunderstromfibernet@gmail.com"
-        )
-        elements.append(Paragraph(contact_info, centered_small))
-        elements.append(Spacer(1, 20))  # Add more space before customer info
-
-        logger.debug("Adding customer information")
-        # Customer and Invoice Info
-        info_data = [
-            [
-                Paragraph(
-                    f"Customer Address: {data['customer_address']}<br/>"
-                    f"Place of Supply: Haryana<br/>"
-                    f"Customer GSTIN: {data.get('customer_gstin', '')}",
-                    styleN
-                ),
-                Paragraph(
-                    f"Invoice Number: {invoice_number}<br/>"
-                    f"Invoice Date: {datetime.now().strftime('%d %b %Y')}<br/>"
-                    f"Tenant Name: {data['tenant_name']}<br/>"
-                    f"Customer Id: {data['customer_id']}<br/>"
-                    f"Billing Period: {data['billing_from']} - {data['billing_to']}<br/>"
-                    f"Months: {data['months']}",
-                    styleN
-                )
-            ]
-        ]
-        info_table = Table(info_data, colWidths=[250, 250])
-        elements.append(info_table)
-        elements.append(Spacer(1, 12))
-
-        logger.debug("Calculating amounts")
-        # Table Data
-        base_amount, gst = calculate_amounts(float(data['total_amount']))
-        discount = float(data.get('discount', 0) or 0)
-        late_fee = float(data.get('late_fee', 0) or 0)
-        total = float(data['total_amount']) - discount + late_fee
-
-        logger.debug("Creating invoice table")
-        table_data = [
-            ["S.No", "Particular", "HSN/SAC", "Amount", "Rate", "CGST", "SGST", "Total"],
-            ["1", f"{data['plan']} - {data['months']} Month{'s' if data['months'] != '1' else ''}", "998422", f"Rs. {base_amount:.2f}", "9.0%", f"Rs. {gst:.2f}", f"Rs. {gst:.2f}", f"Rs. {float(data['total_amount']):.2f}"],
-        ]
-        if discount:
-            table_data.append(["", "Discount", "", "", "", "", "", f"-Rs. {discount:.2f}"])
-        if late_fee:
-            table_data.append(["", "Late Fee", "", "", "", "", "", f"+Rs. {late_fee:.2f}"])
-        table_data.append(["", "Total Invoice Amount", "", "", "", "", "", f"Rs. {total:.2f}"])
-        
-        table = Table(table_data, colWidths=[30, 120, 60, 60, 40, 60, 60, 70])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1976d2')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),  # Header row
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#e3f2fd')),
-            ('ALIGN', (0, 1), (0, 1), 'CENTER'),  # S.No
-            ('ALIGN', (1, 1), (1, 1), 'LEFT'),    # 'Particular' left
-            ('FONTSIZE', (1, 1), (1, 1), 8),      # Make 'Particular' cell smaller
-            ('FONTSIZE', (0, 1), (0, 1), 9),      # S.No
-            ('FONTSIZE', (2, 1), (-1, 1), 9),     # Rest of data row
-            ('ALIGN', (2, 1), (-1, 1), 'CENTER'), # Center rest of data row
-            ('BACKGROUND', (0, 2), (-2, 2), colors.HexColor('#ffe082')),
-            ('SPAN', (1, 2), (6, 2)),
-            ('ALIGN', (1, 2), (6, 2), 'LEFT'),
-            ('ALIGN', (7, 2), (7, 2), 'RIGHT'),
-            ('FONTNAME', (1, 2), (1, 2), 'Helvetica-Bold'),
-            ('FONTNAME', (7, 2), (7, 2), 'Helvetica-Bold'),
-            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0,0), (-1,-1), 6),
-            ('RIGHTPADDING', (0,0), (-1,-1), 6),
-            ('TOPPADDING', (0,0), (-1,-1), 4),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 4),
-        ]))
-        elements.append(table)
-        elements.append(Spacer(1, 12))
-
-        logger.debug("Adding notes and payment status")
-        # Custom Notes
-        if data.get('custom_notes'):
-            elements.append(Paragraph(f"<b>Notes:</b> {data['custom_notes']}", styleN))
+        from invoice_pdf import render_invoice_bytes, write_pdf, payment_status_line
 
         # Show payment status if paid
         log_status = ""
-        if os.path.exists(INVOICE_LOG_FILE):
-            try:
-                with open(INVOICE_LOG_FILE, 'r') as f:
-                    logs = json.load(f)
-                for entry in logs:
-                    if entry['filename'] == data['pdf_filename']:
-                        if entry.get('status') == 'Paid':
-                            log_status = f"<b>Payment Status:</b> Paid on {entry.get('payment_date', '')} ({entry.get('payment_method', '')})"
-                        elif entry.get('status') == 'Partial':
-                            log_status = f"<b>Payment Status:</b> Partial payment on {entry.get('payment_date', '')} ({entry.get('payment_method', '')})"
-                        break
-            except Exception as e:
-                logger.error(f"Error reading payment status: {str(e)}")
-        if log_status:
-            elements.append(Paragraph(log_status, styleN))
-
-        # Footer
-        elements.append(Paragraph(
-            "This is a computer generated bill and does not require signature.<br/>"
-            "For queries and complaints contact: 8585986890",
-            styleN
-        ))
+        try:
+            log_status = payment_status_line(get_invoice_repository().find(filename=data['pdf_filename']))
+        except Exception as e:
+            logger.error(f"Error reading payment status: {str(e)}")
 
         logger.debug("Building final PDF")
-        doc.build(elements, onFirstPage=draw_watermark, onLaterPages=draw_watermark)
-        logger.info(f"PDF generation completed successfully: {filename}")
-        return True
+        pdf = render_invoice_bytes(data, include_logo=check_logo(), status_line=log_status)
+        write_pdf(pdf, filename)
+        logger.info(f"PDF generation completed successfully: {filename} ({len(pdf)} bytes)")
+        return pdf
         
     except Exception as e:
         logger.error(f"PDF generation failed: {str(e)}\n{traceback.format_exc()}")
@@ -286,15 +116,10 @@ def generate_pdf(data):
 def load_customers():
     """Load customer database with debug logging"""
     try:
-        logger.debug(f"Loading customers from: {CUSTOMERS_FILE}")
-        if os.path.exists(CUSTOMERS_FILE):
-            with open(CUSTOMERS_FILE, 'r') as f:
-                customers = json.load(f)
-                logger.debug(f"Loaded {len(customers)} customers")
-                return customers
-        else:
-            logger.warning(f"Customers file not found: {CUSTOMERS_FILE}")
-            return []
+        logger.debug(f"Loading customers from {get_storage().name} storage")
+        customers = get_customer_repository().customers()
+        logger.debug(f"Loaded {len(customers)} customers")
+        return customers
     except Exception as e:
         logger.error(f"Error loading customers: {str(e)}\n{traceback.format_exc()}")
         return []
@@ -304,21 +129,9 @@ def save_customer(data):
     """Save customer data with debug logging"""
     try:
         logger.debug(f"Saving customer: {json.dumps(data, indent=2)}")
-        customers = load_customers()
-        exists = False
-        for i, cust in enumerate(customers):
-            if cust['customer_id'] == data['customer_id']:
-                customers[i] = data
-                exists = True
-                logger.debug(f"Updated existing customer: {data['customer_id']}")
-                break
-        if not exists:
-            customers.append(data)
-            logger.debug(f"Added new customer: {data['customer_id']}")
-        
-        with open(CUSTOMERS_FILE, 'w') as f:
-            json.dump(customers, f, indent=2)
-            logger.info(f"Successfully saved customer data: {data['customer_id']}")
+        get_customer_repository().upsert(data)
+        refresh_customer_dropdown()
+        logger.info(f"Successfully saved customer data: {data['customer_id']}")
     except Exception as e:
         logger.error(f"Error saving customer: {str(e)}\n{traceback.format_exc()}")
         raise
@@ -327,41 +140,41 @@ def save_customer(data):
 def check_logo():
     """Check if logo exists and is valid"""
     logger.debug("Checking logo file")
-    if not os.path.exists(LOGO_PATH):
+    from invoice_pdf import logo_assets
+
+    # Validated once per version of the file; the same decoded logo is drawn into every PDF
+    assets = logo_assets(LOGO_PATH)
+    if assets.error is None:
+        logger.debug("Logo file verified successfully")
+        return True
+    if assets.mtime_ns is None:
         logger.warning(f"Logo file not found at {LOGO_PATH}")
         messagebox.showwarning(
             "Logo Missing",
             f"Logo file not found at {LOGO_PATH}\n\n"
             "Please add your logo file in PNG format to continue using logo features."
         )
-        return False
-    
-    try:
-        # Try to open and verify the image
-        with PIL.Image.open(LOGO_PATH) as img:
-            if img.format != 'PNG':
-                logger.warning(f"Invalid logo format: {img.format}")
-                messagebox.showwarning(
-                    "Invalid Logo Format",
-                    f"Logo must be in PNG format. Current format: {img.format}\n\n"
-                    "Please provide a PNG image file."
-                )
-                return False
-            logger.debug("Logo file verified successfully")
-            return True
-    except Exception as e:
-        logger.error(f"Error reading logo file: {str(e)}")
+    elif assets.format not in (None, 'PNG'):
+        logger.warning(f"Invalid logo format: {assets.format}")
+        messagebox.showwarning(
+            "Invalid Logo Format",
+            f"Logo must be in PNG format. Current format: {assets.format}\n\n"
+            "Please provide a PNG image file."
+        )
+    else:
+        logger.error(assets.error)
         messagebox.showerror(
             "Invalid Logo File",
-            f"Error reading logo file: {str(e)}\n\n"
+            f"{assets.error}\n\n"
             "Please ensure the file is a valid PNG image."
         )
-        return False
+    return False
 
 # Initialize global variables
 app = None  # Main application window
 fields = {}  # Dictionary to store form fields
-customer_dropdown = None  # Global reference to customer dropdown
+customer_dropdown = None  # Global reference to customer dropdown (a TypeaheadEntry)
+CUSTOMER_PICKER_LIMIT = 20  # matches listed by the customer picker
 dark_mode = True  # Track theme state
 notes_frame = None  # Global reference to notes frame
 logs_frame = None  # Global reference to logs frame
@@ -371,6 +184,10 @@ payment_method_var = None
 form_canvas = None  # Global reference to form canvas
 customers_tree = None  # Global reference to customers tree
 dashboard_frame = None  # Global reference to dashboard frame
+main_tabs = None  # LazyTabs over the main notebook
+dashboard_loader = None  # Background loader feeding the dashboard view
+dashboard_charts = None  # Persistent dashboard figures (see dashboard.DashboardCharts)
+tfn_log_tailer = LogTailer(DEBUG_LOG_FILE)  # Byte position of the TFN Logs tab in the debug log
 tfn_logs_frame = None  # Global reference to TFN logs frame
 tfn_logs_text = None  # Global reference to TFN logs text widget
 
@@ -392,7 +209,6 @@ pending_amount = None
 # Constants and configurations
 LOGO_PATH = "assets/logo.png"  # Logo path in assets directory
 ICO_PATH = "assets/logo.ico"  # Icon path in assets directory
-GST_RATE = 0.09  # 9% GST
 PLANS = [
     "100 MBPS UNL",
     "200 MBPS UNL",
@@ -402,10 +218,6 @@ PLANS = [
 ]
 
 # File paths
-TRACKER_FILE = "invoice_tracker.json"
-INVOICE_LOG_FILE = "invoice_log.json"
-CUSTOMERS_FILE = "customers.json"
-USERS_FILE = "users.json"
 DEBUG_LOG_FILE = os.path.join("logs", "tfn_billing_debug.log")  # Debug log file path
 current_user = {"username": None, "role": None}
 
@@ -461,6 +273,8 @@ def start_application():
         # Show login window
         logging.info("Showing login window")
         login_window()
+        # Warm up the heavy imports while the user types their credentials
+        app.after_idle(preload_modules)
         
         # Start main event loop
         logging.info("Starting main event loop")
@@ -472,70 +286,22 @@ def start_application():
                      f"Files in directory: {os.listdir()}")
         messagebox.showerror("Error", f"Error starting application: {str(e)}")
 
-def initialize_tracker():
-    """Initialize the tracker file with default values if it doesn't exist"""
-    if not os.path.exists(TRACKER_FILE):
-        with open(TRACKER_FILE, 'w') as f:
-            json.dump({"last_invoice_number": 2058}, f)
+def preload_modules(modules=PRELOAD_MODULES):
+    """Import the heavy modules on a background thread so their first use is instant"""
+    def run():
+        for name in modules:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+                logger.debug(f"Preloaded {name} in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                logger.warning(f"Preloading {name} failed: {str(e)}")
 
-def load_invoice_number():
-    """Load the last invoice number and return the next number"""
-    initialize_tracker()
-    try:
-        with open(TRACKER_FILE) as f:
-            data = json.load(f)
-            return data.get("last_invoice_number", 2058) + 1
-    except (json.JSONDecodeError, FileNotFoundError):
-        return 2059
-
-def save_invoice_number(number):
-    """Save the current invoice number"""
-    with open(TRACKER_FILE, 'w') as f:
-        json.dump({"last_invoice_number": number}, f)
-
-def calculate_amounts(total_amount):
-    """Calculate base amount and taxes from total amount"""
-    base_amount = round(total_amount / (1 + 2 * GST_RATE), 2)
-    gst = round(base_amount * GST_RATE, 2)
-    return base_amount, gst
-
-class Watermark(Flowable):
-    """Custom flowable for watermark"""
-    def __init__(self, logo_path, width=100, height=100, opacity=0.1):
-        Flowable.__init__(self)
-        self.logo_path = logo_path
-        self.width = width
-        self.height = height
-        self.opacity = opacity
-
-    def draw(self):
-        # Create watermark
-        if os.path.exists(self.logo_path):
-            self.canv.saveState()
-            self.canv.setFillAlpha(self.opacity)
-            
-            # Get page dimensions
-            page_width, page_height = A4
-            
-            # Calculate center position - adjust y position to be more centered in the content area
-            # Move up by 20% of page height to account for header space
-            x = (page_width - self.width) / 2
-            y = (page_height - self.height) / 2 + (page_height * 0.1)  # Move up by 10% of page height
-            
-            self.canv.translate(x, y)
-            self.canv.drawImage(self.logo_path, 0, 0, self.width, self.height)
-            self.canv.restoreState()
+    threading.Thread(target=run, name="preload-modules", daemon=True).start()
 
 def load_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Create a default admin user if file doesn't exist
-        users = [{"username": "admin", "password": "admin", "role": "admin"}]
-        with open(USERS_FILE, 'w') as f:
-            json.dump(users, f, indent=2)
-        return users
+    # Creates the default admin user if none exist
+    return get_storage().load_users()
 
 @log_function_entry_exit
 def autofill_customer_data(event=None):
@@ -545,16 +311,24 @@ def autofill_customer_data(event=None):
     if not selected:
         logger.debug("No customer selected, skipping autofill")
         return
-    customers = load_customers()
-    for cust in customers:
-        if f"{cust['name']} ({cust['customer_id']})" == selected:
-            logger.info(f"Autofilling data for customer: {cust['customer_id']}")
-            for field in ['Name', 'Customer ID', 'Tenant Name', 'Customer Address', 'Customer GSTIN', 'Email']:
-                if field.lower().replace(' ', '_') in cust:
-                    fields[field].delete(0, tk.END)
-                    fields[field].insert(0, cust[field.lower().replace(' ', '_')])
-            logger.debug("Customer data autofill completed")
-            break
+    cust = get_customer_repository().find_label(selected)
+    if cust is None:
+        logger.debug(f"No customer matches {selected!r}, skipping autofill")
+        return
+    logger.info(f"Autofilling data for customer: {cust['customer_id']}")
+    for field in ['Name', 'Customer ID', 'Tenant Name', 'Customer Address', 'Customer GSTIN', 'Email']:
+        if field.lower().replace(' ', '_') in cust:
+            fields[field].delete(0, tk.END)
+            fields[field].insert(0, cust[field.lower().replace(' ', '_')])
+    logger.debug("Customer data autofill completed")
+
+def refresh_customer_dropdown():
+    """Bring an open customer picker list up to date after a customer change"""
+    if customer_dropdown is not None:
+        try:
+            customer_dropdown.refresh()
+        except tk.TclError:  # the invoice form has been torn down
+            pass
 
 @log_function_entry_exit
 def toggle_theme():
@@ -593,6 +367,17 @@ def update_canvas_color(e=None):
     except:
         pass
 
+def log_tree_values(log):
+    """Row values for an invoice log record in the Logs treeview"""
+    return (
+        log.get("datetime", ""),
+        log.get("invoice_num", ""),
+        log.get("customer_name", ""),
+        f"₹{log.get('amount', '0')}",
+        log.get("status", "Unpaid"),
+        log.get("payment_method", "")
+    )
+
 def create_logs_view():
     """Create the logs view with filtering and export capabilities"""
     global logs_tree, total_invoices, total_amount, paid_amount, pending_amount
@@ -629,7 +414,9 @@ def create_logs_view():
 
     # Add logs table with fixed column widths
     columns = ("Date", "Invoice No", "Customer", "Amount", "Status", "Payment Method")
-    logs_tree = ttk.Treeview(logs_container, columns=columns, show="headings", style="Treeview")
+    # Only the rows in view are materialized; the filtered result stays in Python
+    logs_tree = VirtualTreeview(logs_container, columns, style="Treeview",
+                                sort_keys={0: dmy_datetime_sort_key})
     
     # Configure columns with specific widths and alignments
     logs_tree.heading("Date", text="Date", anchor="w")
@@ -646,100 +433,79 @@ def create_logs_view():
     logs_tree.column("Status", width=100, anchor="center")
     logs_tree.column("Payment Method", width=120, anchor="center")
 
-    # Add scrollbar
-    scrollbar = ttk.Scrollbar(logs_container, orient="vertical", command=logs_tree.yview)
-    logs_tree.configure(yscrollcommand=scrollbar.set)
-
-    # Pack elements
+    # Pack elements (the virtual tree brings its own vertical scrollbar)
     logs_tree.pack(side="left", fill="both", expand=True)
-    scrollbar.pack(side="right", fill="y")
 
-    def update_summary():
-        """Update summary statistics"""
-        if not logs_tree.get_children():
-            return
-            
-        total_count = len(logs_tree.get_children())
-        total = 0
-        paid = 0
-        pending = 0
-        
-        for item in logs_tree.get_children():
-            values = logs_tree.item(item)['values']
-            amount = float(values[3].replace('₹', ''))
-            total += amount
-            if values[4] == "Paid":
-                paid += amount
-            else:
-                pending += amount
-        
-        total_invoices.config(text=f"Total Invoices: {total_count}")
-        total_amount.config(text=f"Total Amount: ₹{total:,.2f}")
-        paid_amount.config(text=f"Paid Amount: ₹{paid:,.2f}")
-        pending_amount.config(text=f"Pending Amount: ₹{pending:,.2f}")
+    def update_summary(summary):
+        """Show a LogSummary in the summary bar"""
+        total_invoices.config(text=f"Total Invoices: {summary.count}")
+        total_amount.config(text=f"Total Amount: ₹{summary.total:,.2f}")
+        paid_amount.config(text=f"Paid Amount: ₹{summary.paid:,.2f}")
+        pending_amount.config(text=f"Pending Amount: ₹{summary.pending:,.2f}")
 
-    def filter_logs_impl(*args):
-        """Filter logs based on search criteria"""
+    last_view_state = [None, None]  # (log signature, filters) currently on screen, and its records
+
+    def filter_dates():
+        """The from/to date filters as datetimes (to covers the whole last day)"""
+        from_date_str = from_date_var.get()
+        to_date_str = to_date_var.get()
+        from_date_obj = None
+        to_date_obj = None
+        if from_date_str:
+            from_date_obj = datetime.strptime(from_date_str, "%d-%m-%Y")
+        if to_date_str:
+            to_date_obj = datetime.strptime(to_date_str, "%d-%m-%Y") + timedelta(days=1)
+        return from_date_obj, to_date_obj
+
+    def filter_logs_impl(*args, force=False, within=None):
+        """Filter logs based on search criteria; returns the records shown (None on error).
+
+        within narrows the search to an earlier result (see DebouncedSearch).
+        """
         search_text = search_var.get().lower()
         status_filter = status_var.get()
         from_date_str = from_date_var.get()
         to_date_str = to_date_var.get()
-        
-        # Clear tree
-        for item in logs_tree.get_children():
-            logs_tree.delete(item)
             
-        if os.path.exists(INVOICE_LOG_FILE):
-            try:
-                with open(INVOICE_LOG_FILE, 'r') as f:
-                    logs = json.load(f)
-                    
-                # Convert dates if provided
-                from_date_obj = None
-                to_date_obj = None
-                if from_date_str:
-                    from_date_obj = datetime.strptime(from_date_str, "%d-%m-%Y")
-                if to_date_str:
-                    to_date_obj = datetime.strptime(to_date_str, "%d-%m-%Y") + timedelta(days=1)
+        try:
+            repository = get_invoice_repository()
+
+            # Convert dates if provided
+            from_date_obj, to_date_obj = filter_dates()
+
+            # Nothing to do if neither the log (in the date range) nor the filters changed since the last pass
+            view_state = (repository.signature(from_date_obj, to_date_obj),
+                          search_text, status_filter, from_date_str, to_date_str)
+            if not force and view_state == last_view_state[0]:
+                return last_view_state[1]
                 
-                for log in logs:
-                    # Check date range
-                    log_date = datetime.strptime(log.get("datetime", ""), "%d-%m-%Y %H:%M:%S")
-                    if from_date_obj and log_date < from_date_obj:
-                        continue
-                    if to_date_obj and log_date > to_date_obj:
-                        continue
-                    
-                    # Check status filter
-                    if status_filter != "All" and log.get("status") != status_filter:
-                        continue
-                    
-                    # Check search text
-                    values = [
-                        log.get("datetime", ""),
-                        log.get("invoice_num", ""),
-                        log.get("customer_name", ""),
-                        str(log.get("amount", "")),
-                        log.get("status", ""),
-                        log.get("payment_method", "")
-                    ]
-                    
-                    if search_text and not any(search_text in str(v).lower() for v in values):
-                        continue
-                        
-                    logs_tree.insert("", "end", values=(
-                        log.get("datetime", ""),
-                        log.get("invoice_num", ""),
-                        log.get("customer_name", ""),
-                        f"₹{log.get('amount', '0')}",
-                        log.get("status", "Unpaid"),
-                        log.get("payment_method", "")
-                    ))
+            # Filtering and the summary totals come out of the same pass over the cached records
+            matched, summary = repository.filtered(search_text, status_filter, from_date_obj, to_date_obj,
+                                                   within=within)
+
+            # Hand the whole result to the virtual tree; only the visible window reaches Tk
+            logs_tree.set_rows(
+                [log.get("invoice_num", "") for log in matched],
+                [log_tree_values(log) for log in matched]
+            )
+            logger.debug(f"Logs view showing {summary.count} entries")
+            last_view_state[:] = [view_state, matched]
                     
-                update_summary()
+            update_summary(summary)
+            return matched
                     
-            except Exception as e:
-                print(f"Error loading logs: {str(e)}")
+        except Exception as e:
+            print(f"Error loading logs: {str(e)}")
+            return None
+
+    def logs_search_context():
+        """Everything but the search text that a logs search result depends on"""
+        try:
+            from_date_obj, to_date_obj = filter_dates()
+        except ValueError:
+            return object()  # unparseable dates: never narrow
+        return (get_invoice_repository().signature(from_date_obj, to_date_obj),
+                status_var.get(), from_date_var.get(), to_date_var.get())
 
     # Assign the implementation to the global filter_logs variable
     filter_logs = filter_logs_impl
@@ -854,7 +620,7 @@ def create_logs_view():
     refresh_btn = ttk.Button(
         refresh_frame,
         text="🔄 Refresh",
-        command=lambda: filter_logs(),
+        command=lambda: filter_logs(force=True),
         style="Custom.TButton",
         width=10
     )
@@ -872,8 +638,14 @@ def create_logs_view():
     to_date.entry.delete(0, tk.END)
     to_date.entry.insert(0, today.strftime("%d-%m-%Y"))
 
-    # Bind search and filter events
-    search_var.trace('w', filter_logs)
+    # Bind search and filter events; typing is debounced and narrows the previous result
+    logs_search = DebouncedSearch(
+        logs_tree,
+        lambda: search_var.get().lower(),
+        lambda query, within: filter_logs(within=within),
+        context=logs_search_context
+    )
+    search_var.trace('w', logs_search.schedule)
     status_var.trace('w', filter_logs)
     from_date_var.trace('w', filter_logs)
     to_date_var.trace('w', filter_logs)
@@ -883,13 +655,12 @@ def create_logs_view():
 
     def auto_refresh():
         """Auto refresh the logs view every 5 seconds if enabled"""
-        if auto_refresh_var.get() and logs_tree and logs_tree.winfo_exists():
+        # Cheap when nothing changed: filter_logs() returns early on an unchanged log
+        if auto_refresh_var.get():
             filter_logs()
-        if logs_tree and logs_tree.winfo_exists():  # Only schedule next refresh if tree still exists
-            logs_tree.after(5000, auto_refresh)  # Schedule next refresh in 5 seconds
 
-    # Start auto-refresh
-    auto_refresh()
+    # Start auto-refresh; it only runs while the Logs tab is shown
+    main_tabs.pause_when_hidden(logs_frame, PeriodicTask(logs_tree, 5000, auto_refresh))
 
 @log_function_entry_exit
 def refresh_logs():
@@ -901,79 +672,38 @@ def refresh_logs():
         logger.warning("Logs tree widget not available")
         return
         
-    # Clear existing items
-    for item in logs_tree.get_children():
-        logs_tree.delete(item)
-    logger.debug("Cleared existing log entries")
-
     # Load and display logs
-    if os.path.exists(INVOICE_LOG_FILE):
-        try:
-            with open(INVOICE_LOG_FILE, 'r') as f:
-                logs = json.load(f)
-                logger.debug(f"Loaded {len(logs)} log entries")
-                
-                # Sort logs by datetime in descending order
-                for log in logs:
-                    try:
-                        # Try to parse the datetime in either format
-                        try:
-                            datetime_obj = datetime.strptime(log.get("datetime", ""), "%Y-%m-%d %H:%M:%S")
-                        except ValueError:
-                            try:
-                                datetime_obj = datetime.strptime(log.get("datetime", ""), "%d-%m-%Y %H:%M:%S")
-                            except ValueError:
-                                logger.warning(f"Invalid datetime format in log: {log.get('datetime', '')}")
-                                continue
-                        
-                        # Format datetime consistently
-                        formatted_date = datetime_obj.strftime("%d-%m-%Y %H:%M:%S")
-                        log["datetime"] = formatted_date
-                    except Exception as e:
-                        logger.error(f"Error processing log entry datetime: {str(e)}")
-                        continue
-
-                # Sort logs by datetime
-                logs.sort(key=lambda x: datetime.strptime(x.get("datetime", "01-01-1970 00:00:00"), "%d-%m-%Y %H:%M:%S"), reverse=True)
-                logger.debug("Sorted logs by datetime")
+    try:
+        logs = get_invoice_repository().records()
+        logger.debug(f"Loaded {len(logs)} log entries")
+
+        for log in logs:
+            if log.dt is None:
+                logger.warning(f"Invalid datetime format in log: {log.get('datetime', '')}")
+
+        # Sort logs by datetime in descending order (datetimes are pre-parsed by the repository)
+        logs = sorted(logs, key=lambda x: x.dt or datetime(1970, 1, 1), reverse=True)
+        logger.debug("Sorted logs by datetime")
                 
-                for log in logs:
-                    logs_tree.insert("", "end", values=(
-                        log.get("datetime", ""),
-                        log.get("invoice_num", ""),
-                        log.get("customer_name", ""),
-                        f"₹{log.get('amount', '0')}",
-                        log.get("status", "Unpaid"),
-                        log.get("payment_method", "")
-                    ))
-                logger.info("Logs view refreshed successfully")
-        except Exception as e:
-            logger.error(f"Error refreshing logs: {str(e)}\n{traceback.format_exc()}")
+        rows = []
+        for log in logs:
+            values = log_tree_values(log)
+            if log.dt is not None:
+                # Format datetime consistently
+                values = (log.dt.strftime("%d-%m-%Y %H:%M:%S"),) + values[1:]
+            rows.append(values)
+        logs_tree.set_rows([log.get("invoice_num", "") for log in logs], rows)
+        logger.info("Logs view refreshed successfully")
+    except Exception as e:
+        logger.error(f"Error refreshing logs: {str(e)}\n{traceback.format_exc()}")
 
 @log_function_entry_exit
 def refresh_tfn_logs():
     """Refresh the TFN logs display"""
     logger.debug("Refreshing TFN logs display")
     try:
-        # Save current position
-        current_pos = tfn_logs_text.yview()[1]
-        
-        # Clear current content
-        tfn_logs_text.delete(1.0, tk.END)
-        logger.debug("Cleared existing TFN logs display")
-        
-        # Read and display log file
-        if os.path.exists(DEBUG_LOG_FILE):
-            with open(DEBUG_LOG_FILE, 'r') as f:
-                logs = f.read()
-                tfn_logs_text.insert(tk.END, logs)
-                logger.debug("Loaded and displayed TFN logs")
-                
-            # Auto-scroll to bottom if we were at bottom before
-            if current_pos > 0.99:
-                tfn_logs_text.see(tk.END)
-                logger.debug("Auto-scrolled to bottom of logs")
-                
+        # Only the bytes appended since the last refresh are read and inserted
+        follow_log(tfn_logs_text, tfn_log_tailer, TFN_LOG_MAX_LINES)
         logger.info("TFN logs display refreshed successfully")
     except Exception as e:
         logger.error(f"Error refreshing TFN logs: {str(e)}\n{traceback.format_exc()}")
@@ -989,6 +719,7 @@ def clear_tfn_logs():
                 f.write("")
             # Clear display
             tfn_logs_text.delete(1.0, tk.END)
+            tfn_log_tailer.reset()
             logger.info("TFN logs cleared successfully")
         except Exception as e:
             logger.error(f"Error clearing TFN logs: {str(e)}\n{traceback.format_exc()}")
@@ -1006,96 +737,39 @@ def filter_logs_impl(*args):
     logger.debug(f"Filter criteria - Search: '{search_text}', Status: {status_filter}, "
                 f"Date range: {from_date_str} to {to_date_str}")
     
-    # Clear tree
-    for item in logs_tree.get_children():
-        logs_tree.delete(item)
-        
-    if os.path.exists(INVOICE_LOG_FILE):
-        try:
-            with open(INVOICE_LOG_FILE, 'r') as f:
-                logs = json.load(f)
-                logger.debug(f"Loaded {len(logs)} logs for filtering")
+    try:
+        repository = get_invoice_repository()
                 
-            # Convert dates if provided
-            from_date_obj = None
-            to_date_obj = None
-            if from_date_str:
-                from_date_obj = datetime.strptime(from_date_str, "%d-%m-%Y")
-            if to_date_str:
-                to_date_obj = datetime.strptime(to_date_str, "%d-%m-%Y") + timedelta(days=1)
+        # Convert dates if provided
+        from_date_obj = None
+        to_date_obj = None
+        if from_date_str:
+            from_date_obj = datetime.strptime(from_date_str, "%d-%m-%Y")
+        if to_date_str:
+            to_date_obj = datetime.strptime(to_date_str, "%d-%m-%Y") + timedelta(days=1)
             
-            filtered_count = 0
-            for log in logs:
-                # Check date range
-                log_date = datetime.strptime(log.get("datetime", ""), "%d-%m-%Y %H:%M:%S")
-                if from_date_obj and log_date < from_date_obj:
-                    continue
-                if to_date_obj and log_date > to_date_obj:
-                    continue
+        matched, summary = repository.filtered(search_text, status_filter, from_date_obj, to_date_obj)
+        logs_tree.set_rows([log.get("invoice_num", "") for log in matched],
+                           [log_tree_values(log) for log in matched])
                 
-                # Check status filter
-                if status_filter != "All" and log.get("status") != status_filter:
-                    continue
+        logger.info(f"Filtered logs: showing {summary.count} entries")
+        update_summary(summary)
                 
-                # Check search text
-                values = [
-                    log.get("datetime", ""),
-                    log.get("invoice_num", ""),
-                    log.get("customer_name", ""),
-                    str(log.get("amount", "")),
-                    log.get("status", ""),
-                    log.get("payment_method", "")
-                ]
-                
-                if search_text and not any(search_text in str(v).lower() for v in values):
-                    continue
-                    
-                logs_tree.insert("", "end", values=(
-                    log.get("datetime", ""),
-                    log.get("invoice_num", ""),
-                    log.get("customer_name", ""),
-                    f"₹{log.get('amount', '0')}",
-                    log.get("status", "Unpaid"),
-                    log.get("payment_method", "")
-                ))
-                filtered_count += 1
-                
-            logger.info(f"Filtered logs: showing {filtered_count} of {len(logs)} entries")
-            update_summary()
-                
-        except Exception as e:
-            logger.error(f"Error filtering logs: {str(e)}\n{traceback.format_exc()}")
+    except Exception as e:
+        logger.error(f"Error filtering logs: {str(e)}\n{traceback.format_exc()}")
 
 @log_function_entry_exit
-def update_summary():
-    """Update summary statistics in logs view"""
+def update_summary(summary):
+    """Show a LogSummary in the logs view summary bar"""
     logger.debug("Updating logs summary statistics")
-    if not logs_tree.get_children():
-        logger.debug("No logs to summarize")
-        return
-            
-    total_count = len(logs_tree.get_children())
-    total = 0
-    paid = 0
-    pending = 0
-    
     try:
-        for item in logs_tree.get_children():
-            values = logs_tree.item(item)['values']
-            amount = float(values[3].replace('₹', ''))
-            total += amount
-            if values[4] == "Paid":
-                paid += amount
-            else:
-                pending += amount
-        
-        total_invoices.config(text=f"Total Invoices: {total_count}")
-        total_amount.config(text=f"Total Amount: ₹{total:,.2f}")
-        paid_amount.config(text=f"Paid Amount: ₹{paid:,.2f}")
-        pending_amount.config(text=f"Pending Amount: ₹{pending:,.2f}")
+        total_invoices.config(text=f"Total Invoices: {summary.count}")
+        total_amount.config(text=f"Total Amount: ₹{summary.total:,.2f}")
+        paid_amount.config(text=f"Paid Amount: ₹{summary.paid:,.2f}")
+        pending_amount.config(text=f"Pending Amount: ₹{summary.pending:,.2f}")
         
-        logger.info(f"Summary updated - Total: {total_count} invoices, "
-                   f"Amount: ₹{total:,.2f}, Paid: ₹{paid:,.2f}, Pending: ₹{pending:,.2f}")
+        logger.info(f"Summary updated - Total: {summary.count} invoices, "
+                   f"Amount: ₹{summary.total:,.2f}, Paid: ₹{summary.paid:,.2f}, Pending: ₹{summary.pending:,.2f}")
     except Exception as e:
         logger.error(f"Error updating summary: {str(e)}\n{traceback.format_exc()}")
 
@@ -1158,8 +832,9 @@ def validate_and_submit():
     logger.info("Form validation successful, preparing invoice data")
     
     # Prepare invoice data
-    invoice_num = load_invoice_number()
-    logger.debug(f"Generated invoice number: {invoice_num}")
+    # Reserve the number before rendering so a concurrent batch run can't reuse it
+    invoice_num = get_storage().allocate_invoice_numbers(1)[0]
+    logger.debug(f"Allocated invoice number: {invoice_num}")
     
     # Format filename
     current_date = datetime.now()
@@ -1179,7 +854,7 @@ def validate_and_submit():
         "billing_to": fields["Billing Period To"].get(),
         "plan": fields["Plan"].get(),
         "months": fields["Months"].get(),
-        "total_amount": fields["Total Amount"].get(),
+        "total_amount": f"{amount:.2f}",
         "discount": fields["Discount"].get() or "0",
         "late_fee": fields["Late Fee"].get() or "0",
         "invoice_num": invoice_num,
@@ -1194,18 +869,14 @@ def validate_and_submit():
     try:
         # Generate PDF
         logger.info("Starting PDF generation")
-        generate_pdf(invoice_data)
-        
-        # Save invoice number
-        logger.debug(f"Saving invoice number: {invoice_num}")
-        save_invoice_number(invoice_num)
+        pdf = generate_pdf(invoice_data)
         
         # Log invoice
         logger.info(f"Logging invoice: {pdf_filename}")
         log_invoice(invoice_data, invoice_data["pdf_filename"])
         
         # Refresh logs view
-        if logs_tree and logs_tree.winfo_exists():
+        if logs_tree is not None and logs_tree.winfo_exists():
             logger.debug("Refreshing logs view")
             filter_logs()
         
@@ -1222,7 +893,7 @@ def validate_and_submit():
             if email:
                 try:
                     logger.info(f"Attempting to send email to: {email}")
-                    send_email(email, invoice_data["pdf_filename"])
+                    send_email(email, invoice_data["pdf_filename"], pdf)
                     logger.info("Email sent successfully")
                     messagebox.showinfo("Success", "Invoice sent successfully!")
                 except Exception as e:
@@ -1237,8 +908,11 @@ def validate_and_submit():
         messagebox.showerror("Error", f"Failed to generate invoice: {str(e)}")
 
 @log_function_entry_exit
-def send_email(to_email, pdf_file):
-    """Send invoice via email"""
+def send_email(to_email, pdf_file, pdf_data=None):
+    """Send invoice via email; pdf_data is the PDF's bytes, else it is read from output_invoices"""
+    import smtplib
+    from email.message import EmailMessage
+
     logger.info(f"Preparing to send email to: {to_email}")
     
     # Email configuration
@@ -1258,11 +932,14 @@ def send_email(to_email, pdf_file):
     msg.set_content('Please find your invoice attached.')
     
     # Attach PDF
-    pdf_path = os.path.join("output_invoices", pdf_file)
-    logger.debug(f"Attaching PDF: {pdf_path}")
-    with open(pdf_path, 'rb') as f:
-        file_data = f.read()
-    msg.add_attachment(file_data, maintype='application', subtype='pdf', filename=pdf_file)
+    if pdf_data is None:
+        pdf_path = os.path.join("output_invoices", pdf_file)
+        logger.debug(f"Attaching PDF: {pdf_path}")
+        with open(pdf_path, 'rb') as f:
+            pdf_data = f.read()
+    else:
+        logger.debug(f"Attaching PDF: {pdf_file} ({len(pdf_data)} bytes)")
+    msg.add_attachment(pdf_data, maintype='application', subtype='pdf', filename=pdf_file)
     
     # Send email
     logger.info("Connecting to SMTP server")
@@ -1276,15 +953,19 @@ def send_email(to_email, pdf_file):
 
 def create_dashboard_view():
     """Create the dashboard view with analytics and visualizations"""
-    global HAS_MPL, dashboard_frame
+    global dashboard_frame, dashboard_loader, dashboard_charts
+    # Charts are rendered off-thread by dashboard.py; pandas and matplotlib load with it
+    from dashboard import HAS_MPL, BackgroundLoader, DashboardCharts, load_dashboard
+    if not HAS_MPL:
+        logger.warning("Matplotlib not available. Dashboard visualizations will be disabled.")
 
     # Clear any existing widgets
     for widget in dashboard_frame.winfo_children():
         widget.destroy()
 
     def refresh_dashboard():
-        """Refresh the dashboard data"""
-        create_dashboard_view()
+        """Refresh the dashboard data in the background, superseding any load in flight"""
+        dashboard_loader.request()
 
     # Create main container with padding
     dashboard_container = ttk.Frame(dashboard_frame, style="Custom.TFrame", padding=15)
@@ -1349,6 +1030,7 @@ def create_dashboard_view():
         stats_grid.columnconfigure(i, weight=1)
 
     def create_stat_widget(parent, title, value, row, col):
+        """Create a stat block and return its value label"""
         frame = ttk.Frame(parent)
         frame.grid(row=row, column=col, padx=10, pady=5, sticky="nsew")
         
@@ -1359,53 +1041,22 @@ def create_dashboard_view():
             font=("Segoe UI", 10)
         ).pack()
         
-        ttk.Label(
+        value_label = ttk.Label(
             frame,
             text=value,
             style="Custom.TLabel",
             font=("Segoe UI", 12, "bold")
-        ).pack()
-
-    # Load and process data for stats
-    total_revenue = 0
-    total_invoices = 0
-    total_customers = set()
-    unpaid_amount = 0
-    this_month = datetime.now().strftime("%m-%Y")
-    this_month_revenue = 0
-    active_plans_set = set()  # Track unique active plans
-
-    if os.path.exists(INVOICE_LOG_FILE):
-        try:
-            with open(INVOICE_LOG_FILE, 'r') as f:
-                logs = json.load(f)
-                for log in logs:
-                    amount = float(log.get('amount', 0))
-                    total_revenue += amount
-                    total_invoices += 1
-                    total_customers.add(log.get('customer_name', ''))
-                    active_plans_set.add(log.get('plan', ''))  # Track plans in use
-                    
-                    if log.get('status') != 'Paid':
-                        unpaid_amount += amount
-                        
-                    # Check if invoice is from current month
-                    log_date = datetime.strptime(log.get('datetime', ''), "%d-%m-%Y %H:%M:%S")
-                    if log_date.strftime("%m-%Y") == this_month:
-                        this_month_revenue += amount
-        except:
-            pass
+        )
+        value_label.pack()
+        return value_label
 
-    # Create stat widgets
-    create_stat_widget(stats_grid, "Total Revenue", f"₹{total_revenue:,.2f}", 0, 0)
-    create_stat_widget(stats_grid, "Total Invoices", str(total_invoices), 0, 1)
-    create_stat_widget(stats_grid, "Total Customers", str(len(total_customers)), 0, 2)
-    create_stat_widget(stats_grid, "Pending Amount", f"₹{unpaid_amount:,.2f}", 0, 3)
-    create_stat_widget(stats_grid, "This Month Revenue", f"₹{this_month_revenue:,.2f}", 1, 0)
-    create_stat_widget(stats_grid, "Collection Rate", f"{(1 - unpaid_amount/total_revenue)*100:.1f}%" if total_revenue > 0 else "0%", 1, 1)
-    create_stat_widget(stats_grid, "Avg. Invoice Value", f"₹{(total_revenue/total_invoices):,.2f}" if total_invoices > 0 else "₹0", 1, 2)
-    create_stat_widget(stats_grid, "Active Plans", str(len(active_plans_set)), 1, 3)
+    # Stat blocks show placeholders until the background load delivers
+    stat_labels = {}
+    for i, title in enumerate(("Total Revenue", "Total Invoices", "Total Customers", "Pending Amount",
+                               "This Month Revenue", "Collection Rate", "Avg. Invoice Value", "Active Plans")):
+        stat_labels[title] = create_stat_widget(stats_grid, title, "…", i // 4, i % 4)
 
+    chart_labels = []
     if HAS_MPL:
         # Charts Section
         charts_frame = ttk.LabelFrame(content_frame, text="Analytics", padding=10)
@@ -1417,120 +1068,13 @@ def create_dashboard_view():
         charts_grid.columnconfigure(0, weight=1)
         charts_grid.columnconfigure(1, weight=1)
 
-        def create_revenue_trend():
-            """Create monthly revenue trend chart"""
-            monthly_revenue = {}
-            if os.path.exists(INVOICE_LOG_FILE):
-                try:
-                    with open(INVOICE_LOG_FILE, 'r') as f:
-                        logs = json.load(f)
-                        for log in logs:
-                            date = datetime.strptime(log.get('datetime', ''), "%d-%m-%Y %H:%M:%S")
-                            month_key = date.strftime("%b %Y")
-                            amount = float(log.get('amount', 0))
-                            monthly_revenue[month_key] = monthly_revenue.get(month_key, 0) + amount
-                except:
-                    pass
-
-            # Sort by date
-            sorted_months = sorted(monthly_revenue.keys(), 
-                                 key=lambda x: datetime.strptime(x, "%b %Y"))
-            
-            # Create figure
-            fig, ax = plt.subplots(figsize=(6, 4))
-            if sorted_months:  # Only plot if we have data
-                ax.plot(sorted_months, [monthly_revenue[m] for m in sorted_months], 
-                       marker='o', linewidth=2, color='#1976d2')
-                ax.grid(True, linestyle='--', alpha=0.7)
-                plt.xticks(rotation=45)
-            else:
-                ax.text(0.5, 0.5, 'No data available', 
-                       horizontalalignment='center',
-                       verticalalignment='center',
-                       transform=ax.transAxes)
-            
-            ax.set_title("Monthly Revenue Trend", pad=15)
-            plt.tight_layout()
-            return fig
-
-        def create_payment_status_pie():
-            """Create payment status distribution pie chart"""
-            status_counts = {'Paid': 0, 'Unpaid': 0}
-            if os.path.exists(INVOICE_LOG_FILE):
-                try:
-                    with open(INVOICE_LOG_FILE, 'r') as f:
-                        logs = json.load(f)
-                        for log in logs:
-                            status = log.get('status', 'Unpaid')
-                            status_counts[status] = status_counts.get(status, 0) + 1
-                except:
-                    pass
-
-            fig, ax = plt.subplots(figsize=(6, 4))
-            if sum(status_counts.values()) > 0:  # Only plot if we have data
-                colors = ['#4caf50', '#f44336']
-                ax.pie(status_counts.values(), labels=status_counts.keys(), 
-                      autopct='%1.1f%%', colors=colors)
-            else:
-                ax.text(0.5, 0.5, 'No data available', 
-                       horizontalalignment='center',
-                       verticalalignment='center')
-            
-            ax.set_title("Payment Status Distribution", pad=15)
-            plt.tight_layout()
-            return fig
-
-        def create_plan_distribution():
-            """Create plan distribution bar chart"""
-            plan_counts = {plan: 0 for plan in active_plans_set or PLANS}  # Use active plans or default plans
-            if os.path.exists(INVOICE_LOG_FILE):
-                try:
-                    with open(INVOICE_LOG_FILE, 'r') as f:
-                        logs = json.load(f)
-                        for log in logs:
-                            plan = log.get('plan', '')
-                            if plan:  # Only count if plan exists
-                                plan_counts[plan] = plan_counts.get(plan, 0) + 1
-                except:
-                    pass
-
-            fig, ax = plt.subplots(figsize=(6, 4))
-            if sum(plan_counts.values()) > 0:  # Only plot if we have data
-                ax.bar(plan_counts.keys(), plan_counts.values(), color='#2196f3')
-                plt.xticks(rotation=45)
-                ax.grid(True, linestyle='--', alpha=0.7)
-            else:
-                ax.text(0.5, 0.5, 'No data available', 
-                       horizontalalignment='center',
-                       verticalalignment='center')
-            
-            ax.set_title("Plan Distribution", pad=15)
-            plt.tight_layout()
-            return fig
-
-        # Create and pack charts
-        charts = [
-            ("Revenue Trend", create_revenue_trend),
-            ("Payment Status", create_payment_status_pie),
-            ("Plan Distribution", create_plan_distribution)
-        ]
-
-        for i, (title, create_func) in enumerate(charts):
+        # One placeholder per chart; the rendered image replaces it when ready
+        for i in range(3):
             chart_frame = ttk.Frame(charts_grid)
             chart_frame.grid(row=i//2, column=i%2, padx=5, pady=5, sticky="nsew")
-            
-            try:
-                fig = create_func()
-                figure_canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-                figure_canvas.draw()
-                figure_canvas.get_tk_widget().pack(fill="both", expand=True)
-            except Exception as e:
-                print(f"Error creating {title} chart: {str(e)}")
-                ttk.Label(
-                    chart_frame,
-                    text=f"Error creating chart: {str(e)}",
-                    style="Custom.TLabel"
-                ).pack(pady=20)
+            chart_label = ttk.Label(chart_frame, text="Loading chart…", style="Custom.TLabel", anchor="center")
+            chart_label.pack(fill="both", expand=True, pady=20)
+            chart_labels.append(chart_label)
 
     else:
         # Show message if matplotlib is not available
@@ -1570,26 +1114,6 @@ def create_dashboard_view():
     activity_tree.pack(side="left", fill="x", expand=True)
     activity_scrollbar.pack(side="right", fill="y")
 
-    # Load recent activity
-    if os.path.exists(INVOICE_LOG_FILE):
-        try:
-            with open(INVOICE_LOG_FILE, 'r') as f:
-                logs = json.load(f)
-                # Sort by date descending
-                logs.sort(key=lambda x: datetime.strptime(x.get('datetime', ''), "%d-%m-%Y %H:%M:%S"), 
-                         reverse=True)
-                # Show only last 5 entries
-                for log in logs[:5]:
-                    activity_tree.insert("", "end", values=(
-                        log.get("datetime", ""),
-                        log.get("invoice_num", ""),
-                        log.get("customer_name", ""),
-                        f"₹{log.get('amount', '0')}",
-                        log.get("status", "Unpaid")
-                    ))
-        except:
-            pass
-
     # Refresh button
     refresh_btn = ttk.Button(
         content_frame,
@@ -1600,9 +1124,69 @@ def create_dashboard_view():
     )
     refresh_btn.pack(pady=15)
 
+    def show_dashboard(result):
+        """Fill the view with a load_dashboard() result (runs on the Tk thread)"""
+        stats = result["metrics"]["stats"]
+        stat_labels["Total Revenue"].config(text=f"₹{stats['total_revenue']:,.2f}")
+        stat_labels["Total Invoices"].config(text=str(stats['total_invoices']))
+        stat_labels["Total Customers"].config(text=str(stats['total_customers']))
+        stat_labels["Pending Amount"].config(text=f"₹{stats['pending_amount']:,.2f}")
+        stat_labels["This Month Revenue"].config(text=f"₹{stats['this_month_revenue']:,.2f}")
+        stat_labels["Collection Rate"].config(text=f"{stats['collection_rate']:.1f}%" if stats['total_revenue'] > 0 else "0%")
+        stat_labels["Avg. Invoice Value"].config(text=f"₹{stats['avg_invoice_value']:,.2f}" if stats['total_invoices'] > 0 else "₹0")
+        stat_labels["Active Plans"].config(text=str(stats['active_plans']))
+
+        for chart_label, (title, image, error) in zip(chart_labels, result["charts"]):
+            if image is None:
+                chart_label.config(image="", text=f"Error creating chart: {error}")
+                chart_label.image = None
+                continue
+            photo = getattr(chart_label, "image", None)
+            if photo is not None and (photo.width(), photo.height()) == image.size:
+                photo.paste(image)  # redraw into the existing Tk image
+                continue
+            photo = ImageTk.PhotoImage(image)
+            chart_label.config(image=photo, text="")
+            chart_label.image = photo  # keep a reference so Tk does not drop it
+
+        # Show only last 5 entries, newest first
+        activity_tree.delete(*activity_tree.get_children())
+        for row in result["metrics"]["recent"].itertuples(index=False):
+            activity_tree.insert("", "end", values=(
+                row.datetime_text,
+                row.invoice_num,
+                row.customer_name,
+                f"₹{row.amount_text}",
+                row.status
+            ))
+
+    def show_dashboard_error(error):
+        logger.error(f"Error loading dashboard: {str(error)}")
+        for label in stat_labels.values():
+            label.config(text="—")
+        for chart_label in chart_labels:
+            chart_label.config(text=f"Error creating chart: {str(error)}")
+
     # Bind mousewheel to all new widgets
     bind_mousewheel_to_widgets(content_frame)
 
+    # Reading the log, computing the stats and drawing the charts all happen off the Tk thread
+    if dashboard_loader is not None:
+        dashboard_loader.cancel()
+    # The figures are built once per view and updated in place on every refresh
+    if dashboard_charts is not None:
+        dashboard_charts.close()
+    dashboard_charts = DashboardCharts() if HAS_MPL else None
+    charts = dashboard_charts
+    content_frame.bind("<Destroy>", lambda e: charts.close() if charts and e.widget is content_frame else None)
+    dashboard_loader = BackgroundLoader(
+        content_frame,
+        lambda cancelled: load_dashboard(plans=PLANS, charts=charts, cancelled=cancelled),
+        show_dashboard,
+        show_dashboard_error
+    )
+    dashboard_loader.request()
+
 def create_tfn_logs_view():
     """Create the TFN logs view that displays debug logs"""
     global tfn_logs_frame, tfn_logs_text
@@ -1669,25 +1253,13 @@ def create_tfn_logs_view():
     tfn_logs_text.pack(side="left", fill="both", expand=True)
     scrollbar.config(command=tfn_logs_text.yview)
 
+    # Follow the log file: each refresh appends only what was written since the last one
+    tfn_log_tailer.reset()
+
     def refresh_tfn_logs():
         """Refresh the logs display"""
         try:
-            # Save current position
-            current_pos = tfn_logs_text.yview()[1]
-            
-            # Clear current content
-            tfn_logs_text.delete(1.0, tk.END)
-            
-            # Read and display log file
-            if os.path.exists(DEBUG_LOG_FILE):
-                with open(DEBUG_LOG_FILE, 'r') as f:
-                    logs = f.read()
-                    tfn_logs_text.insert(tk.END, logs)
-                    
-            # Auto-scroll to bottom if we were at bottom before
-            if current_pos > 0.99:
-                tfn_logs_text.see(tk.END)
-                
+            follow_log(tfn_logs_text, tfn_log_tailer, TFN_LOG_MAX_LINES)
         except Exception as e:
             logger.error(f"Error refreshing TFN logs: {str(e)}")
 
@@ -1700,26 +1272,25 @@ def create_tfn_logs_view():
                     f.write("")
                 # Clear display
                 tfn_logs_text.delete(1.0, tk.END)
+                tfn_log_tailer.reset()
                 logger.info("Logs cleared by user")
             except Exception as e:
                 logger.error(f"Error clearing logs: {str(e)}")
 
     def auto_refresh():
         """Auto refresh the logs every 2 seconds if enabled"""
-        if auto_refresh_var.get() and tfn_logs_text and tfn_logs_text.winfo_exists():
+        if auto_refresh_var.get():
             refresh_tfn_logs()
-        if tfn_logs_text and tfn_logs_text.winfo_exists():
-            tfn_logs_text.after(2000, auto_refresh)
 
     # Initial load
     refresh_tfn_logs()
     
-    # Start auto-refresh
-    auto_refresh()
+    # Start auto-refresh; it only runs while the TFN Logs tab is shown
+    main_tabs.pause_when_hidden(tfn_logs_frame, PeriodicTask(tfn_logs_text, 2000, auto_refresh))
 
 def build_main_gui():
     global customer_dropdown, notes_frame, logs_frame, payment_status_var, payment_method_var
-    global logs_tree, dashboard_frame, customers_frame, form_canvas, tfn_logs_frame
+    global logs_tree, dashboard_frame, customers_frame, form_canvas, tfn_logs_frame, main_tabs
 
     # Set window properties
     app.geometry("1000x680")
@@ -1735,10 +1306,12 @@ def build_main_gui():
     # Create notebook for tabs
     notebook = ttk.Notebook(main_container, style="Custom.TNotebook")
     notebook.pack(fill="both", expand=True, padx=10, pady=5)
+    # Tabs other than Billing are built the first time they are selected
+    main_tabs = LazyTabs(notebook)
 
     # Billing Tab
     billing_frame = ttk.Frame(notebook, style="Custom.TFrame")
-    notebook.add(billing_frame, text=" 📝 Billing ")
+    main_tabs.add(billing_frame, " 📝 Billing ")
 
     # Create scrollable canvas for the form
     form_canvas = tk.Canvas(billing_frame, bg=style.lookup('TFrame', 'background'))
@@ -1770,25 +1343,21 @@ def build_main_gui():
     customer_frame = ttk.LabelFrame(form_content, text="Customer Selection", padding=10)
     customer_frame.pack(fill="x", pady=(0, 15))
 
-    customers = load_customers()
-    customer_list = []
-    for customer in customers:
-        customer_list.append(f"{customer['name']} ({customer['customer_id']})")
-    
     ttk.Label(
         customer_frame,
         text="Select Existing Customer:",
         style="Custom.TLabel"
     ).pack(side="left", padx=(0, 10))
     
-    customer_dropdown = ttk.Combobox(
+    # Type a name, customer ID or phone number; the best matches drop down
+    customer_dropdown = TypeaheadEntry(
         customer_frame,
-        values=customer_list,
-        state="readonly",
+        lambda text, limit: [customer_label(c) for c in get_customer_repository().suggest(text, limit)],
+        limit=CUSTOMER_PICKER_LIMIT,
         width=50
     )
     customer_dropdown.pack(side="left")
-    customer_dropdown.bind('<<ComboboxSelected>>', autofill_customer_data)
+    customer_dropdown.bind('<<TypeaheadSelected>>', autofill_customer_data)
 
     # Main form section
     form_frame = ttk.LabelFrame(form_content, text="Invoice Details", padding=10)
@@ -1937,25 +1506,19 @@ def build_main_gui():
 
     # Customers Tab
     customers_frame = ttk.Frame(notebook, style="Custom.TFrame")
-    notebook.add(customers_frame, text=" 👥 Customers ")
+    main_tabs.add(customers_frame, " 👥 Customers ", build=create_customers_view)
 
     # Logs Tab
     logs_frame = ttk.Frame(notebook, style="Custom.TFrame")
-    notebook.add(logs_frame, text=" 📊 Logs ")
+    main_tabs.add(logs_frame, " 📊 Logs ", build=create_logs_view)
 
     # Dashboard Tab
     dashboard_frame = ttk.Frame(notebook, style="Custom.TFrame")
-    notebook.add(dashboard_frame, text=" 📈 Dashboard ")
+    main_tabs.add(dashboard_frame, " 📈 Dashboard ", build=create_dashboard_view)
 
     # TFN Logs Tab
     tfn_logs_frame = ttk.Frame(notebook, style="Custom.TFrame")
-    notebook.add(tfn_logs_frame, text=" 🔍 TFN Logs ")
-
-    # Create the views
-    create_customers_view()
-    create_logs_view()
-    create_dashboard_view()
-    create_tfn_logs_view()
+    main_tabs.add(tfn_logs_frame, " 🔍 TFN Logs ", build=create_tfn_logs_view)
 
     # Update canvas color when theme changes
     app.bind("<<ThemeChanged>>", update_canvas_color)
@@ -2060,8 +1623,7 @@ def create_customers_view():
 
             # Check for duplicate customer ID
             customer_id = fields["Customer ID"].get()
-            customers = load_customers()
-            if any(c["customer_id"] == customer_id for c in customers):
+            if get_customer_repository().get(customer_id) is not None:
                 messagebox.showerror("Error", "Customer ID already exists!")
                 return
 
@@ -2115,9 +1677,8 @@ def create_customers_view():
             return
 
         # Get customer data
-        customer_id = customers_tree.item(selected[0])["values"][0]
-        customers = load_customers()
-        customer_data = next((c for c in customers if c["customer_id"] == customer_id), None)
+        customer_id = str(customers_tree.item(selected[0])["values"][0])
+        customer_data = get_customer_repository().get(customer_id)
         if not customer_data:
             return
 
@@ -2243,12 +1804,9 @@ def create_customers_view():
         if not messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this customer?"):
             return
 
-        customer_id = customers_tree.item(selected[0])["values"][0]
-        customers = load_customers()
-        customers = [c for c in customers if c["customer_id"] != customer_id]
-        
-        with open(CUSTOMERS_FILE, 'w') as f:
-            json.dump(customers, f, indent=2)
+        customer_id = str(customers_tree.item(selected[0])["values"][0])
+        get_customer_repository().delete(customer_id)
+        refresh_customer_dropdown()
         
         refresh_customers_view()
         messagebox.showinfo("Success", "Customer deleted successfully!")
@@ -2279,6 +1837,7 @@ def create_customers_view():
                 })
 
             # Create DataFrame
+            import pandas as pd
             df = pd.DataFrame(customers)
 
             # Ask for save location
@@ -2341,10 +1900,9 @@ def create_customers_view():
         "Created Date", "Last Modified"
     )
 
-    customers_tree = ttk.Treeview(
+    customers_tree = VirtualTreeview(
         tree_frame,
-        columns=columns,
-        show="headings",
+        columns,
         style="Custom.Treeview"
     )
 
@@ -2354,68 +1912,58 @@ def create_customers_view():
         width = 150 if col in ["Name", "Tenant Name", "Address"] else 100
         customers_tree.column(col, width=width, anchor="w")
 
-    # Add scrollbars
-    y_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=customers_tree.yview)
+    # Add horizontal scrollbar (the virtual tree brings its own vertical one)
     x_scrollbar = ttk.Scrollbar(tree_frame, orient="horizontal", command=customers_tree.xview)
-    customers_tree.configure(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
+    customers_tree.configure_tree(xscrollcommand=x_scrollbar.set)
 
     # Pack elements
-    y_scrollbar.pack(side="right", fill="y")
     x_scrollbar.pack(side="bottom", fill="x")
     customers_tree.pack(side="left", fill="both", expand=True)
 
+    def customer_row(customer):
+        return (
+            customer.get("customer_id", ""),
+            customer.get("name", ""),
+            customer.get("tenant_name", ""),
+            customer.get("customer_address", ""),
+            customer.get("customer_gstin", ""),
+            customer.get("email", ""),
+            customer.get("phone", ""),
+            customer.get("plan", ""),
+            customer.get("installation_date", ""),
+            customer.get("created_date", ""),
+            customer.get("last_modified", "")
+        )
+
+    def show_customers(customers):
+        customers_tree.set_rows(
+            [customer.get("customer_id", "") for customer in customers],
+            [customer_row(customer) for customer in customers]
+        )
+
     def refresh_customers_view():
         """Refresh the customers treeview"""
-        # Clear existing items
-        for item in customers_tree.get_children():
-            customers_tree.delete(item)
-
-        # Load and display customers
-        customers = load_customers()
-        for customer in customers:
-            customers_tree.insert("", "end", values=(
-                customer.get("customer_id", ""),
-                customer.get("name", ""),
-                customer.get("tenant_name", ""),
-                customer.get("customer_address", ""),
-                customer.get("customer_gstin", ""),
-                customer.get("email", ""),
-                customer.get("phone", ""),
-                customer.get("plan", ""),
-                customer.get("installation_date", ""),
-                customer.get("created_date", ""),
-                customer.get("last_modified", "")
-            ))
+        customers_search.reset()
+        show_customers(load_customers())
 
-    def filter_customers(*args):
-        """Filter customers based on search text"""
-        search_text = search_var.get().lower()
-        
-        # Clear existing items
-        for item in customers_tree.get_children():
-            customers_tree.delete(item)
-        
-        # Load and filter customers
-        customers = load_customers()
-        for customer in customers:
-            # Check if search text matches any field
-            if any(search_text in str(value).lower() for value in customer.values()):
-                customers_tree.insert("", "end", values=(
-                    customer.get("customer_id", ""),
-                    customer.get("name", ""),
-                    customer.get("tenant_name", ""),
-                    customer.get("customer_address", ""),
-                    customer.get("customer_gstin", ""),
-                    customer.get("email", ""),
-                    customer.get("phone", ""),
-                    customer.get("plan", ""),
-                    customer.get("installation_date", ""),
-                    customer.get("created_date", ""),
-                    customer.get("last_modified", "")
-                ))
-
-    # Bind search
-    search_var.trace('w', filter_customers)
+    def filter_customers(search_text, within=None):
+        """Show the customers matching search_text; returns them"""
+        if not search_text:
+            customers = load_customers()
+        else:
+            # Ranked matches on any field, from the search index
+            customers = get_customer_repository().search(search_text, within)
+        show_customers(customers)
+        return customers
+
+    # Bind search; typing is debounced and narrows the previous result
+    customers_search = DebouncedSearch(
+        customers_tree,
+        lambda: search_var.get().lower(),
+        filter_customers,
+        context=lambda: get_customer_repository().signature()
+    )
+    search_var.trace('w', customers_search.schedule)
 
     # Initial load
     refresh_customers_view()
@@ -2424,25 +1972,11 @@ def create_customers_view():
 def save_customer_data(customer_data):
     """Save customer data to the database"""
     logger.info(f"Saving customer data for ID: {customer_data['customer_id']}")
-    customers = load_customers()
-    
-    # Check if customer exists
-    exists = False
-    for i, customer in enumerate(customers):
-        if customer["customer_id"] == customer_data["customer_id"]:
-            logger.debug(f"Updating existing customer: {customer_data['customer_id']}")
-            customers[i] = customer_data  # Update existing
-            exists = True
-            break
     
-    if not exists:
-        logger.debug(f"Adding new customer: {customer_data['customer_id']}")
-        customers.append(customer_data)  # Add new
-    
-    # Save to file
+    # Insert or update in a single write
     try:
-        with open(CUSTOMERS_FILE, 'w') as f:
-            json.dump(customers, f, indent=2)
+        get_customer_repository().upsert(customer_data)
+        refresh_customer_dropdown()
         logger.info(f"Customer data saved successfully: {customer_data['customer_id']}")
     except Exception as e:
         logger.error(f"Error saving customer data: {str(e)}\n{traceback.format_exc()}")
@@ -2554,38 +2088,13 @@ def login_window():
 def log_invoice(data, pdf_filename):
     """Log invoice details to JSON file"""
     logger.info(f"Logging invoice: {pdf_filename}")
-    
-    if os.path.exists(INVOICE_LOG_FILE):
-        try:
-            with open(INVOICE_LOG_FILE, 'r') as f:
-                logs = json.load(f)
-                logger.debug(f"Loaded existing logs: {len(logs)} entries")
-        except Exception as e:
-            logger.error(f"Error loading existing logs: {str(e)}")
-            logs = []
-    else:
-        logger.debug("No existing log file found, creating new")
-        logs = []
 
     # Use consistent datetime format
-    current_time = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-    log_entry = {
-        "filename": pdf_filename,
-        "datetime": current_time,
-        "invoice_num": f"TF/25-26/HR/{data['invoice_num']}",
-        "customer_name": data["name"],
-        "customer_id": data["customer_id"],
-        "amount": data["total_amount"],
-        "status": data["payment_status"],
-        "payment_date": datetime.now().strftime("%d-%m-%Y") if data["payment_status"] == "Paid" else "",
-        "payment_method": data["payment_method"]
-    }
+    log_entry = make_log_entry(data, pdf_filename)
     logger.debug(f"Created log entry: {json.dumps(log_entry, indent=2)}")
     
-    logs.append(log_entry)
     try:
-        with open(INVOICE_LOG_FILE, 'w') as f:
-            json.dump(logs, f, indent=2)
+        get_invoice_repository().append(log_entry)
         logger.info("Invoice log saved successfully")
     except Exception as e:
         logger.error(f"Error saving invoice log: {str(e)}\n{traceback.format_exc()}")
@@ -2617,6 +2126,7 @@ def export_logs():
         logger.debug(f"Collected {len(data)} records for export")
         
         # Create DataFrame
+        import pandas as pd
         df = pd.DataFrame(data)
         
         # Ask for save location
@@ -2704,34 +2214,21 @@ def update_payment_status():
         payment_method = method_var.get() if new_status == "Paid" else ""
         logger.info(f"Saving new status for invoice {invoice_no}: {new_status} ({payment_method})")
             
-        # Update logs file
-        if os.path.exists(INVOICE_LOG_FILE):
-            try:
-                with open(INVOICE_LOG_FILE, 'r') as f:
-                    logs = json.load(f)
-                    
-                for log in logs:
-                    if log.get('invoice_num') == invoice_no:
-                        log['status'] = new_status
-                        log['payment_method'] = payment_method
-                        if new_status == "Paid":
-                            log['payment_date'] = datetime.now().strftime("%d-%m-%Y")
-                        else:
-                            log['payment_date'] = ""
-                        logger.debug(f"Updated log entry: {json.dumps(log, indent=2)}")
-                
-                with open(INVOICE_LOG_FILE, 'w') as f:
-                    json.dump(logs, f, indent=2)
-                logger.info("Payment status updated successfully")
-                
-                # Refresh logs view
-                if logs_tree and logs_tree.winfo_exists():
-                    filter_logs()
-                dialog.destroy()
-                messagebox.showinfo("Success", "Payment status updated successfully!")
-            except Exception as e:
-                logger.error(f"Error updating payment status: {str(e)}\n{traceback.format_exc()}")
-                messagebox.showerror("Error", f"Failed to update payment status: {str(e)}")
+        # Update invoice log
+        try:
+            payment_date = datetime.now().strftime("%d-%m-%Y") if new_status == "Paid" else ""
+            updated = get_invoice_repository().update_status(invoice_no, new_status, payment_method, payment_date)
+            logger.debug(f"Updated {updated} log entries for invoice {invoice_no}")
+            logger.info("Payment status updated successfully")
+            
+            # Refresh logs view
+            if logs_tree is not None and logs_tree.winfo_exists():
+                filter_logs()
+            dialog.destroy()
+            messagebox.showinfo("Success", "Payment status updated successfully!")
+        except Exception as e:
+            logger.error(f"Error updating payment status: {str(e)}\n{traceback.format_exc()}")
+            messagebox.showerror("Error", f"Failed to update payment status: {str(e)}")
 
     # Create a bottom frame for the save button
     button_frame = ttk.Frame(frame)
@@ -2766,19 +2263,6 @@ def update_payment_status():
     dialog.transient(app)
     dialog.wait_window()
 
-def draw_watermark(canvas, doc):
-    if os.path.exists(LOGO_PATH):
-        from reportlab.lib.utils import ImageReader
-        img = ImageReader(LOGO_PATH)
-        page_width, page_height = A4
-        wm_width, wm_height = 450, 450  # Adjust as needed
-        x = (page_width - wm_width) / 2
-        y = (page_height - wm_height) / 2
-        canvas.saveState()
-        canvas.setFillAlpha(0.08)  # Opacity
-        canvas.drawImage(img, x, y, wm_width, wm_height, mask='auto', preserveAspectRatio=True)
-        canvas.restoreState()
-
 def exception_handler(exc_type, exc_value, exc_traceback):
     """Handle uncaught exceptions"""
     if issubclass(exc_type, KeyboardInterrupt):
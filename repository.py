@@ -0,0 +1,420 @@
+"""In-process caches of the invoice log and the customers shared by every view.
+
+The log is loaded from storage once and kept until the backing store changes
+(file mtime/size for JSON, data_version/total_changes for SQLite). Each entry
+is wrapped in an InvoiceRecord with its datetime already parsed and its
+amount already converted to float, so views never re-parse strings. On a
+month-partitioned storage, date-range reads load only the overlapping months.
+Customers are held in a CustomerIndex (by customer_id and by dropdown label)
+that writes go through, so lookups and upserts are dictionary hits. Both
+repositories keep a SearchIndex for the search boxes, built on first use and
+updated in place by every write.
+"""
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from billing import parse_log_datetime
+from indexes import CustomerIndex, DatetimeIndex, SearchIndex
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+def parse_amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+LogSummary = namedtuple("LogSummary", "count total paid pending")
+
+
+def summarize(amounts, paid_mask):
+    """Totals for the Logs tab summary bar from an amount array and a Paid mask"""
+    total = float(amounts.sum())
+    paid = float(amounts[paid_mask].sum())
+    return LogSummary(len(amounts), total, paid, total - paid)
+
+
+def summarize_records(records):
+    """summarize() for a list of InvoiceRecords"""
+    amounts = np.fromiter((r.amount for r in records), dtype=np.float64, count=len(records))
+    paid = np.fromiter((r.get("status") == "Paid" for r in records), dtype=bool, count=len(records))
+    return summarize(amounts, paid)
+
+
+class InvoiceRecord:
+    """An invoice log entry plus its parsed datetime (dt) and float amount"""
+    __slots__ = ("entry", "dt", "amount")
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.dt = parse_log_datetime(entry.get("datetime", ""))
+        self.amount = parse_amount(entry.get("amount", 0))
+
+    def get(self, key, default=None):
+        return self.entry.get(key, default)
+
+    def __getitem__(self, key):
+        return self.entry[key]
+
+    def __repr__(self):
+        return f"InvoiceRecord({self.entry.get('invoice_num', '')!r}, {self.dt}, {self.amount})"
+
+
+class InvoiceLogRepository:
+    """Cached, change-aware view of the invoice log"""
+
+    def __init__(self, storage=None):
+        self._storage = storage
+        self._lock = threading.RLock()
+        self._records = None
+        self._signature = None
+        self._columns = None  # (amounts, paid mask) aligned with _records
+        self._range = None    # (from_date, to_date, signature, records) of the last pruned read
+        self._dt_index = None # DatetimeIndex over _records, built on first date query
+        self._search_index = None  # SearchIndex of records by search_values(), built on first search
+        self.loads = 0  # number of full parses, handy when profiling
+
+    @property
+    def storage(self):
+        return self._storage or get_storage()
+
+    def _reload_if_changed(self):
+        signature = self.storage.invoice_log_signature()
+        if self._records is not None and signature == self._signature:
+            return
+        entries = self.storage.load_invoice_logs()
+        self._records = [InvoiceRecord(entry) for entry in entries]
+        self._columns = None
+        self._dt_index = None
+        self._search_index = None
+        self._signature = signature
+        self.loads += 1
+        logger.debug(f"Invoice log cache loaded {len(self._records)} entries")
+
+    @property
+    def prunes_by_date(self):
+        """True when the storage can read just the months overlapping a date range"""
+        return getattr(self.storage, "prunes_by_date", False)
+
+    def records(self, from_date=None, to_date=None):
+        """All invoice records in log order (do not mutate the returned list).
+
+        With a date range on a month-partitioned storage, only the records of
+        the months overlapping the range are read (callers still filter by dt).
+        """
+        with self._lock:
+            if (from_date or to_date) and self.prunes_by_date:
+                return self._range_records(from_date, to_date)
+            self._reload_if_changed()
+            return self._records
+
+    def _range_records(self, from_date, to_date):
+        signature = self.storage.invoice_log_signature(from_date, to_date)
+        cached = self._range
+        if cached is not None and cached[:3] == (from_date, to_date, signature):
+            return cached[3]
+        records = [InvoiceRecord(entry) for entry in self.storage.load_invoice_logs(from_date, to_date)]
+        self._range = (from_date, to_date, signature, records)
+        logger.debug(f"Invoice log range cache loaded {len(records)} entries")
+        return records
+
+    def signature(self, from_date=None, to_date=None):
+        """Opaque value that changes whenever the log (or the months overlapping the range) changes"""
+        with self._lock:
+            if (from_date or to_date) and self.prunes_by_date:
+                return self.storage.invoice_log_signature(from_date, to_date)
+            self._reload_if_changed()
+            return self._signature
+
+    def columns(self):
+        """(records, amounts, paid) with amounts/paid as NumPy arrays aligned with records"""
+        with self._lock:
+            self._reload_if_changed()
+            if self._columns is None:
+                records = self._records
+                amounts = np.fromiter((r.amount for r in records), dtype=np.float64, count=len(records))
+                paid = np.fromiter((r.get("status") == "Paid" for r in records), dtype=bool, count=len(records))
+                self._columns = (amounts, paid)
+            return (self._records,) + self._columns
+
+    def date_index(self):
+        """DatetimeIndex over records(), kept up to date as entries are appended"""
+        with self._lock:
+            self._reload_if_changed()
+            if self._dt_index is None:
+                self._dt_index = DatetimeIndex(self._records)
+            return self._dt_index
+
+    def search_index(self):
+        """SearchIndex keyed by record, kept up to date by append() and update_status()"""
+        with self._lock:
+            self._reload_if_changed()
+            if self._search_index is None:
+                self._search_index = SearchIndex((record, search_values(record)) for record in self._records)
+                logger.debug(f"Invoice search index built over {len(self._records)} entries")
+            return self._search_index
+
+    def records_between(self, from_date=None, to_date=None):
+        """Records with from_date <= dt <= to_date, oldest first, via binary search"""
+        with self._lock:
+            records = self.records()
+            return [records[i] for i in self.date_index().between(from_date, to_date)]
+
+    def filtered(self, search_text="", status_filter="All", from_date=None, to_date=None, within=None):
+        """Records matching the Logs tab filters plus their LogSummary, in one pass.
+
+        within may be the records returned by an earlier call with the same
+        status and dates and a search text this one extends; only those are
+        searched then.
+        """
+        if (from_date or to_date) and self.prunes_by_date:
+            records = self.records(from_date, to_date) if within is None else within
+            matched = filter_records(records, search_text, status_filter, from_date, to_date)
+            return matched, summarize_records(matched)
+        with self._lock:
+            records, amounts, paid = self.columns()
+            if not (search_text or from_date or to_date or status_filter != "All"):
+                return records, summarize(amounts, paid)
+            if search_text:
+                # Ranked search hits; the date range and status are checked per hit
+                hits = self.search_index().search(search_text, within=within)
+                matched = filter_records(hits, "", status_filter, from_date, to_date)
+                return matched, summarize_records(matched)
+            # The date range comes from the index; only rows inside it are checked further
+            candidates = self.date_index().between(from_date, to_date) if (from_date or to_date) else None
+        positions = filter_positions(records, search_text, status_filter, candidates=candidates)
+        index = np.asarray(positions, dtype=np.intp)
+        return [records[i] for i in positions], summarize(amounts[index], paid[index])
+
+    def invalidate(self):
+        with self._lock:
+            self._records = None
+            self._columns = None
+            self._range = None
+            self._dt_index = None
+            self._search_index = None
+
+    def find(self, filename=None, invoice_num=None):
+        for record in self.records():
+            if filename is not None and record.get("filename") == filename:
+                return record
+            if invoice_num is not None and record.get("invoice_num") == invoice_num:
+                return record
+        return None
+
+    def append(self, entry):
+        """Write a new entry through to storage and add it to the cache"""
+        with self._lock:
+            up_to_date = self._records is not None and self.storage.invoice_log_signature() == self._signature
+            self.storage.append_invoice_log(entry)
+            if up_to_date:
+                # Copy-on-write so lists already handed out to views never change under them
+                record = InvoiceRecord(entry)
+                self._records = self._records + [record]
+                self._columns = None
+                if self._dt_index is not None:
+                    self._dt_index.add(len(self._records) - 1, record.dt)
+                if self._search_index is not None:
+                    self._search_index.add(record, search_values(record))
+                self._signature = self.storage.invoice_log_signature()
+
+    def update_status(self, invoice_num, status, payment_method="", payment_date=""):
+        """Update payment status in storage and in the cache"""
+        with self._lock:
+            up_to_date = self._records is not None and self.storage.invoice_log_signature() == self._signature
+            updated = self.storage.update_invoice_status(invoice_num, status, payment_method, payment_date)
+            if up_to_date:
+                records = list(self._records)
+                for i, record in enumerate(records):
+                    if record.get("invoice_num") == invoice_num:
+                        entry = dict(record.entry, status=status, payment_method=payment_method,
+                                     payment_date=payment_date)
+                        records[i] = InvoiceRecord(entry)
+                        if self._search_index is not None:
+                            self._search_index.replace(record, records[i], search_values(records[i]))
+                self._records = records
+                self._columns = None
+                self._signature = self.storage.invoice_log_signature()
+            return updated
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_invoice_repository():
+    """Return the process-wide invoice log repository"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = InvoiceLogRepository()
+        return _repository
+
+
+PICKER_FIELDS = ("name", "customer_id", "phone")
+
+
+def picker_values(customer):
+    """Fields of a customer the typeahead picker matches against"""
+    return tuple(customer.get(field, "") for field in PICKER_FIELDS)
+
+
+class CustomerRepository:
+    """Cached, change-aware customer list with an in-memory CustomerIndex"""
+
+    def __init__(self, storage=None):
+        self._storage = storage
+        self._lock = threading.RLock()
+        self._index = None
+        self._search = None
+        self._picker = None  # SearchIndex over PICKER_FIELDS, for the invoice form's typeahead
+        self._signature = None
+        self.loads = 0
+
+    @property
+    def storage(self):
+        return self._storage or get_storage()
+
+    def index(self):
+        """The CustomerIndex, reloaded only when the store changed behind our back"""
+        with self._lock:
+            signature = self.storage.customers_signature()
+            if self._index is None or signature != self._signature:
+                self._index = CustomerIndex(self.storage.load_customers())
+                self._search = None
+                self._picker = None
+                self._signature = signature
+                self.loads += 1
+                logger.debug(f"Customer index loaded {len(self._index)} customers")
+            return self._index
+
+    def customers(self):
+        return self.index().customers()
+
+    def get(self, customer_id):
+        return self.index().get(customer_id)
+
+    def find_label(self, label):
+        return self.index().find_label(label)
+
+    def signature(self):
+        """Opaque value that changes whenever the customers change"""
+        with self._lock:
+            self.index()
+            return self._signature
+
+    def search(self, text, within=None):
+        """Customers with any field containing text (case-insensitive), best matches first.
+
+        within may be the result of an earlier search that text extends.
+        """
+        with self._lock:
+            index = self.index()
+            if self._search is None:
+                self._search = SearchIndex((c.get("customer_id"), c.values()) for c in index.customers())
+            keys = None if within is None else [c.get("customer_id") for c in within]
+            return [index.get(customer_id) for customer_id in self._search.search(text, within=keys)]
+
+    def suggest(self, text, limit=20):
+        """The best customers for the typeahead picker, matching name, customer_id or phone"""
+        with self._lock:
+            index = self.index()
+            if self._picker is None:
+                self._picker = SearchIndex((c.get("customer_id"), picker_values(c)) for c in index.customers())
+            return [index.get(customer_id) for customer_id in self._picker.search(text, limit=limit)]
+
+    def upsert(self, data):
+        """Write a customer through to storage and into the indexes"""
+        with self._lock:
+            index = self.index()
+            self.storage.upsert_customer(data)
+            index.upsert(data)
+            if self._search is not None:
+                self._search.add(data.get("customer_id"), data.values())
+            if self._picker is not None:
+                self._picker.add(data.get("customer_id"), picker_values(data))
+            self._signature = self.storage.customers_signature()
+
+    def delete(self, customer_id):
+        with self._lock:
+            index = self.index()
+            deleted = self.storage.delete_customer(customer_id)
+            index.remove(customer_id)
+            if self._search is not None:
+                self._search.remove(customer_id)
+            if self._picker is not None:
+                self._picker.remove(customer_id)
+            self._signature = self.storage.customers_signature()
+            return deleted
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+            self._search = None
+            self._picker = None
+
+
+_customer_repository = None
+
+
+def get_customer_repository():
+    """Return the process-wide customer repository"""
+    global _customer_repository
+    with _repository_lock:
+        if _customer_repository is None:
+            _customer_repository = CustomerRepository()
+        return _customer_repository
+
+
+def search_values(record):
+    """Fields of a record the Logs tab search box matches against"""
+    return (
+        record.get("datetime", ""),
+        record.get("invoice_num", ""),
+        record.get("customer_name", ""),
+        str(record.get("amount", "")),
+        record.get("status", ""),
+        record.get("payment_method", "")
+    )
+
+
+def filter_positions(records, search_text="", status_filter="All", from_date=None, to_date=None,
+                     candidates=None):
+    """Positions of the records matching the Logs tab filters.
+
+    from_date/to_date are datetimes (to_date already includes the whole last
+    day); search_text must be lower-cased. candidates limits the scan to
+    those positions (e.g. a date range already resolved by DatetimeIndex).
+    """
+    matched = []
+    for position in (range(len(records)) if candidates is None else candidates):
+        record = records[position]
+        # Check date range
+        if from_date or to_date:
+            if record.dt is None:
+                continue
+            if from_date and record.dt < from_date:
+                continue
+            if to_date and record.dt > to_date:
+                continue
+
+        # Check status filter
+        if status_filter != "All" and record.get("status") != status_filter:
+            continue
+
+        # Check search text
+        if search_text and not any(search_text in str(v).lower() for v in search_values(record)):
+            continue
+
+        matched.append(position)
+    return matched
+
+
+def filter_records(records, search_text="", status_filter="All", from_date=None, to_date=None):
+    """Records matching the Logs tab filters (see filter_positions)"""
+    return [records[i] for i in filter_positions(records, search_text, status_filter, from_date, to_date)]
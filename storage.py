@@ -0,0 +1,887 @@
+"""Storage backends for customers, the invoice log, users and the invoice counter.
+
+Interchangeable backends implement the same methods:
+
+* JsonStorage    - the original customers.json / invoice_log.json / users.json /
+                   invoice_tracker.json files (every write rewrites the file).
+* JournalStorage - the same files, except that invoice log writes are appended
+                   to invoice_log.journal.jsonl and periodically compacted into
+                   invoice_log.snapshot.json.
+* PartitionedStorage - one snapshot + journal segment per month under
+                   invoice_log/; date-range reads open only overlapping months.
+* SqliteStorage  - a single WAL-mode SQLite database with indexed columns and
+                   single-row inserts/updates.
+
+get_storage() returns the process-wide backend. It honours the
+TFN_STORAGE_BACKEND environment variable ("json", "journal", "partitioned" or
+"sqlite") and otherwise uses SQLite once the database file exists, then the
+month segments, then the journal once their files exist. Create the database
+or the segments from the JSON files with:
+
+    python storage.py migrate
+    python storage.py partition
+"""
+import os
+import sys
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import billing
+from billing import TRACKER_FILE, INVOICE_LOG_FILE, CUSTOMERS_FILE, USERS_FILE, DEFAULT_LAST_INVOICE_NUMBER
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "tfn_billing.db"
+JOURNAL_FILE = "invoice_log.journal.jsonl"
+SNAPSHOT_FILE = "invoice_log.snapshot.json"
+COMPACT_AFTER = 1000  # journal records before an automatic compaction
+PARTITION_DIR = "invoice_log"
+UNDATED_PARTITION = "undated"  # month segment for entries with a malformed datetime
+MONTH_INDEX_FILE = "months.index"  # JSON lines of {"invoice_num", "filename", "month"}
+STORAGE_BACKEND_ENV = "TFN_STORAGE_BACKEND"
+DEFAULT_USERS = [{"username": "admin", "password": "admin", "role": "admin"}]
+
+# Invoice log fields stored in their own columns; anything else goes to 'extra'
+INVOICE_FIELDS = ("filename", "datetime", "invoice_num", "customer_name", "customer_id",
+                  "amount", "status", "payment_date", "payment_method")
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def _file_signature(path):
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def sortable_datetime(value):
+    """Convert a log 'datetime' (DD-MM-YYYY HH:MM:SS, or ISO) into a sortable ISO string"""
+    parsed = billing.parse_log_datetime(value)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S") if parsed else ""
+
+
+class JsonStorage:
+    """Original whole-file JSON stores"""
+    name = "json"
+
+    def __init__(self, customers_file=CUSTOMERS_FILE, log_file=INVOICE_LOG_FILE,
+                 users_file=USERS_FILE, tracker_file=TRACKER_FILE):
+        self.customers_file = customers_file
+        self.log_file = log_file
+        self.users_file = users_file
+        self.tracker_file = tracker_file
+
+    # Customers
+    def load_customers(self):
+        return _read_json(self.customers_file, [])
+
+    def customers_signature(self):
+        """Changes whenever the customers file is rewritten"""
+        return _file_signature(self.customers_file)
+
+    def get_customer(self, customer_id):
+        return next((c for c in self.load_customers() if c.get("customer_id") == customer_id), None)
+
+    def upsert_customer(self, data):
+        customers = self.load_customers()
+        for i, customer in enumerate(customers):
+            if customer.get("customer_id") == data["customer_id"]:
+                customers[i] = data
+                break
+        else:
+            customers.append(data)
+        _write_json(self.customers_file, customers)
+
+    def delete_customer(self, customer_id):
+        customers = self.load_customers()
+        remaining = [c for c in customers if c.get("customer_id") != customer_id]
+        _write_json(self.customers_file, remaining)
+        return len(remaining) != len(customers)
+
+    # Invoice log
+    def load_invoice_logs(self):
+        return _read_json(self.log_file, [])
+
+    def invoice_log_signature(self):
+        """Changes whenever the log file is rewritten"""
+        return _file_signature(self.log_file)
+
+    def find_invoice(self, filename=None, invoice_num=None):
+        for entry in self.load_invoice_logs():
+            if filename is not None and entry.get("filename") == filename:
+                return entry
+            if invoice_num is not None and entry.get("invoice_num") == invoice_num:
+                return entry
+        return None
+
+    def append_invoice_logs(self, entries):
+        billing.append_invoice_logs(entries, self.log_file)
+
+    def append_invoice_log(self, entry):
+        self.append_invoice_logs([entry])
+
+    def update_invoice_status(self, invoice_num, status, payment_method="", payment_date=""):
+        logs = self.load_invoice_logs()
+        updated = 0
+        for log in logs:
+            if log.get('invoice_num') == invoice_num:
+                log['status'] = status
+                log['payment_method'] = payment_method
+                log['payment_date'] = payment_date
+                updated += 1
+        if updated:
+            _write_json(self.log_file, logs)
+        return updated
+
+    # Users
+    def load_users(self):
+        if not os.path.exists(self.users_file):
+            # Create a default admin user if file doesn't exist
+            _write_json(self.users_file, DEFAULT_USERS)
+        return _read_json(self.users_file, [])
+
+    # Invoice counter
+    def peek_invoice_number(self):
+        return billing.peek_invoice_number(self.tracker_file)
+
+    def commit_invoice_number(self, number):
+        billing.commit_invoice_number(number, self.tracker_file)
+
+    def allocate_invoice_numbers(self, count):
+        return billing.allocate_invoice_numbers(count, self.tracker_file)
+
+
+class JournalStorage(JsonStorage):
+    """JSON stores with an append-only journal for the invoice log.
+
+    The invoice log is a snapshot ({"seq": N, "entries": [...]}) plus a
+    JSON-lines journal of {"seq", "op": "append" | "status", ...} records.
+    Every write appends its records with a single write() call, so it costs
+    the same however long the history is. Reads replay the journal over the
+    snapshot, incrementally from the last byte already replayed. compact()
+    folds the journal into a new snapshot and runs automatically every
+    compact_after records; journal records with seq <= the snapshot's seq
+    are skipped, so a crash mid-compaction never applies a record twice.
+    Until the first compaction, invoice_log.json serves as the snapshot.
+    """
+    name = "journal"
+
+    def __init__(self, journal_file=JOURNAL_FILE, snapshot_file=SNAPSHOT_FILE,
+                 compact_after=COMPACT_AFTER, **kwargs):
+        super().__init__(**kwargs)
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.compact_after = compact_after
+        self._lock = threading.RLock()
+        self._entries = None      # replayed log, in order
+        self._positions = {}      # invoice_num -> indexes into _entries
+        self._seq = 0             # highest seq applied
+        self._snapshot_seq = 0
+        self._snapshot_signature = None
+        self._journal_identity = None
+        self._journal_offset = 0  # bytes of the journal already replayed
+        self._journal_records = 0
+
+    def _current_snapshot_signature(self):
+        if os.path.exists(self.snapshot_file):
+            return ("snapshot", _file_signature(self.snapshot_file))
+        return ("base", _file_signature(self.log_file))
+
+    def _load_snapshot(self):
+        if os.path.exists(self.snapshot_file):
+            snapshot = _read_json(self.snapshot_file, {})
+            entries, seq = snapshot.get("entries", []), snapshot.get("seq", 0)
+        else:
+            entries, seq = _read_json(self.log_file, []), 0
+        self._entries = []
+        self._positions = {}
+        for entry in entries:
+            self._add_entry(entry)
+        self._seq = self._snapshot_seq = seq
+
+    def _add_entry(self, entry):
+        self._positions.setdefault(entry.get("invoice_num"), []).append(len(self._entries))
+        self._entries.append(entry)
+
+    def _apply(self, record):
+        self._journal_records += 1
+        seq = record.get("seq", 0)
+        if seq <= self._snapshot_seq:
+            return  # already folded into the snapshot
+        self._seq = max(self._seq, seq)
+        if record.get("op") == "append":
+            self._add_entry(record["entry"])
+        elif record.get("op") == "status":
+            for position in self._positions.get(record.get("invoice_num"), ()):
+                entry = self._entries[position]
+                entry["status"] = record.get("status", "")
+                entry["payment_method"] = record.get("payment_method", "")
+                entry["payment_date"] = record.get("payment_date", "")
+
+    def _refresh(self):
+        """Bring the in-memory log up to date with the files"""
+        snapshot_signature = self._current_snapshot_signature()
+        try:
+            st = os.stat(self.journal_file)
+            journal_identity, journal_size = (st.st_dev, st.st_ino), st.st_size
+        except OSError:
+            journal_identity, journal_size = None, 0
+
+        if (self._entries is None or snapshot_signature != self._snapshot_signature
+                or journal_identity != self._journal_identity or journal_size < self._journal_offset):
+            self._load_snapshot()
+            self._snapshot_signature = snapshot_signature
+            self._journal_identity = journal_identity
+            self._journal_offset = 0
+            self._journal_records = 0
+
+        if journal_size > self._journal_offset:
+            with open(self.journal_file, "rb") as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+            end = data.rfind(b"\n") + 1  # a torn last line waits for the rest of its write
+            for line in data[:end].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Skipping bad journal record in {self.journal_file}: {str(e)}")
+            self._journal_offset += end
+
+    def _write_records(self, records):
+        """Append records to the journal with one write() and apply them"""
+        with self._lock:
+            with billing.TrackerLock(self.journal_file):
+                self._refresh()
+                lines = []
+                for record in records:
+                    self._seq += 1
+                    lines.append(json.dumps(dict(record, seq=self._seq), separators=(",", ":")))
+                data = ("\n".join(lines) + "\n").encode("utf-8")
+                fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+                try:
+                    written = os.write(fd, data)
+                    while written < len(data):  # only on a short write, which regular files don't do
+                        written += os.write(fd, data[written:])
+                finally:
+                    os.close(fd)
+                self._refresh()
+            if self._journal_records >= self.compact_after:
+                self.compact()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and empty the journal"""
+        with self._lock:
+            with billing.TrackerLock(self.journal_file):
+                self._refresh()
+                if not self._journal_records and os.path.exists(self.snapshot_file):
+                    return
+                tmp_path = f"{self.snapshot_file}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({"seq": self._seq, "entries": self._entries}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_file)
+                # A crash here leaves journal records the snapshot's seq already covers; they get skipped
+                with open(self.journal_file, "w"):
+                    pass
+                self._snapshot_seq = self._seq
+                self._snapshot_signature = self._current_snapshot_signature()
+                st = os.stat(self.journal_file)
+                self._journal_identity = (st.st_dev, st.st_ino)
+                self._journal_offset = 0
+                self._journal_records = 0
+        logger.info(f"Compacted invoice journal into {self.snapshot_file} ({len(self._entries)} entries)")
+
+    # Invoice log
+    def load_invoice_logs(self):
+        with self._lock:
+            self._refresh()
+            # Copies, so callers can never mutate the replayed state
+            return [dict(entry) for entry in self._entries]
+
+    def invoice_log_signature(self):
+        """Changes whenever the snapshot or the journal changes"""
+        return (self._current_snapshot_signature(), _file_signature(self.journal_file))
+
+    def find_invoice(self, filename=None, invoice_num=None):
+        with self._lock:
+            self._refresh()
+            if invoice_num is not None and filename is None:
+                positions = self._positions.get(invoice_num)
+                return dict(self._entries[positions[0]]) if positions else None
+            for entry in self._entries:
+                if filename is not None and entry.get("filename") == filename:
+                    return dict(entry)
+                if invoice_num is not None and entry.get("invoice_num") == invoice_num:
+                    return dict(entry)
+        return None
+
+    def append_invoice_logs(self, entries):
+        if entries:
+            self._write_records([{"op": "append", "entry": entry} for entry in entries])
+
+    def update_invoice_status(self, invoice_num, status, payment_method="", payment_date=""):
+        with self._lock:
+            self._refresh()
+            updated = len(self._positions.get(invoice_num, ()))
+            if not updated:
+                return 0
+            self._write_records([{"op": "status", "invoice_num": invoice_num, "status": status,
+                                  "payment_method": payment_method, "payment_date": payment_date}])
+        return updated
+
+
+def partition_key(entry):
+    """Month partition ('YYYY-MM') an invoice log entry belongs to"""
+    return sortable_datetime(entry.get("datetime", ""))[:7] or UNDATED_PARTITION
+
+
+class PartitionedStorage(JsonStorage):
+    """JSON stores with the invoice log split into one segment per month.
+
+    Each month under invoice_log/ is a small snapshot + journal pair (see
+    JournalStorage): the open month takes appends, and once a month is over
+    its journal is folded into a compact JSON segment that is never appended
+    to again (only a late status change adds a journal line to it).
+    Date-range reads and signatures touch only the months overlapping the
+    range, so the Logs tab's default current-month view never opens history.
+    Lookups by invoice number or filename go through a month index (an
+    append-only months.index file beside the segments) and open only the
+    month it names, scanning every month only for invoices it does not know.
+    """
+    name = "partitioned"
+    prunes_by_date = True
+
+    def __init__(self, partition_dir=PARTITION_DIR, compact_after=COMPACT_AFTER, **kwargs):
+        super().__init__(**kwargs)
+        self.partition_dir = partition_dir
+        self.compact_after = compact_after
+        self._lock = threading.RLock()
+        self._partitions = {}
+        self._closed_before = None  # months before this one have been compacted
+        self._months = {"invoice_num": {}, "filename": {}}
+        self._months_offset = 0     # bytes of the month index already read
+
+    def _partition(self, key):
+        partition = self._partitions.get(key)
+        if partition is None:
+            segment = os.path.join(self.partition_dir, f"{key}.json")
+            partition = JournalStorage(
+                journal_file=os.path.join(self.partition_dir, f"{key}.journal.jsonl"),
+                snapshot_file=segment, log_file=segment, compact_after=self.compact_after)
+            self._partitions[key] = partition
+        return partition
+
+    def partition_keys(self, from_date=None, to_date=None):
+        """Months on disk overlapping [from_date, to_date], oldest first"""
+        try:
+            names = os.listdir(self.partition_dir)
+        except OSError:
+            return []
+        keys = sorted({name.split(".", 1)[0] for name in names
+                       if name.endswith(".json") or name.endswith(".journal.jsonl")})
+        if from_date or to_date:
+            low = from_date.strftime("%Y-%m") if from_date else ""
+            high = to_date.strftime("%Y-%m") if to_date else "9999-99"
+            keys = [key for key in keys if key != UNDATED_PARTITION and low <= key <= high]
+        return keys
+
+    def _month_index_file(self):
+        return os.path.join(self.partition_dir, MONTH_INDEX_FILE)
+
+    def _append_month_index(self, entries):
+        lines = "".join(json.dumps({"invoice_num": entry.get("invoice_num", ""),
+                                    "filename": entry.get("filename", ""),
+                                    "month": partition_key(entry)}, separators=(",", ":")) + "\n"
+                        for entry in entries)
+        if lines:
+            with open(self._month_index_file(), "a") as f:
+                f.write(lines)
+
+    def _month_index(self):
+        """{"invoice_num": {...}, "filename": {...}} -> month, read incrementally like a journal"""
+        path = self._month_index_file()
+        if not os.path.exists(path) and self.partition_keys():
+            # Segments written before the index existed: index them once
+            for key in self.partition_keys():
+                self._append_month_index(self._partition(key).load_invoice_logs())
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return self._months
+        if size < self._months_offset:
+            self._months = {"invoice_num": {}, "filename": {}}
+            self._months_offset = 0
+        if size > self._months_offset:
+            with open(path, "rb") as f:
+                f.seek(self._months_offset)
+                data = f.read()
+            # Only whole lines; a write in progress is picked up next time
+            complete = data[:data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._months["invoice_num"][record.get("invoice_num", "")] = record.get("month")
+                self._months["filename"][record.get("filename", "")] = record.get("month")
+            self._months_offset += len(complete)
+        return self._months
+
+    def _indexed_month(self, filename=None, invoice_num=None):
+        """The month holding the invoice according to the month index, or None"""
+        months = self._month_index()
+        if filename is not None and filename in months["filename"]:
+            return months["filename"][filename]
+        if invoice_num is not None:
+            return months["invoice_num"].get(invoice_num)
+        return None
+
+    def _months_to_search(self, filename=None, invoice_num=None):
+        """The indexed month first; then, newest first, every month for an unknown invoice"""
+        key = self._indexed_month(filename, invoice_num)
+        if key is not None:
+            yield key
+        yield from (other for other in reversed(self.partition_keys()) if other != key)
+
+    def close_months(self, current=None):
+        """Fold the journals of months before the current one into their segments"""
+        current = current or datetime.now().strftime("%Y-%m")
+        with self._lock:
+            for key in self.partition_keys():
+                if key < current and key != UNDATED_PARTITION:
+                    if os.path.exists(self._partition(key).journal_file) and \
+                            os.path.getsize(self._partition(key).journal_file) > 0:
+                        self._partition(key).compact()
+            self._closed_before = current
+
+    def compact(self):
+        with self._lock:
+            for key in self.partition_keys():
+                self._partition(key).compact()
+
+    # Invoice log
+    def load_invoice_logs(self, from_date=None, to_date=None):
+        """Entries of every month overlapping the range (all entries without one)"""
+        with self._lock:
+            logs = []
+            for key in self.partition_keys(from_date, to_date):
+                logs.extend(self._partition(key).load_invoice_logs())
+            return logs
+
+    def invoice_log_signature(self, from_date=None, to_date=None):
+        """Changes whenever a month overlapping the range changes"""
+        with self._lock:
+            return tuple((key, self._partition(key).invoice_log_signature())
+                         for key in self.partition_keys(from_date, to_date))
+
+    def find_invoice(self, filename=None, invoice_num=None):
+        with self._lock:
+            for key in self._months_to_search(filename, invoice_num):
+                entry = self._partition(key).find_invoice(filename, invoice_num)
+                if entry is not None:
+                    return entry
+        return None
+
+    def append_invoice_logs(self, entries):
+        by_month = {}
+        for entry in entries:
+            by_month.setdefault(partition_key(entry), []).append(entry)
+        with self._lock:
+            os.makedirs(self.partition_dir, exist_ok=True)
+            self._month_index()  # index any pre-index segments before the new entries land
+            for key, month_entries in by_month.items():
+                self._partition(key).append_invoice_logs(month_entries)
+            self._append_month_index(entries)
+            current = datetime.now().strftime("%Y-%m")
+            if self._closed_before != current:
+                self.close_months(current)
+
+    def update_invoice_status(self, invoice_num, status, payment_method="", payment_date=""):
+        with self._lock:
+            for key in self._months_to_search(invoice_num=invoice_num):
+                partition = self._partition(key)
+                if partition.find_invoice(invoice_num=invoice_num) is not None:
+                    return partition.update_invoice_status(invoice_num, status, payment_method, payment_date)
+        return 0
+
+
+def partition_invoice_log(source=None, partition_dir=PARTITION_DIR, force=False):
+    """Split the current invoice log into month segments. Returns {month: entry count}."""
+    if source is None:
+        journal = os.path.exists(JOURNAL_FILE) or os.path.exists(SNAPSHOT_FILE)
+        source = JournalStorage() if journal else JsonStorage()
+    if os.path.isdir(partition_dir) and os.listdir(partition_dir):
+        if not force:
+            raise FileExistsError(f"{partition_dir} already has segments (use --force / force=True to rebuild them)")
+        for name in os.listdir(partition_dir):
+            os.remove(os.path.join(partition_dir, name))
+    os.makedirs(partition_dir, exist_ok=True)
+
+    by_month = {}
+    for entry in source.load_invoice_logs():
+        by_month.setdefault(partition_key(entry), []).append(entry)
+    for key, entries in by_month.items():
+        with open(os.path.join(partition_dir, f"{key}.json"), "w") as f:
+            json.dump({"seq": 0, "entries": entries}, f, separators=(",", ":"))
+    PartitionedStorage(partition_dir)._month_index()
+    counts = {key: len(entries) for key, entries in sorted(by_month.items())}
+    logger.info(f"Partitioned invoice log into {len(counts)} month segments under {partition_dir}")
+    return counts
+
+
+class SqliteStorage:
+    """SQLite backend with indexed columns and single-row writes"""
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS customers (
+        customer_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL DEFAULT '',
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name);
+
+    CREATE TABLE IF NOT EXISTS invoice_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT,
+        datetime TEXT,
+        sort_datetime TEXT,
+        invoice_num TEXT,
+        customer_name TEXT,
+        customer_id TEXT,
+        amount TEXT,
+        status TEXT,
+        payment_date TEXT,
+        payment_method TEXT,
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_invoice_log_invoice_num ON invoice_log(invoice_num);
+    CREATE INDEX IF NOT EXISTS idx_invoice_log_customer_id ON invoice_log(customer_id);
+    CREATE INDEX IF NOT EXISTS idx_invoice_log_datetime ON invoice_log(sort_datetime);
+    CREATE INDEX IF NOT EXISTS idx_invoice_log_status ON invoice_log(status);
+    CREATE INDEX IF NOT EXISTS idx_invoice_log_filename ON invoice_log(filename);
+
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+
+    -- Bumped by every customers write, from any connection (see customers_signature)
+    INSERT OR IGNORE INTO counters (name, value) VALUES ('customers_version', 0);
+    CREATE TRIGGER IF NOT EXISTS customers_version_insert AFTER INSERT ON customers BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'customers_version';
+    END;
+    CREATE TRIGGER IF NOT EXISTS customers_version_update AFTER UPDATE ON customers BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'customers_version';
+    END;
+    CREATE TRIGGER IF NOT EXISTS customers_version_delete AFTER DELETE ON customers BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'customers_version';
+    END;
+    """
+
+    def __init__(self, db_path=DB_FILE):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params)
+
+    # Customers
+    def load_customers(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM customers ORDER BY rowid").fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def customers_signature(self):
+        """Changes whenever the customers table is written, not on invoice log writes"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM counters WHERE name = 'customers_version'").fetchone()
+        return row["value"] if row else None
+
+    def get_customer(self, customer_id):
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM customers WHERE customer_id = ?",
+                                    (customer_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def upsert_customer(self, data):
+        self._write(
+            "INSERT INTO customers (customer_id, name, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(customer_id) DO UPDATE SET name = excluded.name, data = excluded.data",
+            (data["customer_id"], data.get("name", ""), json.dumps(data))
+        )
+
+    def delete_customer(self, customer_id):
+        return self._write("DELETE FROM customers WHERE customer_id = ?", (customer_id,)).rowcount > 0
+
+    # Invoice log
+    @staticmethod
+    def _row_to_entry(row):
+        entry = {field: row[field] if row[field] is not None else "" for field in INVOICE_FIELDS}
+        if row["extra"]:
+            entry.update(json.loads(row["extra"]))
+        return entry
+
+    @staticmethod
+    def _entry_params(entry):
+        extra = {k: v for k, v in entry.items() if k not in INVOICE_FIELDS}
+        return (
+            entry.get("filename", ""), entry.get("datetime", ""),
+            sortable_datetime(entry.get("datetime", "")), entry.get("invoice_num", ""),
+            entry.get("customer_name", ""), entry.get("customer_id", ""),
+            str(entry.get("amount", "")), entry.get("status", ""),
+            entry.get("payment_date", ""), entry.get("payment_method", ""),
+            json.dumps(extra) if extra else None
+        )
+
+    def load_invoice_logs(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM invoice_log ORDER BY id").fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def invoice_log_signature(self):
+        """Changes on any commit: data_version covers other connections, total_changes ours"""
+        with self._lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            return (data_version, self.conn.total_changes)
+
+    def find_invoice(self, filename=None, invoice_num=None):
+        if filename is not None:
+            sql, param = "SELECT * FROM invoice_log WHERE filename = ? ORDER BY id LIMIT 1", filename
+        else:
+            sql, param = "SELECT * FROM invoice_log WHERE invoice_num = ? ORDER BY id LIMIT 1", invoice_num
+        with self._lock:
+            row = self.conn.execute(sql, (param,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    _INSERT_INVOICE = (
+        "INSERT INTO invoice_log (filename, datetime, sort_datetime, invoice_num, customer_name, "
+        "customer_id, amount, status, payment_date, payment_method, extra) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+
+    def append_invoice_log(self, entry):
+        self._write(self._INSERT_INVOICE, self._entry_params(entry))
+
+    def append_invoice_logs(self, entries):
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                self.conn.executemany(self._INSERT_INVOICE, [self._entry_params(e) for e in entries])
+
+    def update_invoice_status(self, invoice_num, status, payment_method="", payment_date=""):
+        return self._write(
+            "UPDATE invoice_log SET status = ?, payment_method = ?, payment_date = ? WHERE invoice_num = ?",
+            (status, payment_method, payment_date, invoice_num)
+        ).rowcount
+
+    # Users
+    def load_users(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT username, password, role FROM users ORDER BY rowid").fetchall()
+            if not rows:
+                self.conn.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                                      [(u["username"], u["password"], u["role"]) for u in DEFAULT_USERS])
+                return [dict(u) for u in DEFAULT_USERS]
+        return [dict(row) for row in rows]
+
+    # Invoice counter
+    def _last_invoice_number(self):
+        row = self.conn.execute("SELECT value FROM counters WHERE name = 'last_invoice_number'").fetchone()
+        return row["value"] if row else DEFAULT_LAST_INVOICE_NUMBER
+
+    def _set_last_invoice_number(self, number):
+        self.conn.execute(
+            "INSERT INTO counters (name, value) VALUES ('last_invoice_number', ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value", (number,)
+        )
+
+    def peek_invoice_number(self):
+        with self._lock:
+            return self._last_invoice_number() + 1
+
+    def commit_invoice_number(self, number):
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self._set_last_invoice_number(max(self._last_invoice_number(), number))
+
+    def allocate_invoice_numbers(self, count):
+        if count <= 0:
+            return []
+        with self._lock:
+            with self.conn:
+                # IMMEDIATE takes the write lock up front, so concurrent processes serialize here
+                self.conn.execute("BEGIN IMMEDIATE")
+                last = self._last_invoice_number()
+                self._set_last_invoice_number(last + count)
+        logger.info(f"Allocated invoice numbers {last + 1}-{last + count}")
+        return list(range(last + 1, last + count + 1))
+
+
+def migrate_json_to_sqlite(db_path=DB_FILE, source=None, force=False):
+    """Copy the JSON stores into a new SQLite database. Returns row counts."""
+    if source is None:
+        source = open_storage("partitioned" if os.path.isdir(PARTITION_DIR) else
+                              "journal" if os.path.exists(JOURNAL_FILE) or os.path.exists(SNAPSHOT_FILE) else
+                              "json")
+    if os.path.exists(db_path):
+        if not force:
+            raise FileExistsError(f"{db_path} already exists (use --force / force=True to rebuild it)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    customers = source.load_customers()
+    logs = source.load_invoice_logs()
+    users = source.load_users()
+    last_number = source.peek_invoice_number() - 1
+
+    target = SqliteStorage(db_path)
+    try:
+        with target._lock:
+            with target.conn:
+                target.conn.execute("BEGIN")
+                target.conn.executemany(
+                    "INSERT OR REPLACE INTO customers (customer_id, name, data) VALUES (?, ?, ?)",
+                    [(c["customer_id"], c.get("name", ""), json.dumps(c)) for c in customers]
+                )
+                target.conn.executemany(target._INSERT_INVOICE,
+                                        [target._entry_params(entry) for entry in logs])
+                target.conn.executemany(
+                    "INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)",
+                    [(u["username"], u["password"], u.get("role", "user")) for u in users]
+                )
+                target._set_last_invoice_number(last_number)
+    finally:
+        target.close()
+
+    counts = {"customers": len(customers), "invoices": len(logs), "users": len(users),
+              "last_invoice_number": last_number}
+    logger.info(f"Migrated JSON stores to {db_path}: {counts}")
+    return counts
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def open_storage(backend=None, db_path=DB_FILE):
+    """Create a storage backend by name ('json', 'journal', 'partitioned' or 'sqlite'); None picks automatically"""
+    if not backend:
+        backend = os.environ.get(STORAGE_BACKEND_ENV)
+    if not backend:
+        if os.path.exists(db_path):
+            backend = "sqlite"
+        elif os.path.isdir(PARTITION_DIR):
+            backend = "partitioned"
+        elif os.path.exists(JOURNAL_FILE) or os.path.exists(SNAPSHOT_FILE):
+            backend = "journal"
+        else:
+            backend = "json"
+    if backend == "sqlite":
+        return SqliteStorage(db_path)
+    if backend == "journal":
+        return JournalStorage()
+    if backend == "partitioned":
+        return PartitionedStorage()
+    if backend == "json":
+        return JsonStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_storage():
+    """Return the process-wide storage backend"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = open_storage()
+            logger.info(f"Using {_storage.name} storage backend")
+        return _storage
+
+
+def set_storage(storage):
+    """Replace the process-wide storage backend (e.g. after migrating)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TFN Billing storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="copy the JSON files into a SQLite database")
+    migrate.add_argument("--db", default=DB_FILE)
+    migrate.add_argument("--force", action="store_true", help="rebuild the database if it exists")
+    sub.add_parser("compact", help="fold the invoice log journal into its snapshot")
+    partition = sub.add_parser("partition", help="split the invoice log into month segments")
+    partition.add_argument("--force", action="store_true", help="rebuild the segments if they exist")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "migrate":
+        try:
+            counts = migrate_json_to_sqlite(args.db, force=args.force)
+        except FileExistsError as e:
+            print(str(e))
+            return 1
+        print(f"Migrated {counts['customers']} customers, {counts['invoices']} invoices, "
+              f"{counts['users']} users to {args.db} (last invoice number {counts['last_invoice_number']})")
+    elif args.command == "compact":
+        if os.path.isdir(PARTITION_DIR):
+            storage = PartitionedStorage()
+            storage.compact()
+            print(f"Compacted {len(storage.partition_keys())} month segments under {PARTITION_DIR}")
+        else:
+            storage = JournalStorage()
+            storage.compact()
+            print(f"Compacted {len(storage.load_invoice_logs())} invoice log entries into {storage.snapshot_file}")
+    elif args.command == "partition":
+        try:
+            counts = partition_invoice_log(force=args.force)
+        except FileExistsError as e:
+            print(str(e))
+            return 1
+        print(f"Wrote {sum(counts.values())} invoices into {len(counts)} month segments under {PARTITION_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,699 @@
+"""Reusable Tk helpers for the billing views."""
+import logging
+import os
+import tkinter as tk
+import ttkbootstrap as ttk
+
+logger = logging.getLogger(__name__)
+
+
+def unique_keys(keys):
+    """Make row keys unique by suffixing repeats ('A', 'A#2', 'A#3', ...)"""
+    seen = {}
+    result = []
+    for key in keys:
+        key = str(key)
+        count = seen.get(key, 0) + 1
+        seen[key] = count
+        result.append(key if count == 1 else f"{key}#{count}")
+    return result
+
+
+def natural_sort_key(value):
+    """Sort numbers (including '₹1,200.00') numerically and everything else case-insensitively"""
+    text = str(value)
+    try:
+        return (0, float(text.replace('₹', '').replace(',', '')), "")
+    except ValueError:
+        return (1, 0.0, text.lower())
+
+
+def dmy_datetime_sort_key(value):
+    """Sort key for 'DD-MM-YYYY HH:MM:SS' strings without parsing them"""
+    text = str(value)
+    return text[6:10] + text[3:5] + text[0:2] + text[10:]
+
+
+class TreeviewSync:
+    """Keeps a Treeview in step with a list of rows by diffing on a row key.
+
+    Only rows that were added, removed, changed or moved touch Tk, so the
+    selection and scroll position of an unchanged view are left alone. The
+    rows last shown are remembered Python-side; the tree is never read back.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.order = []   # iids in display order
+        self.values = {}  # iid -> values tuple
+
+    def clear(self):
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.order = []
+        self.values = {}
+
+    def sync(self, keys, rows):
+        """Show rows (values tuples) keyed by keys, in the given order.
+
+        Returns (inserted, updated, deleted, moved) counts.
+        """
+        tree = self.tree
+        new_order = unique_keys(keys)
+        new_values = dict(zip(new_order, (tuple(r) for r in rows)))
+        yview = tree.yview()[0]
+
+        stale = [iid for iid in self.order if iid not in new_values]
+        if stale:
+            tree.delete(*stale)
+
+        inserted = updated = moved = 0
+        surviving = [iid for iid in self.order if iid in new_values]
+        same_order = surviving == [iid for iid in new_order if iid in self.values]
+        for index, iid in enumerate(new_order):
+            values = new_values[iid]
+            old = self.values.get(iid)
+            if old is None:
+                tree.insert("", index, iid=iid, values=values)
+                inserted += 1
+                continue
+            if old != values:
+                tree.item(iid, values=values)
+                updated += 1
+            if not same_order:
+                tree.move(iid, "", index)
+                moved += 1
+
+        self.order = new_order
+        self.values = new_values
+        if stale or inserted or moved:
+            tree.yview_moveto(yview)
+        return inserted, updated, len(stale), moved
+
+
+class VirtualTreeview(ttk.Frame):
+    """A Treeview that only materializes the rows visible in its viewport.
+
+    The full (filtered) result lives in Python lists; scrolling, sorting and
+    selection all operate on those lists and only the visible window is
+    pushed into Tk, so the widget costs the same with 100 rows or 1M.
+
+    The read side mirrors ttk.Treeview (selection(), item(key)['values'],
+    get_children()) so callers written against a plain Treeview keep working,
+    but answers come from the backing arrays without touching Tk.
+    """
+
+    def __init__(self, master, columns, sort_keys=None, **tree_kwargs):
+        super().__init__(master)
+        self.columns = tuple(columns)
+        self.sort_keys = dict(sort_keys or {})  # column index -> key function
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings", **tree_kwargs)
+        self.vscroll = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.vscroll.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self._keys = []      # row keys in display order
+        self._rows = []      # values tuples in display order
+        self._index = {}     # key -> position in _keys
+        self._selected = set()
+        self._offset = 0
+        self._visible = 20
+        self._row_height = None
+        self._header_height = None
+        self._sort_column = None
+        self._sort_reverse = False
+        self._sync = TreeviewSync(self.tree)
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_units(3))
+        self.tree.bind("<Up>", lambda e: self._move_focus(-1))
+        self.tree.bind("<Down>", lambda e: self._move_focus(1))
+        self.tree.bind("<Prior>", lambda e: self._move_focus(-self._visible))
+        self.tree.bind("<Next>", lambda e: self._move_focus(self._visible))
+        self.tree.bind("<Home>", lambda e: self._move_focus(-len(self._keys)))
+        self.tree.bind("<End>", lambda e: self._move_focus(len(self._keys)))
+
+    # Treeview-compatible configuration
+    def heading(self, column, sortable=True, **kwargs):
+        if sortable and "command" not in kwargs and column in self.columns:
+            index = self.columns.index(column)
+            kwargs["command"] = lambda: self.sort_by(index)
+        return self.tree.heading(column, **kwargs)
+
+    def column(self, column, **kwargs):
+        return self.tree.column(column, **kwargs)
+
+    def xview(self, *args):
+        return self.tree.xview(*args)
+
+    def configure_tree(self, **kwargs):
+        return self.tree.configure(**kwargs)
+
+    # Backing data
+    def set_rows(self, keys, rows):
+        """Replace the backing rows, keeping selection and the top visible row where possible"""
+        top_key = self._keys[self._offset] if self._offset < len(self._keys) else None
+        self._keys = unique_keys(keys)
+        self._rows = [tuple(r) for r in rows]
+        if self._sort_column is not None:
+            self._apply_sort()
+        self._reindex()
+        self._selected &= self._index.keys()
+        if top_key in self._index:
+            self._offset = self._index[top_key]
+        self._render()
+
+    def rows(self):
+        """All backing rows (values tuples) in display order"""
+        return self._rows
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __bool__(self):
+        # A widget is truthy like any other, even with no rows
+        return True
+
+    def get_children(self, item=None):
+        return tuple(self._keys)
+
+    def item(self, key, option=None):
+        info = {"values": list(self._rows[self._index[key]])}
+        return info[option] if option else info
+
+    def selection(self):
+        return tuple(sorted(self._selected, key=self._index.__getitem__))
+
+    def selection_set(self, *keys):
+        if len(keys) == 1 and isinstance(keys[0], (list, tuple)):
+            keys = keys[0]
+        self._selected = {k for k in keys if k in self._index}
+        self._render()
+
+    def see(self, key):
+        if key not in self._index:
+            return
+        pos = self._index[key]
+        if pos < self._offset:
+            self._offset = pos
+        elif pos >= self._offset + self._visible:
+            self._offset = pos - self._visible + 1
+        self._render()
+
+    def sort_by(self, column_index, reverse=None):
+        """Sort the backing rows by a column; clicking the same heading again reverses"""
+        if reverse is None:
+            reverse = not self._sort_reverse if self._sort_column == column_index else False
+        self._sort_column = column_index
+        self._sort_reverse = reverse
+        self._apply_sort()
+        self._reindex()
+        self._render()
+
+    def _apply_sort(self):
+        key_func = self.sort_keys.get(self._sort_column, natural_sort_key)
+        col = self._sort_column
+        order = sorted(range(len(self._rows)), key=lambda i: key_func(self._rows[i][col]),
+                       reverse=self._sort_reverse)
+        self._keys = [self._keys[i] for i in order]
+        self._rows = [self._rows[i] for i in order]
+
+    def _reindex(self):
+        self._index = {key: i for i, key in enumerate(self._keys)}
+
+    # Rendering
+    def _clamp_offset(self):
+        max_offset = max(0, len(self._keys) - self._visible)
+        self._offset = min(max(0, self._offset), max_offset)
+
+    def _render(self):
+        self._clamp_offset()
+        end = self._offset + self._visible
+        window_keys = self._keys[self._offset:end]
+        self._sync.sync(window_keys, self._rows[self._offset:end])
+        wanted = tuple(k for k in window_keys if k in self._selected)
+        if tuple(self.tree.selection()) != wanted:
+            self.tree.selection_set(wanted)
+        total = len(self._keys)
+        if total:
+            self.vscroll.set(self._offset / total, min(1.0, end / total))
+        else:
+            self.vscroll.set(0.0, 1.0)
+
+    def _measure(self):
+        """Row and header height in pixels, measured from a rendered row when possible"""
+        if self._sync.order:
+            bbox = self.tree.bbox(self._sync.order[0])
+            if bbox:
+                self._header_height, self._row_height = bbox[1], bbox[3]
+        if not self._row_height:
+            style = ttk.Style()
+            self._row_height = int(style.lookup(self.tree.cget("style") or "Treeview", "rowheight") or 20)
+            self._header_height = self._row_height + 4
+        return self._row_height, self._header_height
+
+    def _on_configure(self, event=None):
+        row_height, header_height = self._measure()
+        height = self.tree.winfo_height()
+        visible = max(1, (height - header_height) // max(1, row_height))
+        if visible != self._visible:
+            self._visible = visible
+            self._render()
+
+    # Scrolling
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self._offset = int(float(args[0]) * len(self._keys))
+        elif action == "scroll":
+            count, what = int(args[0]), args[1]
+            self._offset += count * (self._visible if what == "pages" else 1)
+        self._render()
+
+    def _scroll_units(self, count):
+        self._offset += count
+        self._render()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        return self._scroll_units(int(-1 * (event.delta / 120)) * 3)
+
+    # Selection
+    def _on_select(self, event=None):
+        visible_selection = set(self.tree.selection())
+        window = set(self._sync.order)
+        if visible_selection == {k for k in window if k in self._selected}:
+            return  # our own selection_set during render
+        self._selected = visible_selection
+        self.event_generate("<<VirtualTreeviewSelect>>")
+
+    def _move_focus(self, step):
+        if not self._keys:
+            return "break"
+        focus = self.tree.focus()
+        pos = self._index.get(focus, self._offset)
+        pos = min(max(0, pos + step), len(self._keys) - 1)
+        key = self._keys[pos]
+        self._selected = {key}
+        self.see(key)
+        self.tree.focus(key)
+        return "break"
+
+
+class LogTailer:
+    """Reads only what was appended to a log file since the last call.
+
+    Remembers a byte offset and the file's identity; if the file shrinks
+    (truncated) or is replaced (rotated), the next read() starts over. Only
+    complete lines are returned, a trailing partial line waits for the next
+    call. The first read (and every restart) returns at most the last
+    initial_bytes of the file.
+    """
+
+    def __init__(self, path, initial_bytes=256 * 1024):
+        self.path = path
+        self.initial_bytes = initial_bytes
+        self.reset()
+
+    HEAD_BYTES = 64  # fingerprint of the file start, catches a replaced file reusing the inode
+
+    def reset(self):
+        """Forget the position; the next read() starts from the file's tail"""
+        self._offset = None
+        self._identity = None
+        self._head = b""
+
+    def read(self):
+        """Return (restarted, text): restarted means the caller should drop what it shows"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            restarted = self._offset is not None
+            self.reset()
+            return restarted, ""
+
+        identity = (st.st_dev, st.st_ino)
+        restarted = self._offset is None or identity != self._identity or st.st_size < self._offset
+        if not restarted and st.st_size == self._offset:
+            return False, ""
+
+        with open(self.path, "rb") as f:
+            head = f.read(self.HEAD_BYTES)
+            if not restarted and head[:len(self._head)] != self._head:
+                restarted = True
+            start = max(0, st.st_size - self.initial_bytes) if restarted else self._offset
+            f.seek(start)
+            data = f.read()
+        self._head = head
+        if restarted and start > 0:
+            # Started mid-file: drop the partial first line
+            newline = data.find(b"\n")
+            skipped = newline + 1 if newline >= 0 else len(data)
+            data = data[skipped:]
+            start += skipped
+        end = data.rfind(b"\n") + 1  # hold back a trailing partial line
+        self._offset = start + end
+        self._identity = identity
+        return restarted, data[:end].decode("utf-8", errors="replace")
+
+
+def follow_log(text_widget, tailer, max_lines=5000):
+    """Append a LogTailer's new lines to a Text widget, keeping only the last max_lines"""
+    at_bottom = text_widget.yview()[1] > 0.99
+    restarted, chunk = tailer.read()
+    if restarted:
+        text_widget.delete("1.0", "end")
+    if chunk:
+        text_widget.insert("end", chunk)
+        # Content always ends with a newline, so the last "line" is the empty one after it
+        line_count = int(text_widget.index("end-1c").split(".")[0]) - 1
+        if line_count > max_lines:
+            text_widget.delete("1.0", f"{line_count - max_lines + 1}.0")
+    # Auto-scroll to bottom if we were at bottom before
+    if at_bottom and (restarted or chunk):
+        text_widget.see("end")
+
+
+class DebouncedSearch:
+    """Runs a search box's query once the user pauses typing.
+
+    Bind schedule() to the search variable's trace: each keystroke restarts
+    an idle timer of delay_ms, so typing "rakesh" costs one search instead of
+    six, and a pending query that has been typed over is dropped. When it
+    fires, search(query, within) is called with within set to the previous
+    result if the new query extends the previous one under the same
+    context() (the other filters and the data version), so it only has to
+    narrow that result; otherwise within is None.
+    """
+
+    def __init__(self, widget, get_query, search, context=lambda: None, delay_ms=250):
+        self.widget = widget
+        self.get_query = get_query
+        self.search = search
+        self.context = context
+        self.delay_ms = delay_ms
+        self._after_id = None
+        self._last = None  # (context, query, result) of the last completed search
+
+    def schedule(self, *args):
+        """Restart the idle timer for the current query"""
+        self.cancel()
+        self._after_id = self.widget.after(self.delay_ms, self.run)
+
+    def cancel(self):
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:  # the widget is gone
+                pass
+            self._after_id = None
+
+    def reset(self):
+        """Forget the previous result, e.g. after the data was reloaded"""
+        self._last = None
+
+    def run(self, *args):
+        """Search now (cancelling any pending run); returns the result"""
+        self.cancel()
+        try:
+            if not self.widget.winfo_exists():
+                return None
+        except Exception:  # the Tk app itself is gone
+            return None
+        query = self.get_query()
+        context = self.context()
+        within = None
+        if self._last is not None and self._last[0] == context:
+            last_query, last_result = self._last[1], self._last[2]
+            if query == last_query:
+                return last_result  # nothing changed since the last run
+            if last_query and query.startswith(last_query) and last_result is not None:
+                within = last_result
+        result = self.search(query, within)
+        self._last = (context, query, result) if result is not None else None
+        return result
+
+
+class TypeaheadEntry(ttk.Frame):
+    """Entry that lists the best matches for what is typed in a drop-down.
+
+    suggest(text, limit) returns the labels to offer (at most limit); it is
+    called again a short pause after each keystroke, so the list always
+    reflects the current data. Choosing a label (click, or Up/Down then
+    Return) puts it in the entry and generates <<TypeaheadSelected>>;
+    get() returns the entry text, like a Combobox.
+    """
+
+    def __init__(self, master, suggest, limit=20, delay_ms=150, width=50, **kwargs):
+        super().__init__(master, **kwargs)
+        self.suggest = suggest
+        self.limit = limit
+        self.delay_ms = delay_ms
+        self.var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.var, width=width)
+        self.entry.pack(fill="x", expand=True)
+        self._popup = None
+        self._listbox = None
+        self._after_id = None
+        self._chosen = None  # text set by the last choice, which must not reopen the list
+
+        self.var.trace_add("write", self._on_text)
+        self.entry.bind("<Down>", self._on_down)
+        self.entry.bind("<Up>", lambda event: self._move(-1))
+        self.entry.bind("<Return>", self._on_return)
+        self.entry.bind("<Escape>", lambda event: self.hide())
+        self.entry.bind("<FocusOut>", lambda event: self.after(self.delay_ms, self._hide_unless_focused))
+        self.bind("<Destroy>", lambda event: self._cancel() if event.widget is self else None)
+
+    def get(self):
+        return self.var.get()
+
+    def set(self, text):
+        self._chosen = text
+        self.var.set(text)
+
+    def refresh(self):
+        """Re-run the current query if the list is showing, e.g. after the data changed"""
+        if self._popup is not None and self._popup.winfo_viewable():
+            self._update()
+
+    def hide(self):
+        if self._popup is not None:
+            self._popup.withdraw()
+
+    def _cancel(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _on_text(self, *args):
+        if self.var.get() == self._chosen:
+            return
+        self._chosen = None
+        self._cancel()
+        self._after_id = self.after(self.delay_ms, self._update)
+
+    def _update(self):
+        self._after_id = None
+        try:
+            labels = self.suggest(self.var.get(), self.limit)
+        except Exception as e:
+            logger.error(f"Typeahead lookup failed: {str(e)}")
+            labels = []
+        if not labels:
+            self.hide()
+            return
+        self._show(labels)
+
+    def _ensure_popup(self):
+        if self._popup is None:
+            self._popup = tk.Toplevel(self)
+            self._popup.wm_overrideredirect(True)
+            self._popup.withdraw()
+            self._listbox = tk.Listbox(self._popup, activestyle="dotbox", exportselection=False)
+            self._listbox.pack(fill="both", expand=True)
+            self._listbox.bind("<ButtonRelease-1>", self._on_click)
+            self._listbox.bind("<Return>", self._on_return)
+            self._listbox.bind("<Escape>", lambda event: (self.hide(), self.entry.focus_set()))
+        return self._listbox
+
+    def _show(self, labels):
+        listbox = self._ensure_popup()
+        listbox.delete(0, tk.END)
+        listbox.insert(tk.END, *labels)
+        listbox.configure(height=min(len(labels), 10))
+        listbox.selection_clear(0, tk.END)
+        listbox.selection_set(0)
+        listbox.activate(0)
+        self.update_idletasks()
+        x = self.entry.winfo_rootx()
+        y = self.entry.winfo_rooty() + self.entry.winfo_height()
+        self._popup.geometry(f"{self.entry.winfo_width()}x{listbox.winfo_reqheight()}+{x}+{y}")
+        self._popup.deiconify()
+        self._popup.lift()
+
+    def _visible(self):
+        return self._popup is not None and self._popup.winfo_viewable()
+
+    def _on_down(self, event):
+        if not self._visible():
+            self._cancel()
+            self._update()
+        else:
+            self._move(1)
+        return "break"
+
+    def _move(self, step):
+        if not self._visible():
+            return "break"
+        listbox = self._listbox
+        current = listbox.curselection()
+        index = max(0, min(listbox.size() - 1, (current[0] + step) if current else 0))
+        listbox.selection_clear(0, tk.END)
+        listbox.selection_set(index)
+        listbox.activate(index)
+        listbox.see(index)
+        return "break"
+
+    def _on_return(self, event):
+        if self._visible():
+            current = self._listbox.curselection()
+            if current:
+                self._choose(self._listbox.get(current[0]))
+        return "break"
+
+    def _on_click(self, event):
+        index = self._listbox.nearest(event.y)
+        if index >= 0:
+            self._choose(self._listbox.get(index))
+
+    def _choose(self, label):
+        self._cancel()
+        self.hide()
+        self.set(label)
+        self.entry.focus_set()
+        self.entry.icursor(tk.END)
+        self.event_generate("<<TypeaheadSelected>>")
+
+    def _hide_unless_focused(self):
+        if not self.winfo_exists():
+            return
+        try:
+            focused = self.focus_get()
+        except (KeyError, tk.TclError):
+            focused = None
+        if focused not in (self.entry, self._listbox):
+            self.hide()
+
+
+class PeriodicTask:
+    """Calls callback() every interval_ms on the Tk thread while started.
+
+    The loop ends by itself once widget is destroyed.
+    """
+
+    def __init__(self, widget, interval_ms, callback):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.callback = callback
+        self._after_id = None
+
+    @property
+    def running(self):
+        return self._after_id is not None
+
+    def start(self, run_now=True):
+        """Start (or restart) the loop, running callback right away unless run_now is false"""
+        self.stop()
+        if run_now:
+            self._tick()
+        else:
+            self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:  # the widget is gone
+                pass
+            self._after_id = None
+
+    def _tick(self):
+        self._after_id = None
+        try:
+            if not self.widget.winfo_exists():
+                return
+        except Exception:  # the Tk app itself is gone
+            return
+        try:
+            self.callback()
+        except Exception as e:
+            logger.error(f"Periodic task failed: {str(e)}")
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+
+class LazyTabs:
+    """Builds notebook tabs on first selection and pauses their timers while hidden.
+
+    add(frame, text, build) adds a tab whose content build() creates the
+    first time the tab is shown. A view registers its refresh loops with
+    pause_when_hidden(frame, task); they only run while that tab is the
+    selected one and catch up as soon as it is shown again.
+    """
+
+    def __init__(self, notebook):
+        self.notebook = notebook
+        self._builders = {}  # tab frame name -> build callable, until built
+        self._tasks = {}     # tab frame name -> [PeriodicTask]
+        self._current = None
+        notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed, add="+")
+
+    def add(self, frame, text, build=None):
+        self.notebook.add(frame, text=text)
+        if build is not None:
+            self._builders[str(frame)] = build
+
+    def is_visible(self, frame):
+        return self.notebook.select() == str(frame)
+
+    def ensure_built(self, frame):
+        """Build a tab's content now if it has not been built yet"""
+        build = self._builders.pop(str(frame), None)
+        if build is not None:
+            logger.debug(f"Building tab {self.notebook.tab(frame, 'text').strip()}")
+            build()
+
+    def pause_when_hidden(self, frame, task):
+        """Run task only while frame's tab is shown"""
+        tasks = self._live_tasks(str(frame))
+        tasks.append(task)
+        self._tasks[str(frame)] = tasks
+        if self.is_visible(frame):
+            task.start(run_now=False)
+
+    def _live_tasks(self, name):
+        """Registered tasks of a tab, minus those whose widgets were destroyed by a rebuild"""
+        live = []
+        for task in self._tasks.get(name, ()):
+            try:
+                if task.widget.winfo_exists():
+                    live.append(task)
+            except Exception:
+                pass
+        return live
+
+    def _on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        if selected == self._current:
+            return
+        for task in self._tasks.get(self._current, ()):
+            task.stop()
+        self._current = selected
+        if selected in self._builders:
+            self.ensure_built(selected)
+        else:
+            for task in self._live_tasks(selected):
+                task.start()